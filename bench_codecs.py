@@ -0,0 +1,97 @@
+import time
+import argparse
+from typing import Any, Dict, List, Callable
+
+from modules.data import data_path, get_data_file
+from modules.serialization import Codec, get_available_codecs
+
+
+def make_users(count: int) -> Dict[str, Any]:
+    """
+    Gera `count` usuários a partir dos usuários salvos, trocando os nomes de
+    usuário, para que o conteúdo seja parecido com o real.
+    """
+    stored = list(get_data_file(data_path('usuarios.json')).values())
+    if not stored:
+        stored = [
+            {
+                'age': 20,
+                'username': 'aluno',
+                'full_name': 'Aluno Exemplo',
+                'gender': 'n',
+                'city': 'Assis',
+                'course_id': None,
+                'grades': {},
+                'current_lesson': {},
+            }
+        ]
+
+    users = {}
+    for i in range(count):
+        user = dict(stored[i % len(stored)])
+        user['username'] = f'{user["username"]}.{i}'
+        users[user['username']] = user
+    return users
+
+
+def best_time(function: Callable[[], Any], repeat: int) -> float:
+    """
+    Retorna o menor tempo, em segundos, de `repeat` execuções de `function`.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench(codec: Codec, data: Any, *, pretty: bool, repeat: int) -> List[float]:
+    encoded = codec.dumps(data, pretty=pretty)
+    return [
+        best_time(lambda: codec.dumps(data, pretty=pretty), repeat),
+        best_time(lambda: codec.loads(encoded), repeat),
+        len(encoded),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compara os codecs JSON disponíveis na leitura e escrita dos '
+        'arquivos de dados.'
+    )
+    parser.add_argument(
+        '--tamanhos',
+        type=int,
+        nargs='+',
+        default=[100, 1000, 10000, 100000],
+        help='quantidades de usuários',
+    )
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    codecs = get_available_codecs()
+    datasets = {'cursos': get_data_file(data_path('cursos.json'))}
+    for size in args.tamanhos:
+        datasets[f'{size} usuários'] = make_users(size)
+
+    print(
+        f'{"Dados":<18}{"Codec":<10}{"Formato":<12}'
+        f'{"Escrita":>12}{"Leitura":>12}{"Tamanho":>12}'
+    )
+    for name, data in datasets.items():
+        for codec in codecs.values():
+            for pretty in (True, False):
+                dump, load, size = bench(
+                    codec, data, pretty=pretty, repeat=args.repeticoes
+                )
+                print(
+                    f'{name:<18}{codec.name:<10}'
+                    f'{"indentado" if pretty else "compacto":<12}'
+                    f'{dump * 1000:>10.2f}ms{load * 1000:>10.2f}ms'
+                    f'{size / 1024:>8.0f} KiB'
+                )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,360 @@
+import os
+import time
+import argparse
+from typing import Any, Set, Dict, List, Tuple, Iterator
+from functools import partial
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from modules.data import (
+    data_path,
+    get_shard,
+    resolve_path,
+    get_data_file,
+    get_generation,
+    iter_data_file,
+    get_shard_count,
+    get_shard_files,
+    write_data_items,
+    replace_data_files,
+)
+from modules.indexes import rebuild_index
+from modules.changelog import record_changes
+from modules.exceptions import DataChangedError
+
+# Problemas verificados, com a descrição exibida no relatório e se são reparados.
+PROBLEMS = {
+    'sem_senha': ('usuários sem senha', False),
+    'senha_sem_usuario': ('senhas sem usuário', True),
+    'nome_divergente': ('nome de usuário diferente da chave', True),
+    'particao_errada': ('usuários na partição errada (rode o reshard.py)', False),
+    'curso_inexistente': ('cursos que não existem (rode o migrate_progress.py)', False),
+    'disciplina_fora_do_curso': ('progresso em disciplinas fora do curso', True),
+    'aula_inexistente': ('aulas atuais que não existem', True),
+}
+
+# Curso -> disciplina -> (IDs das aulas e da avaliação, ID da avaliação).
+CatalogIndex = Dict[str, Dict[str, Tuple[Set[str], str]]]
+# Os registros alterados de um arquivo e as chaves removidas.
+Changes = Tuple[Dict[str, Any], List[str]]
+
+
+def build_catalog_index(courses: Dict[str, Any]) -> CatalogIndex:
+    """
+    Monta o índice dos IDs do catálogo usado nas verificações.
+    """
+    return {
+        course_id: {
+            subject['id']: (
+                {lesson['id'] for lesson in subject['lessons']}
+                | {subject['test']['id'], '-'},
+                subject['test']['id'],
+            )
+            for subject in course['subjects']
+        }
+        for course_id, course in courses.items()
+    }
+
+
+def _check_progress(
+    user: Dict[str, Any],
+    subjects: Dict[str, Tuple[Set[str], str]],
+    *,
+    repair: bool,
+) -> List[str]:
+    # Progresso, notas e tentativas devem ser de disciplinas do curso do aluno.
+    problems = []
+    tests = {test_id for _, test_id in subjects.values()}
+
+    outside = [
+        key
+        for field, valid in (
+            ('current_lesson', subjects),
+            ('grades', subjects),
+            ('attempts', tests),
+        )
+        for key in user.get(field) or {}
+        if key not in valid
+    ]
+    if outside:
+        problems.append('disciplina_fora_do_curso')
+
+    missing = [
+        subject_id
+        for subject_id, lesson_id in (user.get('current_lesson') or {}).items()
+        if subject_id in subjects and lesson_id not in subjects[subject_id][0]
+    ]
+    if missing:
+        problems.append('aula_inexistente')
+
+    if repair and (outside or missing):
+        for field, valid in (
+            ('current_lesson', subjects),
+            ('grades', subjects),
+            ('attempts', tests),
+        ):
+            values = user.get(field) or {}
+            user[field] = {k: v for k, v in values.items() if k in valid}
+        # Sem a aula atual, o aluno volta para a primeira aula da disciplina.
+        for subject_id in missing:
+            del user['current_lesson'][subject_id]
+
+    return problems
+
+
+def check_user(
+    username: str,
+    user: Dict[str, Any],
+    catalog: CatalogIndex,
+    *,
+    repair: bool,
+) -> List[str]:
+    """
+    Verifica um usuário contra o catálogo, reparando-o caso `repair` seja verdadeiro.
+
+    Returns
+    -------
+    List[:class:`str`]
+        Os problemas encontrados, dentre as chaves de :data:`PROBLEMS`.
+    """
+    problems = []
+
+    if user.get('username') != username:
+        problems.append('nome_divergente')
+        if repair:
+            user['username'] = username
+
+    course_id = user.get('course_id')
+    if course_id is not None and course_id not in catalog:
+        # O progresso fica como está, pois o migrate_progress.py pode levá-lo
+        # para o curso novo.
+        problems.append('curso_inexistente')
+    else:
+        subjects = catalog.get(course_id, {}) if course_id is not None else {}
+        problems.extend(_check_progress(user, subjects, repair=repair))
+
+    if repair and is_repaired(problems):
+        user['version'] = user.get('version', 0) + 1
+
+    return problems
+
+
+def is_repaired(problems: List[str]) -> bool:
+    """
+    Retorna se algum dos problemas de um usuário é reparado.
+    """
+    return any(PROBLEMS[problem][1] for problem in problems)
+
+
+class Findings:
+    """
+    Acumula a quantidade de cada problema e alguns nomes de usuário de exemplo.
+
+    Parameters
+    ----------
+    examples: :class:`int`
+        Quantos nomes de usuário guardar por problema.
+    """
+
+    def __init__(self, examples: int):
+        self.examples = examples
+        self.counts = Counter()
+        self.found: Dict[str, List[str]] = {}
+
+    def report(self, problem: str, username: str):
+        self.counts[problem] += 1
+        usernames = self.found.setdefault(problem, [])
+        if len(usernames) < self.examples:
+            usernames.append(username)
+
+
+def _check_users(
+    shard: int,
+    users_path: str,
+    credentials: Set[str],
+    seen: Set[str],
+    catalog: CatalogIndex,
+    findings: Findings,
+    repaired: Dict[str, Dict[str, Any]],
+    *,
+    repair: bool,
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    shard_count = get_shard_count()
+
+    for username, user in iter_data_file(users_path):
+        seen.add(username)
+        findings.counts['usuários'] += 1
+
+        if username not in credentials:
+            findings.report('sem_senha', username)
+        if get_shard(username, shard_count) != shard:
+            findings.report('particao_errada', username)
+        problems = check_user(username, user, catalog, repair=repair)
+        for problem in problems:
+            findings.report(problem, username)
+        if repair and is_repaired(problems):
+            repaired[username] = user
+
+        yield username, user
+
+
+def check_shard(
+    shard: int,
+    users_path: str,
+    logins_path: str,
+    *,
+    catalog: CatalogIndex,
+    repair: bool,
+    examples: int,
+) -> Tuple[Findings, List[Tuple[str, str, int]], Dict[str, Changes]]:
+    """
+    Verifica uma partição, lendo um usuário por vez.
+
+    Executada em um processo separado para cada partição. Apenas os nomes de
+    usuário dos logins e dos usuários, e os usuários reparados, ficam em memória.
+
+    Returns
+    -------
+    Tuple[:class:`Findings`, List[Tuple[:class:`str`, :class:`str`, :class:`int`]], Dict[:class:`str`, Changes]]
+        Os problemas encontrados e, caso `repair` seja verdadeiro, os arquivos
+        temporários a serem colocados no lugar com :func:`replace_data_files` e as
+        alterações de cada arquivo, para o registro de alterações.
+    """
+    findings = Findings(examples)
+    replacements = []
+    changes: Dict[str, Changes] = {}
+    repaired: Dict[str, Dict[str, Any]] = {}
+
+    logins_generation = get_generation(logins_path)
+    users_generation = get_generation(users_path)
+    credentials = {username for username, _ in iter_data_file(logins_path)}
+    seen: Set[str] = set()
+
+    users = _check_users(
+        shard,
+        users_path,
+        credentials,
+        seen,
+        catalog,
+        findings,
+        repaired,
+        repair=repair,
+    )
+    if repair:
+        # A partição é escrita enquanto é lida, mas só é substituída caso algum
+        # usuário tenha sido reparado, para não mudar a geração à toa.
+        temp_path = f'{users_path}.rewriting'
+        write_data_items(temp_path, users, users_path)
+        if repaired:
+            replacements.append((users_path, temp_path, users_generation))
+            changes[users_path] = (repaired, [])
+        else:
+            os.remove(resolve_path(temp_path))
+    else:
+        for _ in users:
+            pass
+
+    orphans = credentials - seen
+    for username in sorted(orphans):
+        findings.report('senha_sem_usuario', username)
+
+    if repair and orphans:
+        replacements.append(_remove_logins(logins_path, logins_generation, orphans))
+        changes[logins_path] = ({}, sorted(orphans))
+
+    return findings, replacements, changes
+
+
+def _remove_logins(
+    path: str, generation: int, usernames: Set[str]
+) -> Tuple[str, str, int]:
+    temp = f'{path}.rewriting'
+    write_data_items(
+        temp,
+        (
+            (username, password)
+            for username, password in iter_data_file(path)
+            if username not in usernames
+        ),
+        path,
+    )
+    return path, temp, generation
+
+
+def record_repairs(changes: Dict[str, Changes], path: str, generation: int):
+    """
+    Registra as correções de um arquivo substituído e, caso seja um arquivo de
+    usuários, reconstrói os índices da partição.
+    """
+    changed, removed = changes[path]
+    if changed or removed:
+        record_changes(path, generation, changed, removed)
+    if os.path.basename(path) == 'usuarios.json':
+        rebuild_index(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Verifica se os usuários, as senhas e o catálogo estão de acordo.'
+    )
+    parser.add_argument(
+        '--reparar', action='store_true', help='corrige os problemas reparáveis'
+    )
+    parser.add_argument('--processos', type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        '--exemplos', type=int, default=5, help='usuários exibidos por problema'
+    )
+    args = parser.parse_args()
+
+    catalog = build_catalog_index(get_data_file(data_path('cursos.json')))
+    users_paths = get_shard_files('usuarios.json')
+    logins_paths = get_shard_files('logins.json')
+
+    findings = Findings(args.exemplos)
+    replacements = []
+    changes: Dict[str, Changes] = {}
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.processos) as executor:
+        for shard_findings, shard_replacements, shard_changes in executor.map(
+            partial(
+                check_shard,
+                catalog=catalog,
+                repair=args.reparar,
+                examples=args.exemplos,
+            ),
+            range(len(users_paths)),
+            users_paths,
+            logins_paths,
+        ):
+            findings.counts.update(shard_findings.counts)
+            for problem, usernames in shard_findings.found.items():
+                findings.found.setdefault(problem, []).extend(usernames)
+            replacements.extend(shard_replacements)
+            changes.update(shard_changes)
+
+    if args.reparar:
+        try:
+            replace_data_files(replacements, partial(record_repairs, changes))
+        except DataChangedError as e:
+            parser.exit(1, f'{e} Nenhuma correção foi salva.\n')
+
+    counts = findings.counts
+    print(
+        f'{counts["usuários"]} usuários verificados em '
+        f'{time.perf_counter() - start:.2f}s.'
+    )
+    for problem, (description, repairable) in PROBLEMS.items():
+        if not counts[problem]:
+            continue
+
+        status = ' (reparados)' if args.reparar and repairable else ''
+        print(f'{counts[problem]} {description}{status}')
+        print('  ' + ', '.join(findings.found[problem][: args.exemplos]))
+
+    if not any(counts[problem] for problem in PROBLEMS):
+        print('Nenhum problema encontrado.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+import io
+import csv
+import sys
+import gzip
+import json
+import argparse
+from typing import IO, Any, Dict, List, Iterator, Optional, Sequence
+
+from modules.data import data_path, get_data_file, iter_data_file, get_shard_files
+from modules.snapshots import Snapshot, open_snapshot
+
+# Tamanho do buffer de escrita do arquivo exportado.
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+USER_COLUMNS = ('username', 'full_name', 'age', 'gender', 'city', 'course_id')
+
+
+class Catalog:
+    """
+    Índice dos cursos usado para resolver os IDs salvos no progresso dos alunos.
+
+    Parameters
+    ----------
+    courses: Mapping[:class:`str`, Any]
+        O conteúdo de "cursos.json".
+    course_ids: Sequence[:class:`str`]
+        Os cursos que terão colunas na exportação.
+    """
+
+    def __init__(self, courses: Dict[str, Any], course_ids: Sequence[str]):
+        self.course_names = {
+            course_id: course['name'] for course_id, course in courses.items()
+        }
+        self.subject_names: Dict[str, str] = {}
+        self.item_titles: Dict[str, str] = {'-': 'Concluída'}
+        self.course_subjects: Dict[str, List[str]] = {}
+
+        for course_id, course in courses.items():
+            subjects = sorted(course['subjects'], key=lambda x: x['name'])
+            self.course_subjects[course_id] = [subject['id'] for subject in subjects]
+
+            for subject in subjects:
+                self.subject_names[subject['id']] = subject['name']
+                self.item_titles[subject['test']['id']] = 'Avaliação'
+                for lesson in subject['lessons']:
+                    self.item_titles[lesson['id']] = lesson['title']
+
+        self.columns = list(USER_COLUMNS)
+        self.columns.append('course_name')
+        for course_id in course_ids:
+            for subject_id in self.course_subjects[course_id]:
+                self.columns.extend(
+                    (
+                        f'{subject_id}_subject',
+                        f'{subject_id}_lesson',
+                        f'{subject_id}_lesson_title',
+                        f'{subject_id}_grade',
+                    )
+                )
+
+    def flatten(self, user: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Transforma um usuário em uma linha, com colunas por disciplina.
+
+        Parameters
+        ----------
+        user: Dict[:class:`str`, Any]
+            Os dados do usuário como salvos em "usuarios.json".
+
+        Returns
+        -------
+        Dict[:class:`str`, Any]
+            A linha a ser exportada. Apenas as disciplinas do curso do usuário são
+            incluídas.
+        """
+        row = {column: user.get(column) for column in USER_COLUMNS}
+        row['course_name'] = self.course_names.get(user.get('course_id'))
+
+        current_lesson = user.get('current_lesson') or {}
+        grades = user.get('grades') or {}
+
+        for subject_id in self.course_subjects.get(user.get('course_id'), ()):
+            lesson_id = current_lesson.get(subject_id)
+            row[f'{subject_id}_subject'] = self.subject_names[subject_id]
+            row[f'{subject_id}_lesson'] = lesson_id
+            row[f'{subject_id}_lesson_title'] = self.item_titles.get(lesson_id)
+            row[f'{subject_id}_grade'] = grades.get(subject_id)
+
+        return row
+
+
+def iter_users(
+    course_ids: Optional[Sequence[str]],
+    cities: Optional[Sequence[str]],
+    snapshot: Optional[Snapshot] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Percorre os usuários de todas as partições sem carregar os arquivos inteiros.
+
+    Parameters
+    ----------
+    course_ids: Optional[Sequence[:class:`str`]]
+        Se especificado, apenas os alunos destes cursos são retornados.
+    cities: Optional[Sequence[:class:`str`]]
+        Se especificado, apenas os alunos destas cidades são retornados.
+    snapshot: Optional[:class:`Snapshot`]
+        Se especificado, os usuários são lidos da cópia em vez dos arquivos atuais.
+
+    Yields
+    ------
+    Dict[:class:`str`, Any]
+        Os dados de cada usuário.
+    """
+    course_filter = set(course_ids) if course_ids else None
+    city_filter = {city.casefold() for city in cities} if cities else None
+
+    for path in get_shard_files('usuarios.json'):
+        if snapshot is not None:
+            path = snapshot.path(path)
+
+        for _, user in iter_data_file(path):
+            if course_filter is not None and user.get('course_id') not in course_filter:
+                continue
+            if city_filter is not None and user['city'].casefold() not in city_filter:
+                continue
+
+            yield user
+
+
+def open_output(path: str, *, compress: bool) -> IO[str]:
+    """
+    Abre o arquivo de saída com um buffer grande, opcionalmente comprimido com gzip.
+
+    Parameters
+    ----------
+    path: :class:`str`
+        Caminho do arquivo. "-" representa a saída padrão.
+    compress: :class:`bool`
+        Se a saída deve ser comprimida com gzip.
+
+    Returns
+    -------
+    IO[:class:`str`]
+        O arquivo de texto a ser escrito.
+    """
+    # O nível 6 é bem mais rápido que o padrão (9) e comprime quase o mesmo.
+    if path == '-':
+        raw = sys.stdout.buffer
+        if compress:
+            raw = gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6)
+    elif compress:
+        raw = gzip.GzipFile(path, mode='wb', compresslevel=6)
+    else:
+        raw = open(path, 'wb')  # noqa: SIM115
+
+    return io.TextIOWrapper(
+        io.BufferedWriter(raw, buffer_size=WRITE_BUFFER_SIZE),  # type: ignore
+        encoding='utf-8',
+        newline='',
+    )
+
+
+def export_users(
+    output: IO[str],
+    output_format: str,
+    course_ids: Optional[Sequence[str]] = None,
+    cities: Optional[Sequence[str]] = None,
+    snapshot: Optional[Snapshot] = None,
+) -> int:
+    """
+    Exporta os usuários linha por linha.
+
+    Parameters
+    ----------
+    output: IO[:class:`str`]
+        O arquivo onde os dados serão escritos.
+    output_format: :class:`str`
+        "csv" ou "ndjson".
+    course_ids: Optional[Sequence[:class:`str`]]
+        Filtra os alunos por curso.
+    cities: Optional[Sequence[:class:`str`]]
+        Filtra os alunos por cidade.
+    snapshot: Optional[:class:`Snapshot`]
+        Se especificado, os dados são lidos da cópia em vez dos arquivos atuais.
+
+    Returns
+    -------
+    :class:`int`
+        A quantidade de linhas exportadas.
+    """
+    courses_path = data_path('cursos.json')
+    if snapshot is not None:
+        courses_path = snapshot.path(courses_path)
+
+    courses = get_data_file(courses_path)
+    catalog = Catalog(courses, course_ids or sorted(courses))
+
+    if output_format == 'csv':
+        writer = csv.DictWriter(output, fieldnames=catalog.columns)
+        writer.writeheader()
+
+    count = 0
+    for user in iter_users(course_ids, cities, snapshot):
+        row = catalog.flatten(user)
+
+        if output_format == 'csv':
+            writer.writerow(row)
+        else:
+            output.write(json.dumps(row, ensure_ascii=False))
+            output.write('\n')
+
+        count += 1
+
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Exporta os alunos, seu progresso e notas em CSV ou NDJSON.'
+    )
+    parser.add_argument('saida', help='arquivo de saída ou "-" para a saída padrão')
+    parser.add_argument('--formato', choices=('csv', 'ndjson'), default=None)
+    parser.add_argument('--curso', action='append', help='filtra pelo ID do curso')
+    parser.add_argument('--cidade', action='append', help='filtra pela cidade')
+    parser.add_argument('--gzip', action='store_true', help='comprime a saída')
+    args = parser.parse_args()
+
+    path: str = args.saida
+    compress = args.gzip or path.endswith('.gz')
+
+    output_format = args.formato
+    if output_format is None:
+        output_format = 'ndjson' if '.ndjson' in path or '.jsonl' in path else 'csv'
+
+    courses = get_data_file(data_path('cursos.json'))
+    for course_id in args.curso or ():
+        if course_id not in courses:
+            parser.error(f'O curso "{course_id}" não existe.')
+
+    # A exportação lê uma cópia fixa, sem ver arquivos sendo salvos pelos alunos.
+    with open_snapshot() as snapshot, open_output(path, compress=compress) as output:
+        count = export_users(output, output_format, args.curso, args.cidade, snapshot)
+
+    print(f'{count} alunos exportados.', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
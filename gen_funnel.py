@@ -0,0 +1,136 @@
+import csv
+import time
+import argparse
+import contextlib
+from typing import Any, Mapping
+
+from modules.data import data_path, get_data_file
+from modules.analytics import TIME_BUCKET_LABELS, FunnelAnalytics
+from modules.exceptions import DataChangedError
+
+
+def follow(interval: float):
+    """
+    Processa os eventos novos a cada `interval` segundos, até Ctrl+C.
+    """
+    courses = get_data_file(data_path('cursos.json'))
+    offset = FunnelAnalytics.load().offset
+
+    with contextlib.suppress(KeyboardInterrupt):
+        while True:
+            try:
+                analytics = FunnelAnalytics.refresh(courses)
+            except DataChangedError:
+                print('Agregados alterados por outro processo; tentando de novo.')
+            else:
+                if analytics.offset != offset:
+                    offset = analytics.offset
+                    print(f'Eventos processados até a posição {offset}.')
+
+            time.sleep(interval)
+
+
+def write_reports(courses: Mapping[str, Any], analytics: FunnelAnalytics):
+    subjects = sorted(
+        (subject for course in courses.values() for subject in course['subjects']),
+        key=lambda x: x['name'],
+    )
+
+    with open('funnel_stats.csv', 'w', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(
+            csvfile,
+            fieldnames=['Disciplina', 'Etapa', 'Alunos', 'f%', 'Visualizações'],
+        )
+        writer.writeheader()
+
+        for subject in subjects:
+            steps = [
+                (lesson['id'], lesson['title'])
+                for lesson in sorted(subject['lessons'], key=lambda x: x['id'])
+            ]
+            steps.append((subject['test']['id'], 'Avaliação'))
+
+            first = analytics.reached.get(steps[0][0], 0)
+            for step_id, title in steps:
+                reached = analytics.reached.get(step_id, 0)
+                writer.writerow(
+                    {
+                        'Disciplina': subject['name'],
+                        'Etapa': title,
+                        'Alunos': reached,
+                        'f%': format(reached / first * 100 if first else 0, '.0f'),
+                        'Visualizações': analytics.views.get(step_id, 0),
+                    }
+                )
+
+    with open('lesson_time_stats.csv', 'w', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['Disciplina', 'Aula', *TIME_BUCKET_LABELS])
+
+        for subject in subjects:
+            for lesson in sorted(subject['lessons'], key=lambda x: x['id']):
+                histogram = analytics.step_time.get(lesson['id'])
+                if histogram is not None:
+                    writer.writerow([subject['name'], lesson['title'], *histogram])
+
+    with open('completion_time_stats.csv', 'w', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['Disciplina', *TIME_BUCKET_LABELS])
+
+        for subject in subjects:
+            histogram = analytics.completion_time.get(subject['id'])
+            if histogram is not None:
+                writer.writerow([subject['name'], *histogram])
+
+    with open('cohort_stats.csv', 'w', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(
+            csvfile,
+            fieldnames=['Coorte', 'Matriculados', 'Disciplinas Concluídas'],
+        )
+        writer.writeheader()
+
+        for cohort, counts in sorted(analytics.cohorts.items()):
+            writer.writerow(
+                {
+                    'Coorte': cohort,
+                    'Matriculados': counts['enrolled'],
+                    'Disciplinas Concluídas': counts['completed'],
+                }
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Atualiza os agregados do funil com os eventos novos e gera os '
+        'relatórios de funil, tempo por aula, tempo de conclusão e coortes.'
+    )
+    parser.add_argument(
+        '--continuo',
+        action='store_true',
+        help='continua processando os eventos conforme chegam, sem gerar relatórios',
+    )
+    parser.add_argument(
+        '--intervalo',
+        type=float,
+        default=5,
+        help='segundos entre as atualizações no modo contínuo',
+    )
+    args = parser.parse_args()
+
+    if args.continuo:
+        follow(args.intervalo)
+        return
+
+    courses = get_data_file(data_path('cursos.json'))
+
+    # Processa apenas os eventos registrados desde a última atualização.
+    try:
+        analytics = FunnelAnalytics.refresh(courses)
+    except DataChangedError as e:
+        parser.exit(1, f'{e} Tente novamente.\n')
+
+    write_reports(courses, analytics)
+
+
+if __name__ == '__main__':
+    main()
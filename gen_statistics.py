@@ -1,152 +1,368 @@
+import os
 import csv
-from collections import defaultdict
+import contextlib
+from typing import Any, Dict, Tuple, Optional, Sequence
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 
-from modules.data import get_data_file
-from modules.users import User
+from modules.data import data_path, get_data_file, save_data_file, get_shard_files
+from modules.grades import AGE_BANDS, GradeCube, GradeStats, get_age_band
+from modules.snapshots import Snapshot, open_snapshot
 
-users = get_data_file('data/logins.json')
-courses = get_data_file('data/cursos.json')
+GRADE_CUBE_FILE = 'cubo_notas.json'
 
-course_count = defaultdict(int)
-gendered_course_count = defaultdict(lambda: {'h': 0, 'm': 0})
-city_count = defaultdict(int)
-age_count = defaultdict(int)
+# Colunas do relatório por curso e gênero.
+GENDER_COLUMNS = {
+    'h': 'Número de Homens',
+    'm': 'Número de Mulheres',
+    'n': 'Gênero Não Informado',
+}
+
+# Linha dos alunos que ainda não escolheram um curso.
+NO_COURSE = 'Sem curso'
 
 
 def get_range(n):
-    if n < 10:
-        return (0, 10)
-    if n < 20:
-        return (10, 20)
-    if n < 30:
-        return (20, 30)
-    if n < 40:
-        return (30, 40)
-    if n < 50:
-        return (40, 50)
-    if n < 60:
-        return (50, 60)
-    if n < 70:
-        return (60, 70)
-    return (70, 100)
-
-
-for username in users:
-    user = User.find(username)
-    assert user is not None
-    assert user.course is not None
-    assert user.gender is not None
-
-    course_count[user.course.name] += 1
-    gendered_course_count[user.course.name][user.gender] += 1
-    city_count[user.city] += 1
-    age_count[get_range(user.age)] += 1
-
-user_count = len(users)
-
-age_analyis = dict(
-    sorted(
-        {
-            r: (n, n / user_count, n / user_count * 100) for r, n in age_count.items()
-        }.items(),
-        key=lambda x: x[0][0],
-    )
-)
+    return AGE_BANDS[get_age_band(n)]
 
-city_analysis = dict(
-    sorted(
-        {
-            city: (n, n / user_count, n / user_count * 100)
-            for city, n in city_count.items()
-        }.items(),
-        key=lambda x: x[0],
+
+def aggregate_shard(
+    users_path: str, logins_path: str, courses: Dict[str, Any]
+) -> Tuple[int, Counter, Counter, Counter, Counter, GradeCube]:
+    """
+    Conta os alunos de uma partição.
+
+    Executada em um processo separado para cada partição, por isso cada arquivo é
+    lido apenas uma vez e os cursos são resolvidos pelo nome já carregado.
+
+    Parameters
+    ----------
+    users_path: :class:`str`
+        Caminho do arquivo de usuários da partição.
+    logins_path: :class:`str`
+        Caminho do arquivo de logins da partição.
+    courses: Dict[:class:`str`, Any]
+        O conteúdo de "cursos.json".
+
+    Returns
+    -------
+    Tuple[:class:`int`, :class:`Counter`, :class:`Counter`, :class:`Counter`, :class:`Counter`, :class:`GradeCube`]
+        A quantidade de alunos, as contagens parciais por curso, por curso e gênero,
+        por cidade e por faixa etária, e o cubo de notas da partição.
+    """
+    users = get_data_file(users_path)
+    logins = get_data_file(logins_path)
+    course_names = {course_id: course['name'] for course_id, course in courses.items()}
+
+    course_count = Counter()
+    gendered_course_count = Counter()
+    city_count = Counter()
+    age_count = Counter()
+
+    # O login é salvo antes do usuário no cadastro, então a cópia pode ter o login
+    # de um aluno que ainda está se cadastrando. Ele entra na próxima contagem.
+    students = [users[username] for username in logins if username in users]
+
+    for user in students:
+        # O gênero "não especificar" é salvo como None.
+        gender = user['gender'] or 'n'
+        course_id = user['course_id']
+        course_name = NO_COURSE if course_id is None else course_names[course_id]
+
+        course_count[course_name] += 1
+        gendered_course_count[course_name, gender] += 1
+        city_count[user['city']] += 1
+        age_count[get_range(user['age'])] += 1
+
+    cube = GradeCube.build(courses, students)
+
+    return (
+        len(students),
+        course_count,
+        gendered_course_count,
+        city_count,
+        age_count,
+        cube,
     )
-)
 
-with open('course_stats.csv', 'w', encoding='utf-8') as csvfile:
-    writer = csv.DictWriter(
-        csvfile,
-        fieldnames=['Cursos', 'Alunos Matriculados'],
+
+def main():
+    # Os dados são lidos de uma cópia fixa, então o relatório não vê arquivos sendo
+    # salvos pelos alunos, e os alunos não esperam pelo relatório.
+    with open_snapshot() as snapshot:
+        generate(snapshot)
+
+
+def generate(snapshot: Snapshot, processes: Optional[int] = None):
+    """
+    Gera os relatórios a partir de uma cópia dos dados.
+
+    Parameters
+    ----------
+    snapshot: :class:`Snapshot`
+        A cópia lida.
+    processes: Optional[:class:`int`]
+        Quantidade de processos. Por padrão, um por partição. Nunca passa da
+        quantidade de CPUs. Com 1, as partições são agregadas uma de cada vez no próprio
+        processo, como nas tarefas em segundo plano, que limitam a leitura de cada
+        processo.
+    """
+    courses = get_data_file(snapshot.path(data_path('cursos.json')))
+
+    users_paths = [snapshot.path(path) for path in get_shard_files('usuarios.json')]
+    logins_paths = [snapshot.path(path) for path in get_shard_files('logins.json')]
+
+    user_count = 0
+    course_count = Counter()
+    gendered_course_count = Counter()
+    city_count = Counter()
+    age_count = Counter()
+    cube = None
+
+    # Cada partição é agregada em um processo e as contagens parciais são somadas.
+    with contextlib.ExitStack() as stack:
+        if processes == 1:
+            map_shards = map
+        else:
+            map_shards = stack.enter_context(
+                ProcessPoolExecutor(
+                    max_workers=min(processes or len(users_paths), os.cpu_count() or 1)
+                )
+            ).map
+
+        for count, courses_, gendered, cities, ages, shard_cube in map_shards(
+            aggregate_shard,
+            users_paths,
+            logins_paths,
+            [courses] * len(users_paths),
+        ):
+            user_count += count
+            course_count.update(courses_)
+            gendered_course_count.update(gendered)
+            city_count.update(cities)
+            age_count.update(ages)
+
+            if cube is None:
+                cube = shard_cube
+            else:
+                cube.merge(shard_cube)
+
+    write_reports(
+        user_count, course_count, gendered_course_count, city_count, age_count
     )
-    writer.writeheader()
 
-    for course, count in sorted(course_count.items()):
-        writer.writerow({'Cursos': course, 'Alunos Matriculados': count})
-    writer.writerow({'Cursos': 'Total de Alunos', 'Alunos Matriculados': user_count})
+    if cube is not None:
+        # O cubo é salvo para que outras consultas não precisem reler os alunos.
+        save_data_file(data_path(GRADE_CUBE_FILE), cube.to_dict())
+        write_grade_reports(cube, courses)
+
 
-with open('gendered_course_stats.csv', 'w', encoding='utf-8') as csvfile:
-    writer = csv.DictWriter(
-        csvfile,
-        fieldnames=['Cursos', 'Número de Homens', 'Número de Mulheres'],
+def write_reports(
+    user_count: int,
+    course_count: Counter,
+    gendered_course_count: Counter,
+    city_count: Counter,
+    age_count: Counter,
+):
+    """
+    Escreve os relatórios em CSV a partir das contagens agregadas.
+    """
+    course_names = sorted(course_count)
+
+    age_analyis = dict(
+        sorted(
+            {
+                r: (n, n / user_count, n / user_count * 100)
+                for r, n in age_count.items()
+            }.items(),
+            key=lambda x: x[0][0],
+        )
+    )
+
+    city_analysis = dict(
+        sorted(
+            {
+                city: (n, n / user_count, n / user_count * 100)
+                for city, n in city_count.items()
+            }.items(),
+            key=lambda x: x[0],
+        )
     )
-    writer.writeheader()
 
-    for course, counts in sorted(gendered_course_count.items()):
+    with open('course_stats.csv', 'w', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(
+            csvfile,
+            fieldnames=['Cursos', 'Alunos Matriculados'],
+        )
+        writer.writeheader()
+
+        for course, count in sorted(course_count.items()):
+            writer.writerow({'Cursos': course, 'Alunos Matriculados': count})
+        writer.writerow(
+            {'Cursos': 'Total de Alunos', 'Alunos Matriculados': user_count}
+        )
+
+    with open('gendered_course_stats.csv', 'w', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(
+            csvfile,
+            fieldnames=['Cursos', *GENDER_COLUMNS.values()],
+        )
+        writer.writeheader()
+
+        for course in course_names:
+            writer.writerow(
+                {
+                    'Cursos': course,
+                    **{
+                        column: gendered_course_count[course, gender]
+                        for gender, column in GENDER_COLUMNS.items()
+                    },
+                }
+            )
+
         writer.writerow(
             {
-                'Cursos': course,
-                'Número de Homens': counts['h'],
-                'Número de Mulheres': counts['m'],
+                'Cursos': 'Total',
+                **{
+                    column: sum(
+                        n
+                        for (_, user_gender), n in gendered_course_count.items()
+                        if user_gender == gender
+                    )
+                    for gender, column in GENDER_COLUMNS.items()
+                },
             }
         )
+    with open('age_stats.csv', 'w', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(
+            csvfile,
+            fieldnames=['Faixa Etária', 'fi', 'fr', 'f%'],
+        )
+        writer.writeheader()
 
-    writer.writerow(
-        {
-            'Cursos': 'Total',
-            'Número de Homens': sum(
-                counts['h'] for counts in gendered_course_count.values()
-            ),
-            'Número de Mulheres': sum(
-                counts['m'] for counts in gendered_course_count.values()
-            ),
-        }
-    )
-with open('age_stats.csv', 'w', encoding='utf-8') as csvfile:
-    writer = csv.DictWriter(
-        csvfile,
-        fieldnames=['Faixa Etária', 'fi', 'fr', 'f%'],
-    )
-    writer.writeheader()
-
-    for age_range, (count, proportion, percentage) in age_analyis.items():
+        for age_range, (count, proportion, percentage) in age_analyis.items():
+            writer.writerow(
+                {
+                    'Faixa Etária': f'{age_range[0]} |---------- {age_range[1]}',
+                    'fi': format(count, '.0f'),
+                    'fr': format(proportion, '.2f'),
+                    'f%': format(percentage, '.0f'),
+                }
+            )
         writer.writerow(
             {
-                'Faixa Etária': f'{age_range[0]} |---------- {age_range[1]}',
-                'fi': format(count, '.0f'),
-                'fr': format(proportion, '.2f'),
-                'f%': format(percentage, '.0f'),
+                'Faixa Etária': 'Total',
+                'fi': format(user_count, '.0f'),
+                'fr': '1.00',
+                'f%': '100',
             }
         )
-    writer.writerow(
-        {
-            'Faixa Etária': 'Total',
-            'fi': format(user_count, '.0f'),
-            'fr': '1.00',
-            'f%': '100',
-        }
-    )
 
-with open('city_stats.csv', 'w', encoding='utf-8') as csvfile:
-    writer = csv.DictWriter(
-        csvfile,
-        fieldnames=['Cidade', 'fi', 'fr', 'f%'],
-    )
-    writer.writeheader()
+    with open('city_stats.csv', 'w', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(
+            csvfile,
+            fieldnames=['Cidade', 'fi', 'fr', 'f%'],
+        )
+        writer.writeheader()
 
-    for city, (count, proportion, percentage) in city_analysis.items():
+        for city, (count, proportion, percentage) in city_analysis.items():
+            writer.writerow(
+                {
+                    'Cidade': city,
+                    'fi': format(count, '.0f'),
+                    'fr': format(proportion, '.2f'),
+                    'f%': format(percentage, '.0f'),
+                }
+            )
         writer.writerow(
             {
-                'Cidade': city,
-                'fi': format(count, '.0f'),
-                'fr': format(proportion, '.2f'),
-                'f%': format(percentage, '.0f'),
+                'Cidade': 'Total',
+                'fi': format(user_count, '.0f'),
+                'fr': '1.00',
+                'f%': '100',
             }
         )
-    writer.writerow(
+
+
+def write_grade_reports(cube: GradeCube, courses: Dict[str, Any]):
+    """
+    Escreve os relatórios de notas em CSV a partir do cubo: por disciplina e por
+    disciplina cruzada com cidade, gênero e faixa etária.
+    """
+    subject_names = {
+        subject['id']: subject['name']
+        for course in courses.values()
+        for subject in course['subjects']
+    }
+    gender_names = {'h': 'Masculino', 'm': 'Feminino', 'n': 'Não informado'}
+
+    write_grade_report('grade_stats.csv', cube, (), (), subject_names)
+    write_grade_report(
+        'grade_city_stats.csv', cube, ('city',), ('Cidade',), subject_names
+    )
+    write_grade_report(
+        'grade_gender_stats.csv',
+        cube,
+        ('gender',),
+        ('Gênero',),
+        subject_names,
+        gender_names,
+    )
+    write_grade_report(
+        'grade_age_stats.csv', cube, ('age',), ('Faixa Etária',), subject_names
+    )
+
+
+def write_grade_report(
+    path: str,
+    cube: GradeCube,
+    dimensions: Sequence[str],
+    headers: Sequence[str],
+    subject_names: Dict[str, str],
+    value_names: Optional[Dict[str, str]] = None,
+):
+    """
+    Escreve um relatório de notas agrupado por disciplina e por `dimensions`, com
+    uma linha final com o total de todas as disciplinas.
+    """
+    fieldnames = [
+        'Disciplinas',
+        *headers,
+        'Notas',
+        'Média',
+        'Mediana',
+        'Desvio Padrão',
+        'Aprovação %',
+    ]
+
+    with open(path, 'w', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+
+        groups = cube.query(('subject', *dimensions))
+        for (subject_id, *values), stats in groups.items():
+            row = {'Disciplinas': subject_names.get(subject_id, subject_id)}
+            for header, value in zip(headers, values):
+                row[header] = (value_names or {}).get(value, value)
+            writer.writerow(grade_row(row, stats))
+
+        (stats,) = cube.query().values() or (None,)
+        if stats is not None:
+            writer.writerow(grade_row({'Disciplinas': 'Total'}, stats))
+
+
+def grade_row(row: Dict[str, Any], stats: GradeStats) -> Dict[str, Any]:
+    row.update(
         {
-            'Cidade': 'Total',
-            'fi': format(user_count, '.0f'),
-            'fr': '1.00',
-            'f%': '100',
+            'Notas': stats.count,
+            'Média': format(stats.mean, '.1f'),
+            'Mediana': format(stats.median, '.1f'),
+            'Desvio Padrão': format(stats.stddev, '.1f'),
+            'Aprovação %': format(stats.pass_rate * 100, '.0f'),
         }
     )
+    return row
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+import contextlib
+from typing import Any, Dict, List, Tuple, Iterator, Optional
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from modules.data import (
+    data_path,
+    get_shard,
+    resolve_path,
+    get_data_file,
+    get_generation,
+    get_shard_files,
+    write_data_items,
+    replace_data_files,
+)
+from modules.users import User, validate_account
+from modules.changelog import record_changes
+from modules.passwords import hash_password
+from modules.exceptions import DataChangedError
+
+FIELDS = ('full_name', 'age', 'gender', 'city', 'username', 'password', 'course_id')
+
+# Gêneros aceitos no arquivo, já em minúsculas. Outros valores são passados como
+# estão para :func:`validate_account`, que os rejeita.
+GENDERS = {
+    '': 'n',
+    'h': 'h',
+    'homem': 'h',
+    'masculino': 'h',
+    'm': 'm',
+    'mulher': 'm',
+    'feminino': 'm',
+    'n': 'n',
+    'não especificar': 'n',
+    'não informado': 'n',
+}
+
+
+def read_rows(path: str) -> Iterator[Tuple[int, Dict[str, str], Optional[str]]]:
+    """
+    Lê as linhas de um arquivo CSV ou NDJSON, de acordo com a extensão.
+
+    Parameters
+    ----------
+    path: :class:`str`
+        Caminho do arquivo a ser importado.
+
+    Yields
+    ------
+    Tuple[:class:`int`, Dict[:class:`str`, :class:`str`], Optional[:class:`str`]]
+        O número da linha no arquivo, os campos da linha e, caso a linha não possa
+        ser lida, como um JSON inválido, o erro e nenhum campo.
+    """
+    with open(path, 'r', encoding='utf-8', newline='') as file:
+        if path.endswith(('.ndjson', '.jsonl')):
+            for line_number, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    yield line_number, {}, 'JSON inválido.'
+                    continue
+
+                if isinstance(row, dict):
+                    yield line_number, row, None
+                else:
+                    yield line_number, {}, 'A linha deve ser um objeto JSON.'
+        else:
+            # A linha 1 é o cabeçalho.
+            for line_number, row in enumerate(csv.DictReader(file), 2):
+                yield line_number, row, None
+
+
+def normalize_row(row: Dict[str, str]) -> Dict[str, str]:
+    """
+    Normaliza os campos de uma linha da mesma forma que o cadastro interativo.
+    """
+    row = {field: str(row.get(field) or '') for field in FIELDS}
+    gender = ' '.join(row['gender'].lower().split())
+
+    return {
+        'full_name': row['full_name'].strip().title(),
+        'age': row['age'].strip(),
+        'gender': GENDERS.get(gender, gender),
+        'city': row['city'].strip().title(),
+        # O login converte o usuário para minúsculas, então ele é salvo assim.
+        'username': row['username'].strip().lower(),
+        'password': row['password'],
+        'course_id': row['course_id'].strip().upper(),
+    }
+
+
+def save_batch(
+    contents: Dict[str, Dict[str, Any]],
+    generations: Dict[str, int],
+    changes: Dict[str, Dict[str, Any]],
+):
+    """
+    Salva as partições alteradas de uma só vez.
+
+    Cada partição é escrita em um arquivo temporário, e todas são colocadas no
+    lugar por :func:`replace_data_files`, ou nenhuma, caso alguma tenha mudado
+    desde a geração lida. As alterações são registradas com as partições ainda
+    travadas.
+
+    Parameters
+    ----------
+    contents: Dict[:class:`str`, Dict[:class:`str`, Any]]
+        O novo conteúdo de cada arquivo.
+    generations: Dict[:class:`str`, :class:`int`]
+        A geração de cada arquivo antes da sua leitura.
+    changes: Dict[:class:`str`, Dict[:class:`str`, Any]]
+        Os itens adicionados a cada arquivo, para :func:`record_changes`.
+    """
+    replacements = []
+    try:
+        for path, content in contents.items():
+            replacements.append((path, f'{path}.importing', generations[path]))
+            write_data_items(f'{path}.importing', content.items(), path)
+    except BaseException:
+        for _, temp_path, _ in replacements:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(resolve_path(temp_path))
+        raise
+
+    replace_data_files(
+        replacements,
+        lambda path, generation: record_changes(path, generation, changes[path]),
+    )
+
+
+def import_users(path: str, workers: int) -> List[Tuple[int, str, str]]:
+    """
+    Importa os usuários de um arquivo em um único lote.
+
+    Parameters
+    ----------
+    path: :class:`str`
+        Caminho do arquivo CSV ou NDJSON.
+    workers: :class:`int`
+        Quantidade de processos usados para gerar os hashes das senhas.
+
+    Returns
+    -------
+    List[Tuple[:class:`int`, :class:`str`, :class:`str`]]
+        O relatório de erros, com o número da linha, o usuário e o motivo.
+
+    Raises
+    ------
+    DataChangedError
+        Uma partição foi alterada durante a importação. Nenhum usuário é salvo.
+    """
+    start = time.perf_counter()
+
+    courses = get_data_file(data_path('cursos.json'))
+    users_paths = get_shard_files('usuarios.json')
+    logins_paths = get_shard_files('logins.json')
+
+    # Cada partição é lida uma única vez e mantida em memória até o lote ser salvo.
+    # As gerações são lidas antes, para que o lote não sobrescreva alunos
+    # cadastrados durante a importação.
+    generations = {path: get_generation(path) for path in users_paths + logins_paths}
+    users_shards = [get_data_file(path) for path in users_paths]
+    logins_shards = [get_data_file(path) for path in logins_paths]
+
+    usernames = set()
+    for shard in users_shards:
+        usernames.update(shard)
+
+    errors = []
+    accepted: List[User] = []
+    passwords: List[str] = []
+    row_count = 0
+
+    for line_number, raw_row, error in read_rows(path):
+        row_count += 1
+        if error is not None:
+            errors.append((line_number, '', error))
+            continue
+
+        row = normalize_row(raw_row)
+
+        error = validate_account(
+            row['full_name'],
+            row['age'],
+            row['gender'],
+            row['city'],
+            row['username'],
+            row['password'],
+        )
+        if error is None and row['username'] in usernames:
+            error = 'Usuário já existe.'
+        if error is None and row['course_id'] and row['course_id'] not in courses:
+            error = f'Curso "{row["course_id"]}" não existe.'
+
+        if error is not None:
+            errors.append((line_number, row['username'], error))
+            continue
+
+        usernames.add(row['username'])
+        accepted.append(
+            User(
+                row['full_name'],
+                int(row['age']),
+                None if row['gender'] == 'n' else row['gender'],
+                row['city'],
+                row['username'],
+                row['course_id'] or None,
+            )
+        )
+        passwords.append(row['password'])
+
+    # Os hashes são o passo mais caro, então são distribuídos entre os processos.
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        hashes = list(executor.map(hash_password, passwords, chunksize=chunksize))
+
+    # Usuários novos de cada partição, para o registro de alterações.
+    new_logins: Dict[int, Dict[str, str]] = defaultdict(dict)
+    new_users: Dict[int, Dict[str, Any]] = defaultdict(dict)
+    for user, hashed in zip(accepted, hashes):
+        shard = get_shard(user.username)
+        logins_shards[shard][user.username] = new_logins[shard][user.username] = hashed
+        users_shards[shard][user.username] = new_users[shard][user.username] = (
+            user.to_dict()
+        )
+
+    save_batch(
+        {
+            path: content
+            for shard in sorted(new_users)
+            for path, content in (
+                (logins_paths[shard], logins_shards[shard]),
+                (users_paths[shard], users_shards[shard]),
+            )
+        },
+        generations,
+        {
+            path: changes
+            for shard in sorted(new_users)
+            for path, changes in (
+                (logins_paths[shard], new_logins[shard]),
+                (users_paths[shard], new_users[shard]),
+            )
+        },
+    )
+
+    elapsed = time.perf_counter() - start
+    print(
+        f'{len(accepted)} de {row_count} linhas importadas em {elapsed:.2f}s '
+        f'({row_count / elapsed if elapsed else 0:.0f} linhas/s).'
+    )
+
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Importa alunos de um arquivo CSV ou NDJSON.'
+    )
+    parser.add_argument('arquivo', help='arquivo .csv, .ndjson ou .jsonl')
+    parser.add_argument(
+        '--erros', help='salva o relatório de erros neste arquivo CSV', default=None
+    )
+    parser.add_argument(
+        '--processos',
+        type=int,
+        default=os.cpu_count() or 1,
+        help='quantidade de processos para gerar os hashes',
+    )
+    args = parser.parse_args()
+
+    try:
+        errors = import_users(args.arquivo, args.processos)
+    except DataChangedError as e:
+        parser.exit(1, f'{e} Nenhum usuário foi importado; rode de novo.\n')
+
+    for line_number, username, error in errors:
+        print(f'Linha {line_number} ({username}): {error}')
+
+    if args.erros:
+        with open(args.erros, 'w', encoding='utf-8', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['Linha', 'Usuário', 'Erro'])
+            writer.writerows(errors)
+
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,348 @@
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import builtins
+import tempfile
+import threading
+import contextlib
+import tracemalloc
+from typing import Any, Dict, List, Callable, Optional
+from collections import Counter, deque, defaultdict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import main
+import modules.data
+import modules.users
+import modules.throttle
+from modules.data import data_path, get_data_file, save_data_file, get_shard_files
+from modules.persistence import enable_write_behind, disable_write_behind
+
+# Script e gerador de números aleatórios do aluno simulado em cada thread.
+_local = threading.local()
+
+
+class ScriptedInput:
+    """
+    Substitui :func:`input` e :func:`getpass.getpass` por respostas pré-definidas.
+
+    As respostas da fila são usadas em ordem. Quando a fila está vazia, as entradas
+    de menus ("> ") recebem uma alternativa aleatória e as demais recebem Enter,
+    o que é suficiente para responder avaliações de qualquer tamanho.
+
+    Parameters
+    ----------
+    rng: :class:`random.Random`
+        Gerador usado nas respostas aleatórias.
+    """
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.queue = deque()
+
+    def push(self, *answers: str):
+        self.queue.extend(answers)
+
+    def __call__(self, prompt: str = '') -> str:
+        if self.queue:
+            return self.queue.popleft()
+        if prompt == '> ':
+            return self.rng.choice('abcde')
+        return ''
+
+
+def _scripted_input(prompt: str = '') -> str:
+    return _local.script(prompt)
+
+
+def install_harness(data_dir: str, shard_count: int):
+    """
+    Prepara o processo para executar alunos simulados: usa a pasta de dados
+    temporária, responde às entradas com o script da thread atual e remove as
+    esperas e a saída do terminal.
+    """
+    modules.data.DATA_DIR = data_dir
+    modules.data.set_shard_count(shard_count)
+
+    builtins.input = _scripted_input
+    modules.users.getpass = _scripted_input
+    time.sleep = lambda _: None
+
+    sys.stdout = open(os.devnull, 'w', encoding='utf-8')  # noqa: SIM115
+
+
+def run_student(index: int, seed: int, course: Optional[int]) -> Dict[str, Any]:
+    """
+    Executa o fluxo completo de um aluno: cadastro, matrícula, todas as aulas da
+    primeira disciplina e a avaliação.
+
+    Returns
+    -------
+    Dict[:class:`str`, Any]
+        O nome de usuário, a disciplina cursada e as latências de cada etapa.
+    """
+    rng = random.Random(seed + index)
+    script = _local.script = ScriptedInput(rng)
+    latencies: Dict[str, List[float]] = defaultdict(list)
+
+    def step(name: str, function: Callable, *args: Any) -> Any:
+        start = time.perf_counter()
+        result = function(*args)
+        latencies[name].append(time.perf_counter() - start)
+        return result
+
+    username = f'simulado{index}'
+    password = f'senha{index}'
+    result = {'username': username, 'subject': None, 'latencies': latencies}
+
+    try:
+        # Cadastro.
+        script.push('c', 'Aluno Simulado', rng.choice('hmn'), str(rng.randint(14, 70)))
+        script.push('Assis', username, password, password)
+        user = step('cadastro', main.create_or_login_user)
+        assert user is not None
+
+        # Matrícula: escolhe o curso, confirma e aperta Enter.
+        course_count = len(get_data_file(data_path('cursos.json')))
+        script.push(str(course or rng.randint(1, course_count)), 's', '')
+        step('matricula', main.set_user_course, user)
+
+        script.push('1')
+        subject = step('disciplina', main.select_subject, user)
+        result['subject'] = subject.id
+
+        # Mesmo laço de main.main(): aulas até chegar à avaliação.
+        while True:
+            user.update()
+            current_lesson = user.current_lesson.get(subject.id, subject.lessons[0].id)
+            if current_lesson[-1] != 'L':
+                break
+            step('aula', main.show_lesson, user, subject, current_lesson)
+
+        step('avaliacao', main.show_test, user, subject)
+    except Exception as e:  # noqa: BLE001
+        # Erros como a leitura de um arquivo sendo escrito por outro processo são
+        # contabilizados em vez de interromper a simulação.
+        result['error'] = type(e).__name__
+
+    return result
+
+
+def run_worker(
+    data_dir: str,
+    shard_count: int,
+    indexes: List[int],
+    threads: int,
+    seed: int,
+    course: Optional[int],
+    *,
+    write_behind: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Executa um grupo de alunos em um processo, com `threads` alunos simultâneos.
+    """
+    install_harness(data_dir, shard_count)
+    if write_behind:
+        enable_write_behind()
+
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            return list(
+                executor.map(lambda index: run_student(index, seed, course), indexes)
+            )
+    finally:
+        disable_write_behind()
+
+
+def count_lost_updates(results: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Confere no disco o estado final de cada aluno simulado.
+
+    Como cada escrita lê e reescreve o arquivo inteiro, escritas simultâneas de
+    processos diferentes podem sobrescrever umas às outras.
+
+    Returns
+    -------
+    Dict[:class:`str`, :class:`int`]
+        Quantidade de alunos sem registro, sem login, sem curso ou sem a nota,
+        entre os que terminaram o fluxo sem erros.
+    """
+    users = {}
+    for path in get_shard_files('usuarios.json'):
+        users.update(get_data_file(path))
+    logins = {}
+    for path in get_shard_files('logins.json'):
+        logins.update(get_data_file(path))
+
+    lost = {'usuario': 0, 'login': 0, 'curso': 0, 'nota': 0}
+    for result in results:
+        if 'error' in result:
+            continue
+
+        user = users.get(result['username'])
+        if user is None:
+            lost['usuario'] += 1
+            continue
+        if result['username'] not in logins:
+            lost['login'] += 1
+        if user['course_id'] is None:
+            lost['curso'] += 1
+        if result['subject'] not in user['grades']:
+            lost['nota'] += 1
+
+    return lost
+
+
+def percentile(values: List[float], p: float) -> float:
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def print_report(results: List[Dict[str, Any]], elapsed: float, lost: Dict[str, int]):
+    print(
+        f'{len(results)} alunos em {elapsed:.2f}s ({len(results) / elapsed:.1f} alunos/s).'
+    )
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    for result in results:
+        for name, values in result['latencies'].items():
+            latencies[name].extend(values)
+
+    print(f'{"Etapa":<12}{"n":>8}{"p50":>10}{"p90":>10}{"p99":>10}{"máx":>10}')
+    for name, values in latencies.items():
+        values.sort()
+        print(
+            f'{name:<12}{len(values):>8}'
+            + ''.join(
+                f'{percentile(values, p) * 1000:>8.1f}ms' for p in (0.5, 0.9, 0.99)
+            )
+            + f'{values[-1] * 1000:>8.1f}ms'
+        )
+
+    errors = Counter(result['error'] for result in results if 'error' in result)
+    if errors:
+        print(
+            'Alunos interrompidos por erro:',
+            ', '.join(f'{k}={v}' for k, v in errors.items()),
+        )
+
+    print('Atualizações perdidas:', ', '.join(f'{k}={v}' for k, v in lost.items()))
+
+
+def run_attack(attempts: int, sources: int, seed: int):
+    """
+    Simula um ataque de credential stuffing: `attempts` logins com nomes de usuário
+    aleatórios, vindos de `sources` endereços, passando pelo limite de tentativas
+    como em :func:`modules.users.login_account`.
+
+    Exibe quantas tentativas chegaram a verificar a senha, quantas foram barradas e
+    a memória ocupada pelo limite de tentativas ao final.
+    """
+    rng = random.Random(seed)
+    allowed = blocked = 0
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(attempts):
+        username = f'vitima{rng.randrange(10**9)}'
+        address = rng.randrange(sources)
+        source = f'10.0.{address // 256}.{address % 256}'
+        if modules.throttle.check_login(username, source):
+            blocked += 1
+            continue
+
+        allowed += 1
+        modules.throttle.record_login_failure(username, source, exists=False)
+    elapsed = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print(
+        f'{attempts} tentativas em {elapsed:.2f}s ({attempts / elapsed:.0f}/s) '
+        f'de até {sources} origens.'
+    )
+    print(f'Senhas verificadas: {allowed}. Tentativas barradas: {blocked}.')
+    print(
+        f'Chaves guardadas: {len(modules.throttle.account_throttle)} usuários, '
+        f'{len(modules.throttle.source_throttle)} origens '
+        f'({memory / 1024 / 1024:.1f} MiB).'
+    )
+
+    legitimate = modules.throttle.check_login('aluno.legitimo', '192.168.0.1')
+    print(
+        'Login legítimo de outra origem:',
+        'liberado' if not legitimate else f'bloqueado por {legitimate:.0f}s',
+    )
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description='Simula alunos percorrendo o fluxo completo do programa.'
+    )
+    parser.add_argument('--alunos', type=int, default=200)
+    parser.add_argument('--processos', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads', type=int, default=1, help='alunos por processo')
+    parser.add_argument('--particoes', type=int, default=1)
+    parser.add_argument('--curso', type=int, default=None, help='número no menu')
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument(
+        '--segundo-plano', action='store_true', help='ativa a escrita em segundo plano'
+    )
+    parser.add_argument('--manter', action='store_true', help='mantém a pasta de dados')
+    parser.add_argument(
+        '--ataque',
+        type=int,
+        default=0,
+        help='simula um ataque com essa quantidade de tentativas de login',
+    )
+    parser.add_argument(
+        '--origens', type=int, default=1000, help='endereços usados no ataque'
+    )
+    args = parser.parse_args()
+
+    if args.ataque:
+        run_attack(args.ataque, args.origens, args.semente)
+        return
+
+    data_dir = tempfile.mkdtemp(prefix='pim-carga-')
+    shutil.copy(data_path('cursos.json'), f'{data_dir}/cursos.json')
+    save_data_file(f'{data_dir}/shards.json', {'count': args.particoes})
+
+    # Distribui os alunos entre os processos de forma intercalada.
+    groups = [
+        list(range(i, args.alunos, args.processos)) for i in range(args.processos)
+    ]
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.processos) as executor:
+        futures = [
+            executor.submit(
+                run_worker,
+                data_dir,
+                args.particoes,
+                group,
+                args.threads,
+                args.semente,
+                args.curso,
+                write_behind=args.segundo_plano,
+            )
+            for group in groups
+            if group
+        ]
+        results = [result for future in futures for result in future.result()]
+    elapsed = time.perf_counter() - start
+
+    modules.data.DATA_DIR = data_dir
+    modules.data.set_shard_count(args.particoes)
+    print_report(results, elapsed, count_lost_updates(results))
+
+    if args.manter:
+        print(f'Dados mantidos em {data_dir}')
+    else:
+        shutil.rmtree(data_dir)
+
+
+if __name__ == '__main__':
+    with contextlib.suppress(KeyboardInterrupt):
+        run()
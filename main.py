@@ -1,13 +1,23 @@
 import time
-from typing import TYPE_CHECKING, Tuple, Mapping, Sequence
+from typing import TYPE_CHECKING, Tuple, Mapping, Optional, Sequence
 
-from modules.data import get_data_file
+from modules.data import register_process
 from modules.users import User, login_account, create_account
-from modules.utilities import find, get_choice, print_menu
+from modules.events import EVENT_TEST, EVENT_COURSE, EVENT_LESSON, record_event
+from modules.courses import Test, get_catalog
+from modules.sessions import (
+    create_token,
+    verify_token,
+    load_session_token,
+    save_session_token,
+    clear_session_token,
+)
+from modules.utilities import Menu, find, get_choice, print_menu
 from modules.exceptions import Exit
+from modules.persistence import enable_write_behind, disable_write_behind
 
 if TYPE_CHECKING:
-    from modules.courses import Test, Choice, Subject, Question
+    from modules.courses import Choice, Subject, Question
 
 
 def create_or_login_user():
@@ -26,7 +36,9 @@ def create_or_login_user():
 
     try:
         if choice == 'l':
-            return login_account()
+            user = login_account()
+            remember_user(user)
+            return user
         if choice == 'c':
             return create_account()
         if choice == 's':
@@ -35,6 +47,51 @@ def create_or_login_user():
         return None
 
 
+def remember_user(user: User):
+    """
+    Pergunta se o usuário quer continuar conectado neste computador e, caso sim,
+    salva um token de sessão para os próximos acessos.
+
+    Parameters
+    ----------
+    user: :class:`User`
+        O usuário que acabou de fazer login.
+    """
+    choice = get_choice(['s', 'n'], 'Manter conectado neste computador? [s/N] > ', 'n')
+    if choice == 's':
+        save_session_token(create_token(user.username))
+
+
+def resume_session() -> Optional[User]:
+    """
+    Retoma a sessão salva neste computador, sem pedir a senha.
+
+    Returns
+    -------
+    :class:`User`
+        O usuário da sessão, caso o token seja válido e o usuário confirme.
+    :class:`None`
+        Caso não exista uma sessão válida ou o usuário prefira entrar com outra
+        conta. Nesse caso, o token salvo é apagado.
+    """
+    token = load_session_token()
+    if token is None:
+        return None
+
+    username = verify_token(token)
+    user = User.find(username) if username is not None else None
+
+    if user is not None:
+        print_menu(
+            f'Continuar como {user.username}?', '[S]im', '[n]ão', title='Entrada'
+        )
+        if get_choice(['s', 'n'], '> ', 's') == 's':
+            return user
+
+    clear_session_token()
+    return None
+
+
 def set_user_course(user: User):
     """
     Seleciona um curso para o usuário.
@@ -44,33 +101,26 @@ def set_user_course(user: User):
     user: :class:`User`
         O usuário que está selecionando o curso.
     """
-    courses = tuple(
-        sorted(get_data_file('data/cursos.json').values(), key=lambda x: x['name'])
-    )
+    courses = tuple(sorted(get_catalog().values(), key=lambda x: x.name))
 
-    texts = [
-        'Parece que você não está matrículado em nenhum curso.',
-        '',
-        'Selecione o curso desejado:',
-    ]
-    for i, course in enumerate(courses):
-        texts.append(f'[{i + 1}] {course["name"]}')
+    menu = Menu(
+        [course.name for course in courses],
+        title='Seleção de curso',
+        header=(
+            'Parece que você não está matrículado em nenhum curso.',
+            '',
+            'Selecione o curso desejado:',
+        ),
+    )
 
     while True:
-        print_menu(*texts, title='Seleção de curso')
-
-        choice = get_choice([str(i) for i in range(1, len(courses) + 1)], '> ')
-        if choice is None:
-            print('Opção inválida.')
-            time.sleep(0.5)
-            continue
-
-        choice = int(choice)
+        choice = menu.select()
+        assert choice is not None  # Diminuir o tipo.
 
-        selected_course = courses[choice - 1]
+        selected_course = courses[choice]
 
         print_menu(
-            f'Você selecionou {selected_course["name"]}.',
+            f'Você selecionou {selected_course.name}.',
             'Isso está correto? [S/n]',
             title='Seleção de curso',
         )
@@ -79,11 +129,12 @@ def set_user_course(user: User):
         if choice == 's':
             break
 
-    user.course_id = selected_course['id']
+    user.course_id = selected_course.id
     user.write()
+    record_event(user.username, '', selected_course.id, EVENT_COURSE)
 
     print_menu(
-        f'{user.first_name}, você foi matriculado no curso "{selected_course["name"]}".',
+        f'{user.first_name}, você foi matriculado no curso "{selected_course.name}".',
         '',
         'Aperte Enter para continuar.',
         title='Seleção de curso',
@@ -107,34 +158,19 @@ def select_subject(user: User) -> 'Subject':
     """
     assert user.course is not None  # Diminuir o tipo.
 
-    texts = ['Selecione a disciplina desejada:', '']
-
     subjects = user.course.subjects
 
-    for i, subject in enumerate(subjects):
-        texts.append(f'[{i + 1}] {subject.name}')
-
-    texts.append('[0] Sair do programa.')
-
-    while True:
-        print_menu(*texts, title='Seleção de matéria')
-
-        choice = get_choice([str(i) for i in range(len(subjects) + 1)], '> ')
-        if choice is None:
-            print('Opção inválida.')
-            time.sleep(0.5)
-            continue
-
-        choice = int(choice)
+    choice = Menu(
+        [subject.name for subject in subjects],
+        title='Seleção de matéria',
+        header=('Selecione a disciplina desejada:', ''),
+        back_label='Sair do programa.',
+    ).select()
 
-        if choice == 0:
-            raise Exit()
+    if choice is None:
+        raise Exit()
 
-        selected_subject = subjects[choice - 1]
-
-        break
-
-    return selected_subject
+    return subjects[choice]
 
 
 def show_lesson(user: User, subject: 'Subject', lesson_id: str):
@@ -167,6 +203,8 @@ def show_lesson(user: User, subject: 'Subject', lesson_id: str):
         title=lesson.title,
     )
 
+    record_event(user.username, subject.id, lesson.id, EVENT_LESSON)
+
     if user.current_lesson.get(subject.id) != '-':
         next_lesson = find(subject.lessons, lambda x: x.index == lesson.index + 1)
         user.current_lesson[subject.id] = (
@@ -192,6 +230,24 @@ def show_test(user: User, subject: 'Subject'):
         Não é utilizado.
     """
     test = subject.test
+
+    # Apenas a primeira tentativa é avaliada. Sua semente é salva antes de começar,
+    # para que as mesmas questões sejam sorteadas caso o aluno saia no meio da prova.
+    graded = user.grades.get(subject.id) is not None
+    attempt = user.attempts.get(test.id)
+
+    if not graded and attempt is not None and 'answers' not in attempt:
+        seed = attempt['seed']
+    else:
+        seed = Test.new_seed() if test.pool is not None else None
+
+        if not graded and test.pool is not None:
+            user.attempts[test.id] = {'seed': seed}
+            user.write()
+
+    question_ids = test.sample_ids(seed)
+    questions = test.assemble(question_ids)
+
     print_menu(
         'Você finalizou todas as aulas.',
         '',
@@ -203,23 +259,30 @@ def show_test(user: User, subject: 'Subject'):
 
     results = {}
 
-    for question in test.questions:
-        answer = show_question(question, test)
+    for question in questions:
+        answer = show_question(question, len(questions))
         results[question.index] = (answer, question.answer)
 
     grade = round(
         sum(
             question.weight
-            for question in test.questions
+            for question in questions
             if results[question.index][0] == question.answer
         )
         / 100,
         5,
     )
-    if user.grades.get(subject.id) is None:
+    if not graded:
         user.grades[subject.id] = grade * 100
         user.current_lesson[subject.id] = '-'
+        # As respostas ficam salvas em ordem, uma letra por questão.
+        user.attempts[test.id] = {
+            'seed': seed,
+            'questions': question_ids,
+            'answers': ''.join(results[question.index][0] for question in questions),
+        }
         user.write()
+        record_event(user.username, subject.id, test.id, EVENT_TEST)
 
     grade = round(grade * subject.max_grade, 1)
 
@@ -233,7 +296,7 @@ def show_test(user: User, subject: 'Subject'):
 
     input()
 
-    start_revision(test.questions, results)
+    start_revision(questions, results)
 
     action = (
         'escolher outra matéria'
@@ -251,7 +314,7 @@ def show_test(user: User, subject: 'Subject'):
     input()
 
 
-def show_question(question: 'Question', test: 'Test') -> str:
+def show_question(question: 'Question', total: int) -> str:
     """
     Exibe uma questão da avaliação e coleta a resposta do usuário.
 
@@ -259,27 +322,29 @@ def show_question(question: 'Question', test: 'Test') -> str:
     ----------
     question: :class:`Question`
         A questão a ser exibida.
-    test: :class:`Test`
-        A avaliação à qual a questão pertence.
+    total: :class:`int`
+        A quantidade de questões da tentativa.
 
     Returns
     -------
     :class:`str`
         A resposta escolhida pelo usuário.
     """
+    message = ''
+
     while True:
         print_menu(
             question.question,
             '',
             *(f'[{option}] {content}' for option, content in question.options.items()),
-            title=f'Questão {question.index + 1} de {len(test.questions)}.',
+            *(('', message) if message else ()),
+            title=f'Questão {question.index + 1} de {total}.',
         )
 
         choice = get_choice(tuple(question.options.keys()), '> ')
         if choice is not None:
             return choice
-        print('Opção inválida.')
-        time.sleep(0.5)
+        message = 'Opção inválida.'
 
 
 def start_revision(
@@ -345,44 +410,34 @@ def show_all_lessons(user: User, subject: 'Subject'):
     subject: :class:`Subject`
         A matéria cujas aulas serão revisadas.
     """
-    texts = [
-        'Você já assistiu todas as aulas desta matéria.',
-        '',
-        'Selecione a aula que deseja revisar:',
-    ]
-
-    test_index = subject.lessons[-1].index + 1
-
-    texts.extend(f'[{lesson.index}] {lesson.title}' for lesson in subject.lessons)
-    texts.extend((f'[{test_index}] Prova', '[0] Voltar'))
+    menu = Menu(
+        [*(lesson.title for lesson in subject.lessons), 'Prova'],
+        title=subject.name,
+        header=(
+            'Você já assistiu todas as aulas desta matéria.',
+            '',
+            'Selecione a aula que deseja revisar:',
+        ),
+        back_label='Voltar',
+    )
 
     while True:
-        print_menu(*texts, title=subject.name)
-        choice = get_choice(tuple(map(str, range(test_index + 1))), '> ')
-        if choice is None:
-            print('Opção inválida.')
-            time.sleep(0.5)
-            continue
+        choice = menu.select()
 
-        choice = int(choice)
-
-        if choice == 0:
+        if choice is None:
             return
 
-        if choice == test_index:
+        if choice == len(subject.lessons):
             show_test(user, subject)
         else:
-            lesson = find(subject.lessons, lambda le: le.index == choice)  # noqa: B023
-            assert lesson is not None
-
-            show_lesson(user, subject, lesson.id)
+            show_lesson(user, subject, subject.lessons[choice].id)
 
 
 def main():
     # Define o título do terminal.
     print('\033]2;PIM - Plataforma Integrada de Mentoria\a')
 
-    user = None
+    user = resume_session()
     while user is None:
         print_menu(
             'Bem ao vindo ao PIM (Plataforma Integrada de Mentoria).',
@@ -427,12 +482,20 @@ def main():
 
 
 if __name__ == '__main__':
+    import os
     import ctypes
 
     kernel32 = ctypes.windll.kernel32
     # Habilita suporte ao ANSI no console do Windows.
     kernel32.SetConsoleMode(kernel32.GetStdHandle(-11), 7)
 
+    # Com PIM_WRITE_BEHIND=1, o progresso é salvo em segundo plano.
+    if os.environ.get('PIM_WRITE_BEHIND') == '1':
+        enable_write_behind()
+
+    # O reshard.py não roda enquanto o programa estiver aberto.
+    register_process()
+
     try:
         main()
     except (Exit, KeyboardInterrupt):
@@ -445,3 +508,6 @@ if __name__ == '__main__':
             title='Erro',
         )
         input()
+    finally:
+        # Salva o que estiver pendente antes de sair.
+        disable_write_behind()
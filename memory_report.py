@@ -0,0 +1,325 @@
+import gc
+import sys
+import argparse
+import tracemalloc
+from types import ModuleType
+from typing import Any, Dict, List, Tuple, Callable, Iterable, Iterator
+from itertools import islice
+from collections import Counter
+
+from modules.data import data_path, get_data_file, iter_data_file, get_shard_files
+from modules.users import User
+from modules.courses import Test, Course, Lesson, Subject, Question
+
+# Classes cujo custo por objeto é exibido no relatório.
+TRACKED_CLASSES = (Course, Subject, Lesson, Question, User)
+
+
+def walk(roots: Iterable[Any]) -> Iterator[Any]:
+    """
+    Percorre todos os objetos alcançáveis a partir de `roots`.
+
+    Cada objeto é retornado uma única vez, mesmo que seja alcançável por vários
+    caminhos. Classes e módulos não são percorridos, pois são compartilhados.
+
+    Parameters
+    ----------
+    roots: Iterable[Any]
+        Os objetos iniciais.
+
+    Yields
+    ------
+    Any
+        Os objetos alcançáveis, incluindo os iniciais.
+    """
+    seen = set()
+    stack = list(roots)
+
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, (type, ModuleType)):
+            continue
+        seen.add(id(obj))
+
+        yield obj
+
+        stack.extend(gc.get_referents(obj))
+
+
+def sizes_by_type(roots: Iterable[Any]) -> Dict[str, Tuple[int, int]]:
+    """
+    Soma o tamanho dos objetos alcançáveis a partir de `roots`, agrupado por tipo.
+
+    Returns
+    -------
+    Dict[:class:`str`, Tuple[:class:`int`, :class:`int`]]
+        Mapeia o nome do tipo para a quantidade de objetos e o total de bytes.
+    """
+    counts = Counter()
+    sizes = Counter()
+
+    for obj in walk(roots):
+        name = type(obj).__name__
+        counts[name] += 1
+        sizes[name] += sys.getsizeof(obj)
+
+    return {name: (counts[name], sizes[name]) for name in counts}
+
+
+def measure(name: str, load: Callable[[], Any]) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Executa `load` e mede a memória alocada com :mod:`tracemalloc`.
+
+    Parameters
+    ----------
+    name: :class:`str`
+        O nome do componente.
+    load: Callable[[], Any]
+        Função que carrega o componente e o retorna.
+
+    Returns
+    -------
+    Tuple[Any, Dict[:class:`str`, Any]]
+        O componente carregado e as medições: pico, memória retida e as maiores
+        alocações por módulo.
+    """
+    gc.collect()
+    before = tracemalloc.take_snapshot()
+    start, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+
+    component = load()
+
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+
+    # Agrupa pelo arquivo de onde partiu a alocação, ignorando o próprio tracemalloc.
+    filters = [
+        tracemalloc.Filter(inclusive=False, filename_pattern=tracemalloc.__file__)
+    ]
+    by_module = [
+        (stat.traceback[0].filename, stat.size_diff)
+        for stat in after.filter_traces(filters).compare_to(
+            before.filter_traces(filters), 'filename'
+        )
+        if stat.size_diff > 0
+    ]
+
+    return component, {
+        'name': name,
+        'peak': peak - start,
+        'retained': current - start,
+        'by_module': by_module,
+        'by_type': sizes_by_type([component]),
+        'objects': [
+            obj for obj in walk([component]) if isinstance(obj, TRACKED_CLASSES)
+        ],
+    }
+
+
+def load_catalog() -> List[Course]:
+    courses = get_data_file(data_path('cursos.json'))
+    return [Course.from_dict(course) for course in courses.values()]
+
+
+def load_roster(count: int) -> List[User]:
+    """
+    Carrega até `count` usuários das partições. Caso existam menos usuários salvos,
+    os restantes são cópias com outros nomes de usuário.
+    """
+    users = [
+        User(**data)
+        for _, data in islice(
+            (
+                item
+                for path in get_shard_files('usuarios.json')
+                for item in iter_data_file(path)
+            ),
+            count,
+        )
+    ]
+
+    if not users:
+        return users
+
+    stored = len(users)
+    for i in range(stored, count):
+        data = users[i % stored].to_dict()
+        data['username'] = f'{data["username"]}.{i}'
+        users.append(User(**data))
+
+    return users
+
+
+def simulate_sessions(users: List[User], count: int) -> List[Dict[str, Any]]:
+    """
+    Simula `count` sessões simultâneas do fluxo de :mod:`main`: cada sessão carrega o
+    curso do aluno, monta a avaliação da primeira disciplina e guarda as respostas.
+    """
+    sessions = []
+    if not users:
+        return sessions
+
+    for i in range(count):
+        user = users[i % len(users)]
+        if user.course_id is None:
+            continue
+
+        # Cada sessão tem sua própria instância do usuário, como em main.py.
+        user = User(**user.to_dict())
+        assert user.course is not None
+
+        subject = user.course.subjects[0]
+        test: Test = subject.test
+        questions = test.assemble(test.sample_ids(Test.new_seed()))
+
+        sessions.append(
+            {
+                'user': user,
+                'subject': subject,
+                'questions': questions,
+                'results': {
+                    question.index: ('a', question.answer) for question in questions
+                },
+            }
+        )
+
+    return sessions
+
+
+def format_bytes(size: float) -> str:
+    for unit in ('B', 'KiB', 'MiB'):
+        if abs(size) < 1024:
+            return f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size:.1f} GiB'
+
+
+def print_report(stats: Dict[str, Any], top: int):
+    print(f'== {stats["name"]} ==')
+    print(f'Pico: {format_bytes(stats["peak"])}')
+    print(f'Retido: {format_bytes(stats["retained"])}')
+
+    print('Por módulo:')
+    for filename, size in stats['by_module'][:top]:
+        print(f'  {format_bytes(size):>12}  {filename}')
+
+    print('Por tipo (objetos alcançáveis):')
+    by_type = sorted(stats['by_type'].items(), key=lambda x: x[1][1], reverse=True)
+    for name, (count, size) in by_type[:top]:
+        print(f'  {format_bytes(size):>12}  {count:>8} x {name}')
+    print()
+
+
+def print_object_costs(components: Iterable[Dict[str, Any]]):
+    """
+    Exibe o custo médio de cada classe monitorada: o objeto sozinho e somado a tudo
+    o que é alcançável a partir dele (textos, dicionários e objetos filhos).
+    """
+    print('== Custo por objeto ==')
+
+    roots: Dict[type, List[Any]] = {cls: [] for cls in TRACKED_CLASSES}
+    for stats in components:
+        for obj in stats['objects']:
+            if isinstance(obj, TRACKED_CLASSES):
+                roots[type(obj)].append(obj)
+
+    for cls, objects in roots.items():
+        if not objects:
+            continue
+
+        shallow = sum(sys.getsizeof(obj) for obj in objects) / len(objects)
+        sample = objects[:100]
+        deep = sum(
+            sum(size for _, size in sizes_by_type([obj]).values()) for obj in sample
+        ) / len(sample)
+
+        print(
+            f'  {cls.__name__:<10} objeto: {format_bytes(shallow):>10}  '
+            f'com conteúdo: {format_bytes(deep):>10}  ({len(objects)} objetos)'
+        )
+    print()
+
+
+def parse_budgets(values: List[str]) -> Dict[str, float]:
+    """
+    Converte os argumentos "componente=MB" em bytes por componente.
+
+    Raises
+    ------
+    ValueError
+        Um argumento sem "=" ou com um limite que não é um número positivo.
+    """
+    budgets = {}
+    for value in values:
+        name, separator, megabytes = value.partition('=')
+        try:
+            limit = float(megabytes)
+        except ValueError:
+            limit = -1
+        if not separator or not name or limit <= 0:
+            raise ValueError(f'Orçamento inválido: "{value}". Use COMPONENTE=MB.')
+        budgets[name] = limit * 1024 * 1024
+    return budgets
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Mede o consumo de memória do catálogo, dos alunos e das sessões.'
+    )
+    parser.add_argument('--usuarios', type=int, default=1000, help='alunos carregados')
+    parser.add_argument('--sessoes', type=int, default=100, help='sessões simultâneas')
+    parser.add_argument('--top', type=int, default=8, help='linhas por agrupamento')
+    parser.add_argument(
+        '--orcamento',
+        action='append',
+        default=[],
+        metavar='COMPONENTE=MB',
+        help='falha se o pico do componente (catalogo, alunos, sessoes ou total) '
+        'passar do limite',
+    )
+    args = parser.parse_args()
+    try:
+        budgets = parse_budgets(args.orcamento)
+    except ValueError as e:
+        parser.error(str(e))
+
+    tracemalloc.start()
+
+    _, catalog_stats = measure('catalogo', load_catalog)
+    roster, roster_stats = measure('alunos', lambda: load_roster(args.usuarios))
+    if not roster:
+        print('Nenhum aluno salvo: as sessões não foram simuladas.\n')
+    _, session_stats = measure(
+        'sessoes', lambda: simulate_sessions(roster, args.sessoes)
+    )
+
+    _, total_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    components = (catalog_stats, roster_stats, session_stats)
+    for stats in components:
+        print_report(stats, args.top)
+
+    print_object_costs(components)
+    print(f'Pico total: {format_bytes(total_peak)}')
+
+    exceeded = []
+    peaks = {stats['name']: stats['peak'] for stats in components}
+    peaks['total'] = total_peak
+    for name, budget in budgets.items():
+        if name not in peaks:
+            parser.error(f'Componente desconhecido: "{name}".')
+        if peaks[name] > budget:
+            exceeded.append(
+                f'{name}: {format_bytes(peaks[name])} > {format_bytes(budget)}'
+            )
+
+    if exceeded:
+        print('Orçamento de memória excedido:', *exceeded, sep='\n  ')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
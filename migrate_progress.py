@@ -0,0 +1,265 @@
+import shutil
+import argparse
+from typing import Any, Dict, List, Tuple, Mapping, Callable, Iterator, Optional
+from collections import Counter
+
+from modules.data import (
+    data_path,
+    get_data_file,
+    iter_data_file,
+    lock_data_file,
+    replace_data_file,
+    rewrite_shard_files,
+)
+from modules.changelog import record_file
+from modules.exceptions import DataChangedError
+
+# Regras aplicadas ao progresso, na ordem em que aparecem no relatório.
+RULES = (
+    'curso renomeado',
+    'curso removido',
+    'disciplina renomeada',
+    'disciplina removida',
+    'aula renumerada',
+    'aula removida',
+    'avaliação renomeada',
+)
+
+
+class CatalogMapping:
+    """
+    Mapeamento dos IDs de uma versão do catálogo para a versão seguinte.
+
+    Cursos e disciplinas são associados pelo ID ou, caso o ID tenha mudado, pelo
+    nome. Aulas são associadas pelo título dentro da disciplina; uma aula cujo
+    título mudou mas cujo ID continua existindo é considerada a mesma aula. O
+    progresso em uma aula removida passa para a aula seguinte que continua
+    existindo, ou para a avaliação.
+
+    Parameters
+    ----------
+    old: Mapping[:class:`str`, Any]
+        O conteúdo antigo de "cursos.json".
+    new: Mapping[:class:`str`, Any]
+        O conteúdo novo de "cursos.json".
+    """
+
+    def __init__(self, old: Mapping[str, Any], new: Mapping[str, Any]):
+        # ID antigo -> ID novo, ou None caso tenha sido removido.
+        self.courses: Dict[str, Optional[str]] = {}
+        self.subjects: Dict[str, Optional[str]] = {}
+        # ID antigo de aula ou avaliação -> (ID novo, regra), apenas os que mudaram.
+        self.items: Dict[str, Tuple[str, str]] = {}
+        # ID antigo da avaliação -> ID novo, apenas os que mudaram.
+        self.tests: Dict[str, Optional[str]] = {}
+
+        new_course_names = {
+            course['name']: course_id for course_id, course in new.items()
+        }
+        for course_id, course in old.items():
+            self.courses[course_id] = (
+                course_id if course_id in new else new_course_names.get(course['name'])
+            )
+
+        new_subjects = {
+            subject['id']: subject
+            for course in new.values()
+            for subject in course['subjects']
+        }
+        new_subject_names = {
+            subject['name']: id_ for id_, subject in new_subjects.items()
+        }
+
+        for course in old.values():
+            for subject in course['subjects']:
+                new_id = (
+                    subject['id']
+                    if subject['id'] in new_subjects
+                    else new_subject_names.get(subject['name'])
+                )
+                self.subjects[subject['id']] = new_id
+
+                if new_id is None:
+                    self.tests[subject['test']['id']] = None
+                else:
+                    self._map_items(subject, new_subjects[new_id])
+
+    def _map_items(self, old: Mapping[str, Any], new: Mapping[str, Any]):
+        new_test = new['test']['id']
+        if old['test']['id'] != new_test:
+            self.tests[old['test']['id']] = new_test
+            self.items[old['test']['id']] = (new_test, 'avaliação renomeada')
+
+        old_lessons = sorted(old['lessons'], key=lambda x: x['id'])
+        old_titles = {lesson['title'] for lesson in old_lessons}
+        new_titles = {lesson['title']: lesson['id'] for lesson in new['lessons']}
+        # Aulas novas com títulos que não existiam: podem ser aulas antigas editadas.
+        edited = {
+            lesson['id']
+            for lesson in new['lessons']
+            if lesson['title'] not in old_titles
+        }
+
+        targets: List[Optional[str]] = []
+        for lesson in old_lessons:
+            if lesson['title'] in new_titles:
+                targets.append(new_titles[lesson['title']])
+            elif lesson['id'] in edited:
+                targets.append(lesson['id'])
+            else:
+                targets.append(None)
+
+        for i, lesson in enumerate(old_lessons):
+            if targets[i] is not None:
+                if targets[i] != lesson['id']:
+                    self.items[lesson['id']] = (targets[i], 'aula renumerada')
+                continue
+
+            following = next((t for t in targets[i + 1 :] if t is not None), new_test)
+            self.items[lesson['id']] = (following, 'aula removida')
+
+    def migrate(self, user: Dict[str, Any]) -> List[str]:
+        """
+        Atualiza o curso e o progresso de um usuário para o catálogo novo.
+
+        Parameters
+        ----------
+        user: Dict[:class:`str`, Any]
+            Os dados do usuário, como salvos em "usuarios.json". São alterados no
+            próprio dicionário.
+
+        Returns
+        -------
+        List[:class:`str`]
+            As regras aplicadas ao usuário, sem repetições.
+        """
+        rules = []
+
+        def apply(rule: str):
+            if rule not in rules:
+                rules.append(rule)
+
+        course_id = user.get('course_id')
+        if course_id in self.courses and self.courses[course_id] != course_id:
+            user['course_id'] = self.courses[course_id]
+            apply('curso renomeado' if user['course_id'] else 'curso removido')
+
+        for field in ('current_lesson', 'grades'):
+            values = user.get(field) or {}
+            migrated = {}
+
+            for subject_id, value in values.items():
+                new_subject = self.subjects.get(subject_id, subject_id)
+                if new_subject is None:
+                    apply('disciplina removida')
+                    continue
+                if new_subject != subject_id:
+                    apply('disciplina renomeada')
+
+                if field == 'current_lesson' and value in self.items:
+                    value, rule = self.items[value]
+                    apply(rule)
+
+                migrated[new_subject] = value
+
+            user[field] = migrated
+
+        self._migrate_attempts(user, apply)
+
+        if rules:
+            user['version'] = user.get('version', 0) + 1
+
+        return rules
+
+    def _migrate_attempts(self, user: Dict[str, Any], apply: Callable[[str], None]):
+        attempts = user.get('attempts') or {}
+        if not any(test_id in self.tests for test_id in attempts):
+            return
+
+        migrated = {}
+        for test_id, attempt in attempts.items():
+            new_id = self.tests.get(test_id, test_id)
+            if new_id is None:
+                apply('disciplina removida')
+            else:
+                if new_id != test_id:
+                    apply('avaliação renomeada')
+                migrated[new_id] = attempt
+
+        user['attempts'] = migrated
+
+
+def migrate_shard(
+    path: str, mapping: CatalogMapping, counts: Counter
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Percorre os usuários de uma partição já migrados, contando os usuários
+    afetados por cada regra em `counts`.
+    """
+    for username, user in iter_data_file(path):
+        rules = mapping.migrate(user)
+        counts.update(rules)
+        counts['usuários lidos'] += 1
+        if rules:
+            counts['usuários alterados'] += 1
+
+        yield username, user
+
+
+def install_catalog(new_path: str):
+    """
+    Coloca uma nova versão de "cursos.json" no lugar e a adiciona ao registro de
+    alterações.
+    """
+    catalog_path = data_path('cursos.json')
+    shutil.copy(new_path, f'{catalog_path}.migrating')
+
+    with lock_data_file(catalog_path):
+        generation = replace_data_file(catalog_path, f'{catalog_path}.migrating')
+        record_file(catalog_path, generation)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Migra o progresso dos alunos para uma nova versão do catálogo.'
+    )
+    parser.add_argument('antigo', help='a versão anterior de "cursos.json"')
+    parser.add_argument(
+        'novo',
+        nargs='?',
+        default=None,
+        help='a nova versão de "cursos.json", instalada ao final '
+        '(padrão: o "cursos.json" atual)',
+    )
+    parser.add_argument(
+        '--simular', action='store_true', help='apenas exibe o relatório'
+    )
+    args = parser.parse_args()
+
+    catalog_path = data_path('cursos.json')
+    new_path = args.novo or catalog_path
+    mapping = CatalogMapping(get_data_file(args.antigo), get_data_file(new_path))
+
+    counts = Counter()
+
+    try:
+        rewrite_shard_files(
+            'usuarios.json',
+            lambda path: migrate_shard(path, mapping, counts),
+            dry_run=args.simular,
+            on_replace=record_file,
+        )
+    except DataChangedError as e:
+        parser.exit(1, f'{e} Nenhuma alteração foi salva.\n')
+
+    if not args.simular and new_path != catalog_path:
+        install_catalog(new_path)
+
+    print(f'Usuários lidos: {counts["usuários lidos"]}')
+    print(f'Usuários alterados: {counts["usuários alterados"]}')
+    for rule in RULES:
+        print(f'  {rule}: {counts[rule]}')
+
+
+if __name__ == '__main__':
+    main()
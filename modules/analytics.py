@@ -0,0 +1,297 @@
+import os
+import datetime as dt
+from typing import Any, Dict, List, Tuple, Mapping
+
+from .data import (
+    data_path,
+    resolve_path,
+    get_data_file,
+    get_user_file,
+    get_generation,
+    write_data_items,
+    replace_data_files,
+)
+from .events import EVENT_TEST, EVENT_COURSE, Event, read_events
+
+AGGREGATES_FILE = 'funil.json'
+# Estado dos alunos usado nos cálculos, na pasta de cada partição.
+STATES_FILE = 'funil_alunos.json'
+
+# Limites, em segundos, das faixas dos histogramas de tempo. A última faixa contém
+# tudo acima do último limite.
+TIME_BUCKETS = (60, 300, 900, 1800, 3600, 4 * 3600, 24 * 3600, 7 * 24 * 3600)
+TIME_BUCKET_LABELS = (
+    '< 1min',
+    '1-5min',
+    '5-15min',
+    '15-30min',
+    '30min-1h',
+    '1-4h',
+    '4h-1d',
+    '1d-7d',
+    '> 7d',
+)
+
+
+def get_time_bucket(seconds: float) -> int:
+    """
+    Retorna o índice da faixa do histograma de tempo que contém `seconds`.
+    """
+    for i, limit in enumerate(TIME_BUCKETS):
+        if seconds < limit:
+            return i
+    return len(TIME_BUCKETS)
+
+
+def get_cohort(timestamp: int) -> str:
+    """
+    Retorna a coorte de um aluno, que é a semana ISO da sua matrícula.
+    """
+    date = dt.datetime.fromtimestamp(timestamp, dt.timezone.utc)
+    year, week, _ = date.isocalendar()
+    return f'{year}-S{week:02d}'
+
+
+def get_steps(courses: Mapping[str, Any]) -> Dict[str, Tuple[str, int]]:
+    """
+    Monta as etapas do funil de cada disciplina a partir do catálogo.
+
+    Parameters
+    ----------
+    courses: Mapping[:class:`str`, Any]
+        O conteúdo de "cursos.json".
+
+    Returns
+    -------
+    Dict[:class:`str`, Tuple[:class:`str`, :class:`int`]]
+        Mapeia o ID de cada aula e avaliação para o ID da disciplina e a posição da
+        etapa. As aulas vêm primeiro, na ordem do catálogo, e a avaliação por último.
+    """
+    steps = {}
+
+    for course in courses.values():
+        for subject in course['subjects']:
+            # A posição vem da lista, pois aulas inseridas depois podem ter IDs maiores.
+            for position, lesson in enumerate(subject['lessons']):
+                steps[lesson['id']] = (subject['id'], position)
+            steps[subject['test']['id']] = (subject['id'], len(subject['lessons']))
+
+    return steps
+
+
+class FunnelAnalytics:
+    """
+    Agregados de progresso calculados incrementalmente a partir dos eventos.
+
+    Os agregados são salvos em "funil.json" junto com a posição do último evento
+    processado, então cada atualização lê apenas os eventos novos. Os relatórios
+    leem apenas os agregados.
+
+    O estado de cada aluno, necessário para continuar os cálculos, fica em
+    "funil_alunos.json", na partição do aluno. Apenas as partições dos alunos com
+    eventos novos são lidas e salvas em cada atualização.
+
+    Attributes
+    ----------
+    offset: :class:`int`
+        A posição, em bytes, do próximo evento a ser processado.
+    reached: Dict[:class:`str`, :class:`int`]
+        Quantidade de alunos que chegaram a cada aula ou avaliação.
+    views: Dict[:class:`str`, :class:`int`]
+        Quantidade de vezes que cada aula ou avaliação foi exibida ou finalizada.
+    step_time: Dict[:class:`str`, List[:class:`int`]]
+        Histograma do tempo até o próximo evento do aluno na disciplina, por aula.
+    completion_time: Dict[:class:`str`, List[:class:`int`]]
+        Histograma do tempo entre a primeira aula e a avaliação, por disciplina.
+    cohorts: Dict[:class:`str`, Dict[:class:`str`, :class:`int`]]
+        Alunos matriculados e disciplinas concluídas por coorte de matrícula.
+    """
+
+    def __init__(self, data: Mapping[str, Any], generation: int = 0):
+        self.offset: int = data.get('offset', 0)
+        self.reached: Dict[str, int] = data.get('reached', {})
+        self.views: Dict[str, int] = data.get('views', {})
+        self.step_time: Dict[str, List[int]] = data.get('step_time', {})
+        self.completion_time: Dict[str, List[int]] = data.get('completion_time', {})
+        self.cohorts: Dict[str, Dict[str, int]] = data.get('cohorts', {})
+
+        # Estado dos alunos das partições já lidas, por arquivo. O estado de um
+        # aluno tem a coorte e, por disciplina, [início, etapa mais distante,
+        # último item, horário do último evento].
+        self._states: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # Gerações dos arquivos lidos, verificadas ao salvar.
+        self._generations: Dict[str, int] = {data_path(AGGREGATES_FILE): generation}
+
+        # Versões anteriores guardavam o estado de todos os alunos em "funil.json".
+        # Ele é movido para as partições no próximo salvamento.
+        for username, cohort in data.get('user_cohorts', {}).items():
+            self._get_state(username)['cohort'] = cohort
+        for username, progress in data.get('progress', {}).items():
+            self._get_state(username)['progress'] = progress
+
+    @classmethod
+    def load(cls) -> 'FunnelAnalytics':
+        """
+        Carrega os agregados salvos, sem processar novos eventos.
+        """
+        path = data_path(AGGREGATES_FILE)
+        generation = get_generation(path)
+        return cls(get_data_file(path), generation)
+
+    def _get_state(self, username: str) -> Dict[str, Any]:
+        path = get_user_file(STATES_FILE, username)
+
+        states = self._states.get(path)
+        if states is None:
+            self._generations[path] = get_generation(path)
+            states = self._states[path] = get_data_file(path)
+
+        return states.setdefault(username, {'cohort': None, 'progress': {}})
+
+    def save(self):
+        """
+        Salva os agregados, a posição do último evento processado e o estado dos
+        alunos das partições lidas, todos de uma só vez.
+
+        Raises
+        ------
+        DataChangedError
+            Outra atualização salvou algum dos arquivos desde a leitura.
+        """
+        contents = {
+            data_path(AGGREGATES_FILE): {
+                'offset': self.offset,
+                'reached': self.reached,
+                'views': self.views,
+                'step_time': self.step_time,
+                'completion_time': self.completion_time,
+                'cohorts': self.cohorts,
+            },
+            **self._states,
+        }
+
+        replacements = []
+        try:
+            for path, content in contents.items():
+                temp_path = f'{path}.saving'
+                write_data_items(temp_path, content.items(), path)
+                replacements.append((path, temp_path, self._generations[path]))
+        except BaseException:
+            for _, temp_path, _ in replacements:
+                os.remove(resolve_path(temp_path))
+            raise
+
+        replace_data_files(replacements)
+
+        # Os estados já salvos não precisam ficar em memória.
+        self._states.clear()
+        self._generations = {
+            data_path(AGGREGATES_FILE): get_generation(data_path(AGGREGATES_FILE))
+        }
+
+    def _add_time(self, histograms: Dict[str, List[int]], key: str, seconds: int):
+        histogram = histograms.setdefault(key, [0] * len(TIME_BUCKET_LABELS))
+        histogram[get_time_bucket(seconds)] += 1
+
+    def add(self, event: Event, steps: Mapping[str, Tuple[str, int]]):
+        """
+        Atualiza os agregados com um evento.
+
+        Parameters
+        ----------
+        event: :class:`Event`
+            O evento a ser processado.
+        steps: Mapping[:class:`str`, Tuple[:class:`str`, :class:`int`]]
+            As etapas do catálogo, como retornadas por :func:`get_steps`.
+        """
+        if event.type == EVENT_COURSE:
+            user_state = self._get_state(event.username)
+            if user_state['cohort'] is None:
+                cohort = user_state['cohort'] = get_cohort(event.timestamp)
+                counts = self.cohorts.setdefault(
+                    cohort, {'enrolled': 0, 'completed': 0}
+                )
+                counts['enrolled'] += 1
+            return
+
+        step = steps.get(event.item_id)
+        if step is None:
+            # Itens removidos do catálogo são ignorados.
+            return
+        subject_id, position = step
+
+        user_state = self._get_state(event.username)
+        progress = user_state['progress']
+        state = progress.get(subject_id)
+        if state is None:
+            state = progress[subject_id] = [event.timestamp, -1, None, None]
+
+        start, furthest, last_item, last_timestamp = state
+
+        # O tempo na etapa anterior vai até o evento seguinte na mesma disciplina.
+        if last_item is not None:
+            self._add_time(self.step_time, last_item, event.timestamp - last_timestamp)
+
+        self.views[event.item_id] = self.views.get(event.item_id, 0) + 1
+        if position > furthest:
+            self.reached[event.item_id] = self.reached.get(event.item_id, 0) + 1
+            furthest = position
+
+        if event.type == EVENT_TEST:
+            self._add_time(self.completion_time, subject_id, event.timestamp - start)
+
+            cohort = user_state['cohort']
+            if cohort is not None:
+                self.cohorts[cohort]['completed'] += 1
+
+            # Depois da avaliação, revisões não contam tempo de etapa.
+            state[:] = [start, furthest, None, None]
+        else:
+            state[:] = [start, furthest, event.item_id, event.timestamp]
+
+    @classmethod
+    def refresh(
+        cls, courses: Mapping[str, Any], batch_size: int = 10000
+    ) -> 'FunnelAnalytics':
+        """
+        Carrega os agregados, processa os eventos novos e salva o resultado.
+
+        Os eventos são processados em lotes de até `batch_size`, e o resultado é
+        salvo ao final de cada lote, então a memória usada depende apenas dos
+        alunos com eventos no lote.
+
+        Parameters
+        ----------
+        courses: Mapping[:class:`str`, Any]
+            O conteúdo de "cursos.json".
+        batch_size: :class:`int`
+            A quantidade máxima de eventos processados antes de salvar.
+
+        Returns
+        -------
+        :class:`FunnelAnalytics`
+            Os agregados atualizados.
+
+        Raises
+        ------
+        DataChangedError
+            Outra atualização foi salva ao mesmo tempo. Os eventos do lote serão
+            processados na próxima atualização.
+        """
+        analytics = cls.load()
+        steps = get_steps(courses)
+
+        count = 0
+        for event, offset in read_events(analytics.offset):
+            analytics.add(event, steps)
+            analytics.offset = offset
+            count += 1
+
+            if count == batch_size:
+                analytics.save()
+                count = 0
+
+        if count or analytics._states:
+            analytics.save()
+
+        return analytics
@@ -0,0 +1,171 @@
+import os
+import time
+import secrets
+from typing import Any, Dict, List, Tuple, Mapping, Iterable, Optional
+
+from . import data
+from .data import data_path, resolve_path
+from .serialization import get_codec
+
+# Registro das alterações, na pasta de dados. Só é escrito se já existir; veja
+# :func:`create_change_log`.
+CHANGE_LOG_FILE = 'alteracoes.log'
+
+
+def get_change_log_path() -> str:
+    return resolve_path(data_path(CHANGE_LOG_FILE))
+
+
+def create_change_log() -> str:
+    """
+    Cria o registro de alterações, caso ainda não exista, passando a registrar as
+    alterações dos usuários.
+
+    A primeira linha do registro identifica o arquivo, para que uma cópia saiba
+    se o registro foi recriado.
+
+    Returns
+    -------
+    :class:`str`
+        O identificador do registro.
+    """
+    path = get_change_log_path()
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    except FileExistsError:
+        pass
+    else:
+        header = {'id': secrets.token_hex(8), 'created': time.time()}
+        with os.fdopen(fd, 'wb') as file:
+            file.write(get_codec().dumps(header) + b'\n')
+
+    log_id = get_change_log_id()
+    assert log_id is not None
+
+    return log_id
+
+
+def get_change_log_id() -> Optional[str]:
+    """
+    Retorna o identificador do registro de alterações, ou None caso ele não exista.
+    """
+    try:
+        with open(get_change_log_path(), 'rb') as file:
+            return get_codec().loads(file.readline())['id']
+    except FileNotFoundError:
+        return None
+
+
+def record_changes(
+    path: str, generation: int, changes: Mapping[str, Any], removed: Iterable[str] = ()
+):
+    """
+    Adiciona ao registro as alterações já salvas em um arquivo de dados.
+
+    Cada alteração é uma linha com o caminho do arquivo, relativo à pasta de dados,
+    a geração do arquivo com a alteração, os novos valores das chaves alteradas e
+    as chaves removidas. A linha é escrita com uma única chamada em modo de adição,
+    então processos diferentes podem registrar alterações ao mesmo tempo. Caso o
+    registro não exista, nada é feito.
+
+    Deve ser chamada com o arquivo ainda travado por
+    :func:`modules.data.lock_data_file`, logo após salvá-lo. Assim, as alterações
+    de um mesmo arquivo ficam no registro na ordem das suas gerações.
+
+    Parameters
+    ----------
+    path: :class:`str`
+        O arquivo de dados alterado.
+    generation: :class:`int`
+        A geração do arquivo retornada ao salvá-lo.
+    changes: Mapping[:class:`str`, Any]
+        O novo valor de cada chave alterada.
+    removed: Iterable[:class:`str`]
+        As chaves removidas do arquivo.
+    """
+    entry = {'changes': dict(changes)}
+    removed = sorted(removed)
+    if removed:
+        entry['removed'] = removed
+
+    _append(path, generation, entry)
+
+
+def record_file(path: str, generation: int):
+    """
+    Adiciona ao registro que um arquivo de dados foi substituído por inteiro.
+
+    A linha não tem o conteúdo do arquivo, apenas sua geração: a réplica copia o
+    arquivo da pasta de dados ao aplicá-la. Assim, os scripts que reescrevem
+    partições inteiras, como o regrade.py, não carregam as partições na memória e
+    não copiam todos os alunos para o registro. Assim como
+    :func:`record_changes`, deve ser chamada com o arquivo ainda travado.
+
+    Parameters
+    ----------
+    path: :class:`str`
+        O arquivo de dados substituído ou removido.
+    generation: :class:`int`
+        A geração do arquivo retornada ao salvá-lo.
+    """
+    _append(path, generation, {'replaced': True})
+
+
+def _append(path: str, generation: int, entry: Dict[str, Any]):
+    try:
+        fd = os.open(get_change_log_path(), os.O_WRONLY | os.O_APPEND)
+    except FileNotFoundError:
+        return
+
+    relative = os.path.relpath(resolve_path(path), resolve_path(data.DATA_DIR))
+    entry = {
+        'time': time.time(),
+        'path': relative.replace(os.sep, '/'),
+        'generation': generation,
+        **entry,
+    }
+
+    try:
+        os.write(fd, get_codec().dumps(entry) + b'\n')
+    finally:
+        os.close(fd)
+
+
+def read_changes(
+    offset: int, limit: int
+) -> Tuple[List[Tuple[int, Dict[str, Any]]], int]:
+    """
+    Lê as alterações do registro a partir de uma posição.
+
+    Parameters
+    ----------
+    offset: :class:`int`
+        A posição no arquivo da primeira alteração a ser lida. 0 pula o cabeçalho.
+    limit: :class:`int`
+        A quantidade máxima de alterações lidas.
+
+    Returns
+    -------
+    Tuple[List[Tuple[:class:`int`, Dict[:class:`str`, Any]]], :class:`int`]
+        A posição e o conteúdo de cada alteração, e a posição após a última lida.
+        Uma linha ainda sendo escrita não é lida.
+    """
+    codec = get_codec()
+    changes = []
+
+    with open(get_change_log_path(), 'rb') as file:
+        if offset == 0:
+            file.readline()
+            offset = file.tell()
+        else:
+            file.seek(offset)
+
+        while len(changes) < limit:
+            line = file.readline()
+            if not line.endswith(b'\n'):
+                break
+
+            changes.append((offset, codec.loads(line)))
+            offset += len(line)
+
+    return changes, offset
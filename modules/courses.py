@@ -1,6 +1,10 @@
-from typing import TYPE_CHECKING, Any, List, Literal, Mapping
+import heapq
+import random
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple, Literal, Mapping, Optional
 from dataclasses import dataclass
 
+from .data import data_path, get_data_file
+
 if TYPE_CHECKING:
     from typing import TypeAlias
 
@@ -34,11 +38,279 @@ class Question:
         return cls(**data)
 
 
+@dataclass
+class PoolQuestion:
+    __slots__ = ('answer', 'frequency', 'id', 'options', 'question', 'tags')
+    id: str
+    tags: List[str]
+    frequency: float
+    question: str
+    options: Mapping[Choice, str]
+    answer: Choice
+
+    @classmethod
+    def from_dict(cls, data: Mapping[Any, Any]) -> 'PoolQuestion':
+        """
+        Cria uma instância de :class:`PoolQuestion` a partir de um dicionário.
+
+        Parameters
+        ----------
+        data: Mapping[Any, Any]
+            Dicionário contendo os dados da questão do banco.
+
+        Returns
+        -------
+        :class:`PoolQuestion`
+            Instância da questão do banco.
+        """
+        return cls(
+            id=data['id'],
+            tags=data.get('tags', []),
+            frequency=data.get('frequency', 1),
+            question=data['question'],
+            options=data['options'],
+            answer=data['answer'],
+        )
+
+
+def build_alias_table(weights: List[float]) -> Tuple[List[float], List[int]]:
+    """
+    Monta a tabela de alias (método de Vose) para sortear índices com os pesos dados.
+
+    Parameters
+    ----------
+    weights: List[:class:`float`]
+        Os pesos de cada índice. Devem ser positivos.
+
+    Returns
+    -------
+    Tuple[List[:class:`float`], List[:class:`int`]]
+        As probabilidades e os alias de cada índice.
+    """
+    n = len(weights)
+    total = sum(weights)
+    scaled = [weight * n / total for weight in weights]
+
+    prob = [1.0] * n
+    alias = list(range(n))
+
+    small = [i for i, p in enumerate(scaled) if p < 1]
+    large = [i for i, p in enumerate(scaled) if p >= 1]
+
+    while small and large:
+        less = small.pop()
+        more = large.pop()
+
+        prob[less] = scaled[less]
+        alias[less] = more
+
+        scaled[more] -= 1 - scaled[less]
+        (small if scaled[more] < 1 else large).append(more)
+
+    # O que sobrar tem probabilidade 1 (a menos de erros de arredondamento).
+    return prob, alias
+
+
+@dataclass
+class QuestionPool:
+    __slots__ = ('_by_id', '_tables', 'questions', 'size', 'tags')
+    size: int
+    tags: List[str]
+    questions: List[PoolQuestion]
+
+    def __post_init__(self):
+        # Um banco vazio ou com pesos não positivos não tem o que sortear.
+        if not self.questions or self.size < 1:
+            raise ValueError('O banco de questões não pode estar vazio.')
+        if any(question.frequency <= 0 for question in self.questions):
+            raise ValueError('As frequências das questões devem ser positivas.')
+
+        self._by_id = {question.id: question for question in self.questions}
+        self._tables: Dict[
+            Tuple[str, ...], Tuple[List[PoolQuestion], List[float], List[int]]
+        ] = {}
+
+        # As tags devem selecionar questões suficientes para uma avaliação inteira,
+        # o que é conferido ao carregar o catálogo, e não a cada tentativa.
+        candidates, _, _ = self._get_table(tuple(self.tags))
+        if len(candidates) < self.size:
+            raise ValueError(
+                f'O banco tem {len(candidates)} questões com as tags {self.tags}, '
+                f'mas a avaliação precisa de {self.size}.'
+            )
+
+    def get_question(self, question_id: str) -> Optional[PoolQuestion]:
+        """
+        Busca uma questão do banco pelo seu ID.
+        """
+        return self._by_id.get(question_id)
+
+    def _get_table(
+        self, tags: Tuple[str, ...]
+    ) -> Tuple[List[PoolQuestion], List[float], List[int]]:
+        # As tabelas são montadas uma única vez por conjunto de tags.
+        table = self._tables.get(tags)
+
+        if table is None:
+            candidates = [
+                question
+                for question in self.questions
+                if not tags or any(tag in question.tags for tag in tags)
+            ]
+            prob, alias = (
+                build_alias_table([question.frequency for question in candidates])
+                if candidates
+                else ([], [])
+            )
+            table = self._tables[tags] = (candidates, prob, alias)
+
+        return table
+
+    def sample(self, rng: random.Random) -> List[PoolQuestion]:
+        """
+        Sorteia `size` questões distintas do banco, respeitando os pesos de cada uma.
+
+        Cada sorteio usa a tabela de alias em tempo constante, e repetições são
+        descartadas. Como o banco costuma ser muito maior que a avaliação, o custo
+        esperado é proporcional a `size`, e não ao tamanho do banco. Quando a
+        avaliação usa mais da metade do banco, as repetições seriam frequentes, e
+        as questões são sorteadas de uma vez pelo método de Efraimidis e Spirakis,
+        em tempo proporcional ao tamanho do banco.
+
+        Parameters
+        ----------
+        rng: :class:`random.Random`
+            O gerador usado nos sorteios. Com a mesma semente, o resultado é o mesmo.
+
+        Returns
+        -------
+        List[:class:`PoolQuestion`]
+            As questões sorteadas, na ordem do sorteio.
+        """
+        candidates, prob, alias = self._get_table(tuple(self.tags))
+        n = len(candidates)
+
+        if self.size >= n:
+            selected = list(candidates)
+            rng.shuffle(selected)
+            return selected
+
+        if self.size > n / 2:
+            # Cada questão recebe a chave u^(1/peso), e as maiores são sorteadas.
+            keys = [rng.random() ** (1 / question.frequency) for question in candidates]
+            chosen_indices = heapq.nlargest(self.size, range(n), key=keys.__getitem__)
+            return [candidates[i] for i in chosen_indices]
+
+        chosen: Dict[int, None] = {}
+        while len(chosen) < self.size:
+            i = rng.randrange(n)
+            if rng.random() >= prob[i]:
+                i = alias[i]
+            chosen[i] = None
+
+        return [candidates[i] for i in chosen]
+
+    @classmethod
+    def from_dict(cls, data: Mapping[Any, Any]) -> 'QuestionPool':
+        """
+        Cria uma instância de :class:`QuestionPool` a partir de um dicionário.
+
+        Parameters
+        ----------
+        data: Mapping[Any, Any]
+            Dicionário contendo os dados do banco de questões.
+
+        Returns
+        -------
+        :class:`QuestionPool`
+            Instância do banco com todas as questões criadas.
+        """
+        return cls(
+            size=data['size'],
+            tags=data.get('tags', []),
+            questions=[
+                PoolQuestion.from_dict(question) for question in data['questions']
+            ],
+        )
+
+
 @dataclass
 class Test:
-    __slots__ = ('id', 'questions')
+    __slots__ = ('id', 'pool', 'questions')
     id: str
     questions: List[Question]
+    pool: Optional[QuestionPool]
+
+    @staticmethod
+    def new_seed() -> int:
+        """
+        Gera uma semente para uma nova tentativa da avaliação.
+        """
+        return random.getrandbits(32)
+
+    def _make_questions(self, pool_questions: List[PoolQuestion]) -> List[Question]:
+        # As questões sorteadas valem o mesmo, e o resto da divisão de 100 é
+        # distribuído entre as primeiras para que a soma dos pesos seja 100.
+        base, remainder = divmod(100, len(pool_questions))
+
+        return [
+            Question(
+                index=index,
+                weight=base + (index < remainder),
+                question=question.question,
+                options=question.options,
+                answer=question.answer,
+            )
+            for index, question in enumerate(pool_questions)
+        ]
+
+    def assemble(self, question_ids: Optional[List[str]]) -> List[Question]:
+        """
+        Monta as questões de uma tentativa a partir dos IDs sorteados.
+
+        Parameters
+        ----------
+        question_ids: Optional[List[:class:`str`]]
+            Os IDs das questões do banco, na ordem da tentativa, como retornados por
+            :meth:`sample_ids`. Ignorado caso a avaliação não tenha um banco de
+            questões.
+
+        Returns
+        -------
+        List[:class:`Question`]
+            As questões da tentativa.
+        """
+        if self.pool is None or question_ids is None:
+            return self.questions
+
+        pool_questions = []
+        for question_id in question_ids:
+            question = self.pool.get_question(question_id)
+            assert question is not None, f'Questão {question_id} não existe.'
+            pool_questions.append(question)
+
+        return self._make_questions(pool_questions)
+
+    def sample_ids(self, seed: Optional[int]) -> Optional[List[str]]:
+        """
+        Sorteia as questões de uma tentativa a partir da sua semente.
+
+        Parameters
+        ----------
+        seed: Optional[:class:`int`]
+            A semente da tentativa. A mesma semente sempre sorteia as mesmas questões.
+
+        Returns
+        -------
+        List[:class:`str`]
+            Os IDs das questões do banco sorteadas.
+        :class:`None`
+            Caso a avaliação não tenha um banco de questões.
+        """
+        if self.pool is None:
+            return None
+
+        return [question.id for question in self.pool.sample(random.Random(seed))]
 
     @classmethod
     def from_dict(cls, data: dict) -> 'Test':
@@ -60,8 +332,11 @@ class Test:
             id=data['id'],
             questions=[
                 Question.from_dict(question)
-                for question in sorted(data['questions'], key=lambda x: x['index'])
+                for question in sorted(
+                    data.get('questions', []), key=lambda x: x['index']
+                )
             ],
+            pool=QuestionPool.from_dict(data['pool']) if 'pool' in data else None,
         )
 
 
@@ -163,3 +438,67 @@ class Course:
                 for subject in sorted(data['subjects'], key=lambda x: x['name'])
             ],
         )
+
+
+# Catálogo carregado uma única vez por :func:`freeze_catalog`. Enquanto for None, o
+# catálogo é lido de "cursos.json" a cada uso.
+_frozen_catalog: Optional[Dict[str, Course]] = None
+
+
+def freeze_catalog() -> Dict[str, Course]:
+    """
+    Carrega o catálogo uma única vez e passa a usá-lo em :func:`get_catalog`.
+
+    Usado pelo supervisor antes de criar os processos filhos, que herdam os
+    objetos já criados em vez de ler e interpretar "cursos.json". Alterações
+    posteriores no arquivo são ignoradas até o processo ser reiniciado.
+
+    Returns
+    -------
+    Dict[:class:`str`, :class:`Course`]
+        Os cursos, pelo ID.
+    """
+    global _frozen_catalog
+
+    _frozen_catalog = None
+    _frozen_catalog = get_catalog()
+
+    return _frozen_catalog
+
+
+def get_catalog() -> Dict[str, Course]:
+    """
+    Retorna todos os cursos do catálogo.
+
+    Returns
+    -------
+    Dict[:class:`str`, :class:`Course`]
+        Os cursos, pelo ID.
+    """
+    if _frozen_catalog is not None:
+        return _frozen_catalog
+
+    return {
+        course_id: Course.from_dict(course)
+        for course_id, course in get_data_file(data_path('cursos.json')).items()
+    }
+
+
+def get_course(course_id: str) -> Course:
+    """
+    Retorna um curso do catálogo.
+
+    Parameters
+    ----------
+    course_id: :class:`str`
+        O ID do curso.
+
+    Returns
+    -------
+    :class:`Course`
+        O curso.
+    """
+    if _frozen_catalog is not None:
+        return _frozen_catalog[course_id]
+
+    return Course.from_dict(get_data_file(data_path('cursos.json'))[course_id])
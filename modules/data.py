@@ -1,7 +1,270 @@
 import os
 import sys
 import json
-from typing import Any
+import time
+import zlib
+import atexit
+import threading
+import contextlib
+from typing import Any, Set, List, Tuple, Callable, Iterable, Iterator, Optional
+
+from .utilities import is_process_running
+from .exceptions import DataChangedError
+from .serialization import get_codec
+
+try:
+    import fcntl
+except ImportError:
+    # No Windows, os arquivos são travados com msvcrt.
+    fcntl = None
+    import msvcrt
+
+# Pasta onde ficam os arquivos de dados.
+DATA_DIR = 'data'
+
+# Arquivos editados à mão, salvos com indentação. Os demais arquivos são gerenciados
+# pelo programa e salvos em JSON compacto, que é menor e mais rápido de escrever.
+PRETTY_FILES = frozenset({'cursos.json', 'shards.json'})
+
+# Tamanho dos blocos lidos por :func:`iter_data_file`.
+READ_CHUNK_SIZE = 64 * 1024
+
+# Tentativas de substituir um arquivo aberto por outro processo, no Windows.
+REPLACE_ATTEMPTS = 10
+
+# Pasta com um arquivo por processo que usa a pasta de dados. Veja :func:`register_process`.
+PROCESSES_DIR = 'processos'
+
+# Quantidade de partições dos usuários. Lida de "shards.json" na primeira utilização.
+_shard_count: Optional[int] = None
+
+# Arquivos de dados travados por cada thread deste processo. Veja :func:`lock_data_file`.
+_held_locks = threading.local()
+
+# Chamada com a quantidade de bytes de cada leitura e escrita dos arquivos de dados.
+# Veja :func:`set_io_hook`.
+_io_hook: Optional[Callable[[int], None]] = None
+
+
+def set_io_hook(hook: Optional[Callable[[int], None]]):
+    """
+    Define uma função chamada com a quantidade de bytes de cada leitura e escrita
+    dos arquivos de dados, como um limite de taxa das tarefas em segundo plano.
+
+    Parameters
+    ----------
+    hook: Optional[Callable[[:class:`int`], None]]
+        A função, que pode esperar antes de retornar, ou None para remover.
+    """
+    global _io_hook
+    _io_hook = hook
+
+
+def resolve_path(path: str) -> str:
+    """
+    Ajusta o caminho de um arquivo caso o programa esteja sendo executado dentro do
+    PyInstaller.
+
+    Parameters
+    ----------
+    path: :class:`str`
+        Caminho do arquivo.
+
+    Returns
+    -------
+    :class:`str`
+        O caminho ajustado.
+    """
+    return f'{sys._MEIPASS}/{path}' if hasattr(sys, '_MEIPASS') else path  # type: ignore
+
+
+def data_path(name: str) -> str:
+    """
+    Retorna o caminho de um arquivo dentro da pasta de dados.
+
+    Parameters
+    ----------
+    name: :class:`str`
+        Nome do arquivo.
+
+    Returns
+    -------
+    :class:`str`
+        O caminho do arquivo.
+    """
+    return f'{DATA_DIR}/{name}'
+
+
+def get_shard_count() -> int:
+    """
+    Retorna a quantidade de partições em que os usuários estão divididos.
+
+    A quantidade é lida do arquivo "shards.json" da pasta de dados. Caso ele não
+    exista, todos os usuários ficam em uma única partição na raiz da pasta de dados.
+
+    Returns
+    -------
+    :class:`int`
+        A quantidade de partições.
+    """
+    global _shard_count
+
+    if _shard_count is None:
+        _shard_count = int(get_data_file(data_path('shards.json')).get('count', 1))
+
+    return _shard_count
+
+
+def set_shard_count(count: int):
+    """
+    Define a quantidade de partições utilizada por este processo.
+
+    Parameters
+    ----------
+    count: :class:`int`
+        A quantidade de partições.
+    """
+    global _shard_count
+
+    _shard_count = count
+
+
+def register_process():
+    """
+    Registra este processo como usuário da pasta de dados até ele terminar.
+
+    O registro é feito com "shards.json" travado, então um processo que inicia
+    durante o reshard.py espera o fim da redistribuição antes de ler a quantidade
+    de partições. Veja :func:`get_running_processes`.
+    """
+    path = resolve_path(data_path(f'{PROCESSES_DIR}/{os.getpid()}'))
+
+    with lock_data_file(data_path('shards.json')):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8'):
+            pass
+
+    atexit.register(_unregister_process, path)
+
+
+def _unregister_process(path: str):
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+
+
+def get_running_processes() -> List[int]:
+    """
+    Retorna os PIDs dos outros processos registrados que ainda estão em execução.
+
+    Os registros de processos encerrados sem removê-los são apagados. Deve ser
+    chamada com "shards.json" travado, para que nenhum processo se registre logo
+    depois.
+
+    Returns
+    -------
+    List[:class:`int`]
+        Os PIDs dos processos.
+    """
+    directory = resolve_path(data_path(PROCESSES_DIR))
+    pids = []
+
+    for name in os.listdir(directory) if os.path.isdir(directory) else ():
+        if not name.isdigit() or int(name) == os.getpid():
+            continue
+
+        if is_process_running(int(name)):
+            pids.append(int(name))
+        else:
+            _unregister_process(f'{directory}/{name}')
+
+    return sorted(pids)
+
+
+def get_shard(username: str, count: Optional[int] = None) -> int:
+    """
+    Retorna a partição de um usuário a partir do hash do seu nome de usuário.
+
+    É utilizado o CRC32 em vez de :func:`hash`, pois o resultado deve ser o mesmo
+    entre processos diferentes.
+
+    Parameters
+    ----------
+    username: :class:`str`
+        Nome de usuário.
+    count: :class:`int`
+        Quantidade de partições. O padrão é a quantidade configurada.
+
+    Returns
+    -------
+    :class:`int`
+        O índice da partição.
+    """
+    if count is None:
+        count = get_shard_count()
+
+    return zlib.crc32(username.encode()) % count
+
+
+def get_shard_dir(shard: int, count: Optional[int] = None) -> str:
+    """
+    Retorna a pasta de uma partição.
+
+    Parameters
+    ----------
+    shard: :class:`int`
+        O índice da partição.
+    count: :class:`int`
+        Quantidade de partições. O padrão é a quantidade configurada.
+
+    Returns
+    -------
+    :class:`str`
+        O caminho da pasta da partição.
+    """
+    if count is None:
+        count = get_shard_count()
+
+    # Com uma única partição, mantemos o formato antigo dos arquivos.
+    if count == 1:
+        return DATA_DIR
+
+    return f'{DATA_DIR}/shards/{shard:02d}'
+
+
+def get_user_file(name: str, username: str) -> str:
+    """
+    Retorna o caminho do arquivo particionado que contém os dados de um usuário.
+
+    Parameters
+    ----------
+    name: :class:`str`
+        Nome do arquivo, como "usuarios.json" ou "logins.json".
+    username: :class:`str`
+        Nome de usuário.
+
+    Returns
+    -------
+    :class:`str`
+        O caminho do arquivo.
+    """
+    return f'{get_shard_dir(get_shard(username))}/{name}'
+
+
+def get_shard_files(name: str) -> List[str]:
+    """
+    Retorna os caminhos de um arquivo particionado em todas as partições.
+
+    Parameters
+    ----------
+    name: :class:`str`
+        Nome do arquivo, como "usuarios.json" ou "logins.json".
+
+    Returns
+    -------
+    List[:class:`str`]
+        Os caminhos do arquivo em cada partição, em ordem.
+    """
+    return [f'{get_shard_dir(shard)}/{name}' for shard in range(get_shard_count())]
 
 
 def get_data_file(path: str) -> Any:
@@ -18,29 +281,479 @@ def get_data_file(path: str) -> Any:
     :class:`typing.Any`
         O conteúdo do arquivo JSON.
     """
-    # Verifica se executando dentro do PyInstaller e ajusta o caminho.
-    path = f'{sys._MEIPASS}/{path}' if hasattr(sys, '_MEIPASS') else path  # type: ignore
+    path = resolve_path(path)
 
     if not os.path.exists(path):
         return {}
 
+    with open(path, 'rb') as file:
+        content = file.read()
+
+    if _io_hook is not None:
+        _io_hook(len(content))
+
+    return get_codec().loads(content)
+
+
+def iter_data_file(path: str) -> Iterator[Tuple[str, Any]]:  # noqa: C901
+    """
+    Lê um arquivo JSON cujo conteúdo é um objeto, retornando um par de chave e valor
+    por vez.
+
+    Diferente de :func:`get_data_file`, o arquivo é lido em blocos e apenas um valor
+    fica em memória por vez, então o consumo de memória não depende do tamanho do
+    arquivo.
+
+    Parameters
+    ----------
+    path: :class:`str`
+        Caminho do arquivo a ser lido.
+
+    Yields
+    ------
+    Tuple[:class:`str`, :class:`typing.Any`]
+        A chave e o valor de cada item do objeto.
+    """
+    path = resolve_path(path)
+
+    if not os.path.exists(path):
+        return
+
+    decoder = json.JSONDecoder()
+
     with open(path, 'r', encoding='utf-8') as file:
-        return json.load(file)
+        buffer = ''
+        pos = 0
+        eof = False
+
+        def fill() -> bool:
+            # Descarta o que já foi lido e adiciona mais um bloco ao buffer.
+            nonlocal buffer, pos, eof
+            if eof:
+                return False
+            chunk = file.read(READ_CHUNK_SIZE)
+            if _io_hook is not None:
+                _io_hook(len(chunk))
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            eof = chunk == ''
+            return not eof
+
+        def next_char() -> str:
+            # Pula os espaços e retorna o próximo caractere sem consumi-lo.
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                    pos += 1
+                if pos < len(buffer):
+                    return buffer[pos]
+                if not fill():
+                    raise ValueError(f'Fim inesperado do arquivo "{path}".')
 
+        def decode() -> Any:
+            # Um valor só é aceito se não terminar no fim do buffer, pois um número
+            # cortado ao meio também seria decodificado sem erros.
+            nonlocal pos
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if not fill():
+                        raise
+                    continue
+                if end == len(buffer) and fill():
+                    continue
+                pos = end
+                return value
 
-def save_data_file(path: str, data: Any):
+        if next_char() != '{':
+            raise ValueError(f'O arquivo "{path}" não contém um objeto.')
+        pos += 1
+
+        if next_char() == '}':
+            return
+
+        while True:
+            next_char()
+            key = decode()
+
+            if next_char() != ':':
+                raise ValueError(f'JSON inválido no arquivo "{path}".')
+            pos += 1
+
+            next_char()
+            yield key, decode()
+
+            separator = next_char()
+            pos += 1
+            if separator == '}':
+                return
+            if separator != ',':
+                raise ValueError(f'JSON inválido no arquivo "{path}".')
+
+
+def get_generation(path: str) -> int:
+    """
+    Retorna a geração atual de um arquivo de dados.
+
+    A geração muda sempre que o arquivo é salvo por :func:`save_data_file`, em
+    qualquer processo, e fica em um arquivo separado e pequeno. Assim, é possível
+    saber se um arquivo mudou sem precisar lê-lo.
+
+    Parameters
+    ----------
+    path: :class:`str`
+        Caminho do arquivo de dados.
+
+    Returns
+    -------
+    :class:`int`
+        A geração do arquivo, ou 0 caso ele nunca tenha sido salvo.
+    """
+    try:
+        with open(f'{resolve_path(path)}.gen', 'r', encoding='utf-8') as file:
+            return int(file.read() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def save_data_file(path: str, data: Any) -> int:
     """
     Salva dados em um arquivo JSON.
 
+    O arquivo é substituído de uma só vez por :func:`write_file_atomic`, então
+    leitores simultâneos nunca veem um arquivo pela metade.
+
     Parameters
     ----------
     path: :class:`str`
         Caminho do arquivo a ser salvo.
     data: :class:`typing.Any`
         Dados a serem salvos no arquivo JSON.
+
+    Returns
+    -------
+    :class:`int`
+        A nova geração do arquivo. Veja :func:`get_generation`.
     """
-    # Verifica se executando dentro do PyInstaller e ajusta o caminho.
-    path = f'{sys._MEIPASS}/{path}' if hasattr(sys, '_MEIPASS') else path  # type: ignore
+    generation = get_generation(path)
+    path = resolve_path(path)
+
+    # As pastas das partições são criadas conforme necessário.
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    write_file_atomic(path, get_codec().dumps(data, pretty=is_pretty(path)))
+
+    return _next_generation(path, generation)
+
+
+@contextlib.contextmanager
+def lock_data_file(path: str) -> Iterator[None]:
+    """
+    Trava um arquivo de dados entre processos enquanto ele é lido, alterado e
+    salvo, para que duas alterações simultâneas não se sobrescrevam.
+
+    A trava é um arquivo ".lock" ao lado do arquivo de dados. Os leitores não
+    precisam dela, pois os arquivos são sempre substituídos de uma só vez. Travar
+    de novo um arquivo já travado pela mesma thread não faz nada.
+
+    Parameters
+    ----------
+    path: :class:`str`
+        Caminho do arquivo de dados.
+    """
+    path = resolve_path(path)
+
+    held: Set[str] = _held_locks.__dict__.setdefault('paths', set())
+    if path in held:
+        yield
+        return
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    fd = os.open(f'{path}.lock', os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        _lock(fd)
+        held.add(path)
+        try:
+            yield
+        finally:
+            held.discard(path)
+            _unlock(fd)
+    finally:
+        os.close(fd)
+
+
+def _lock(fd: int):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+
+    # LK_LOCK desiste após 10 segundos, então a trava é tentada até conseguir.
+    while True:
+        with contextlib.suppress(OSError):
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            return
+
+
+def _unlock(fd: int):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextlib.contextmanager
+def lock_data_files(paths: Iterable[str]) -> Iterator[None]:
+    """
+    Trava vários arquivos de dados com :func:`lock_data_file`, sempre na mesma
+    ordem, para que dois processos travando os mesmos arquivos não se bloqueiem.
+    """
+    with contextlib.ExitStack() as stack:
+        for path in sorted({resolve_path(path) for path in paths}):
+            stack.enter_context(lock_data_file(path))
+        yield
+
+
+def _next_generation(path: str, generation: int) -> int:
+    # O relógio evita que dois processos que leram a mesma geração escrevam o
+    # mesmo número, mantendo a sequência crescente mesmo se o relógio voltar.
+    generation = max(generation + 1, time.time_ns())
+    write_file_atomic(f'{path}.gen', str(generation).encode())
+
+    return generation
+
+
+def write_file_atomic(path: str, data: bytes):
+    """
+    Escreve um arquivo em um arquivo temporário e o coloca no lugar do original.
+
+    Os leitores veem o conteúdo antigo ou o novo, nunca um arquivo pela metade, e
+    não precisam de trava. Como o arquivo original nunca é alterado, apenas
+    substituído, os links criados por :mod:`modules.snapshots` continuam com o
+    conteúdo antigo.
+
+    Parameters
+    ----------
+    path: :class:`str`
+        Caminho do arquivo, já ajustado por :func:`resolve_path`.
+    data: :class:`bytes`
+        O conteúdo do arquivo.
+    """
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+    if _io_hook is not None:
+        _io_hook(len(data))
+
+    try:
+        with open(temp_path, 'wb') as file:
+            file.write(data)
+        _replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(temp_path)
+        raise
+
+
+def _replace(source: str, path: str):
+    # No Windows, a substituição falha enquanto outro processo está com o arquivo
+    # aberto, então ela é tentada mais algumas vezes.
+    for _ in range(REPLACE_ATTEMPTS - 1):
+        if _try_replace(source, path):
+            return
+        time.sleep(0.01)
+
+    os.replace(source, path)
+
+
+def _try_replace(source: str, path: str) -> bool:
+    try:
+        os.replace(source, path)
+    except PermissionError:
+        if os.name != 'nt':
+            raise
+        return False
+
+    return True
+
+
+def is_pretty(path: str) -> bool:
+    """
+    Retorna se um arquivo de dados deve ser salvo com indentação.
+    """
+    return os.path.basename(path) in PRETTY_FILES
+
+
+def write_data_items(
+    path: str, items: Iterable[Tuple[str, Any]], target: Optional[str] = None
+):
+    """
+    Escreve um arquivo JSON cujo conteúdo é um objeto, um par de chave e valor por
+    vez, no mesmo formato de :func:`save_data_file`.
+
+    É a contraparte de :func:`iter_data_file`: apenas um valor fica em memória por
+    vez. O arquivo é escrito diretamente, sem mudar sua geração, então deve ser um
+    arquivo temporário que depois é colocado no lugar por :func:`replace_data_file`.
+
+    Parameters
+    ----------
+    path: :class:`str`
+        Caminho do arquivo a ser escrito.
+    items: Iterable[Tuple[:class:`str`, :class:`typing.Any`]]
+        Os pares de chave e valor do objeto.
+    target: Optional[:class:`str`]
+        O arquivo que será substituído, usado para escolher o formato. Por padrão,
+        é o próprio `path`.
+    """
+    codec = get_codec()
+    pretty = is_pretty(target or path)
+    # Sem as chaves externas, o objeto de um item já tem a indentação certa.
+    start, separator, end, strip = (
+        (b'{\n', b',\n', b'\n}', 2) if pretty else (b'{', b',', b'}', 1)
+    )
+
+    path = resolve_path(path)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    with open(path, 'wb') as file:
+        empty = True
+        for key, value in items:
+            item = codec.dumps({key: value}, pretty=pretty)[strip:-strip]
+            if _io_hook is not None:
+                _io_hook(len(item))
+
+            file.write(start if empty else separator)
+            file.write(item)
+            empty = False
+
+        file.write(b'{}' if empty else end)
+
+
+def replace_data_file(path: str, source: str) -> int:
+    """
+    Substitui um arquivo de dados por outro arquivo e avança sua geração.
+
+    A substituição é atômica: os leitores veem o arquivo antigo ou o novo, nunca
+    um arquivo pela metade.
+
+    Parameters
+    ----------
+    path: :class:`str`
+        Caminho do arquivo de dados.
+    source: :class:`str`
+        Caminho do arquivo novo, que deve estar na mesma pasta.
+
+    Returns
+    -------
+    :class:`int`
+        A nova geração do arquivo. Veja :func:`get_generation`.
+    """
+    generation = get_generation(path)
+    path = resolve_path(path)
+
+    _replace(resolve_path(source), path)
+
+    return _next_generation(path, generation)
+
+
+def rewrite_shard_files(
+    name: str,
+    rewrite: Callable[[str], Iterable[Tuple[str, Any]]],
+    *,
+    dry_run: bool = False,
+    on_replace: Optional[Callable[[str, int], None]] = None,
+):
+    """
+    Reescreve um arquivo particionado em todas as partições, um item por vez, e
+    substitui todas as partições de uma só vez ao final.
+
+    Cada partição é escrita em um arquivo temporário com :func:`write_data_items`.
+    Os arquivos só são substituídos depois que todas as partições foram escritas, e
+    apenas se nenhuma foi alterada enquanto isso. Caso contrário, nada é salvo.
+
+    Parameters
+    ----------
+    name: :class:`str`
+        Nome do arquivo, como "usuarios.json".
+    rewrite: Callable[[:class:`str`], Iterable[Tuple[:class:`str`, Any]]]
+        Recebe o caminho do arquivo de uma partição e retorna os itens novos,
+        normalmente lendo os antigos com :func:`iter_data_file`.
+    dry_run: :class:`bool`
+        Se verdadeiro, os itens são percorridos mas nada é escrito.
+    on_replace: Optional[Callable[[:class:`str`, :class:`int`], None]]
+        Repassada para :func:`replace_data_files`.
+
+    Raises
+    ------
+    DataChangedError
+        Uma partição foi alterada durante a reescrita.
+    """
+    temporary: List[Tuple[str, str, int]] = []
+
+    try:
+        for path in get_shard_files(name):
+            generation = get_generation(path)
+            items = rewrite(path)
+
+            if dry_run:
+                for _ in items:
+                    pass
+                continue
+
+            temp_path = f'{path}.rewriting'
+            write_data_items(temp_path, items, path)
+            temporary.append((path, temp_path, generation))
+    except BaseException:
+        for _, temp_path, _ in temporary:
+            os.remove(resolve_path(temp_path))
+        raise
+
+    replace_data_files(temporary, on_replace)
+
+
+def replace_data_files(
+    replacements: Iterable[Tuple[str, str, int]],
+    on_replace: Optional[Callable[[str, int], None]] = None,
+):
+    """
+    Substitui vários arquivos de dados por arquivos temporários de uma só vez.
+
+    Nenhum arquivo é substituído caso algum tenha mudado desde a geração informada.
+    Os arquivos ficam travados com :func:`lock_data_files` da verificação até a
+    substituição, então uma escrita concorrente acontece antes da verificação ou
+    depois da substituição. Os arquivos temporários são sempre apagados ou
+    colocados no lugar.
+
+    Parameters
+    ----------
+    replacements: Iterable[Tuple[:class:`str`, :class:`str`, :class:`int`]]
+        O caminho de cada arquivo, o caminho do arquivo temporário, na mesma pasta,
+        e a geração do arquivo quando sua leitura começou.
+    on_replace: Optional[Callable[[:class:`str`, :class:`int`], None]]
+        Chamada com o caminho e a nova geração de cada arquivo substituído, ainda
+        com os arquivos travados. Usada para registrar as alterações e atualizar
+        os índices.
+
+    Raises
+    ------
+    DataChangedError
+        Um dos arquivos foi alterado desde a geração informada.
+    """
+    pending = list(replacements)
+
+    try:
+        with lock_data_files(path for path, _, _ in pending):
+            for path, _, generation in pending:
+                if get_generation(path) != generation:
+                    raise DataChangedError(
+                        f'O arquivo "{path}" foi alterado durante a reescrita.'
+                    )
 
-    with open(path, 'w', encoding='utf-8') as file:
-        json.dump(data, file, ensure_ascii=False, indent=2)
+            while pending:
+                path, temp_path, _ = pending.pop(0)
+                generation = replace_data_file(path, temp_path)
+                if on_replace is not None:
+                    on_replace(path, generation)
+    finally:
+        for _, temp_path, _ in pending:
+            os.remove(resolve_path(temp_path))
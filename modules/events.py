@@ -0,0 +1,86 @@
+import os
+import time
+from typing import Tuple, Iterator, NamedTuple
+
+from .data import data_path, resolve_path
+
+EVENTS_FILE = 'eventos.csv'
+
+# Tipos de evento.
+EVENT_COURSE = 'C'  # Matrícula em um curso.
+EVENT_LESSON = 'L'  # Aula exibida.
+EVENT_TEST = 'T'  # Avaliação finalizada.
+
+
+class Event(NamedTuple):
+    timestamp: int
+    username: str
+    subject_id: str
+    item_id: str
+    type: str
+
+
+def record_event(username: str, subject_id: str, item_id: str, event_type: str):
+    """
+    Adiciona um evento de progresso ao final do arquivo de eventos.
+
+    Cada evento é uma linha curta no formato
+    ``timestamp,usuário,disciplina,item,tipo``. A linha é escrita com uma única
+    chamada em modo de adição, então processos diferentes podem registrar eventos
+    ao mesmo tempo sem misturar as linhas.
+
+    Parameters
+    ----------
+    username: :class:`str`
+        O nome de usuário do aluno.
+    subject_id: :class:`str`
+        O ID da disciplina, ou uma string vazia para eventos do curso.
+    item_id: :class:`str`
+        O ID da aula, da avaliação ou do curso.
+    event_type: :class:`str`
+        O tipo do evento, como :data:`EVENT_LESSON`.
+    """
+    line = f'{int(time.time())},{username},{subject_id},{item_id},{event_type}\n'
+
+    path = resolve_path(data_path(EVENTS_FILE))
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode())
+    finally:
+        os.close(fd)
+
+
+def read_events(offset: int = 0) -> Iterator[Tuple[Event, int]]:
+    """
+    Lê os eventos a partir de uma posição do arquivo.
+
+    Parameters
+    ----------
+    offset: :class:`int`
+        A posição, em bytes, a partir da qual os eventos são lidos.
+
+    Yields
+    ------
+    Tuple[:class:`Event`, :class:`int`]
+        Cada evento e a posição logo após ele. Uma linha incompleta no final do
+        arquivo, ainda sendo escrita, não é retornada.
+    """
+    path = resolve_path(data_path(EVENTS_FILE))
+    if not os.path.exists(path):
+        return
+
+    with open(path, 'rb') as file:
+        file.seek(offset)
+
+        for line in file:
+            if not line.endswith(b'\n'):
+                return
+
+            offset += len(line)
+            timestamp, username, subject_id, item_id, event_type = (
+                line.decode().rstrip('\n').split(',')
+            )
+            yield (
+                Event(int(timestamp), username, subject_id, item_id, event_type),
+                offset,
+            )
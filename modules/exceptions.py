@@ -1,2 +1,10 @@
 class Exit(Exception):
     """Exception to signal an exit from the program."""
+
+
+class DataChangedError(Exception):
+    """Exception raised when a data file changes during a batch rewrite."""
+
+
+class DataInUseError(Exception):
+    """Exception raised when another process is using the data directory."""
@@ -0,0 +1,267 @@
+import math
+from typing import Any, Dict, List, Tuple, Mapping, Iterable, Optional, Sequence
+
+# Faixas etárias dos relatórios. A última faixa contém todas as idades acima de 70.
+AGE_BANDS = (
+    (0, 10),
+    (10, 20),
+    (20, 30),
+    (30, 40),
+    (40, 50),
+    (50, 60),
+    (60, 70),
+    (70, 100),
+)
+GENDERS = ('h', 'm', 'n')
+
+# Largura, em pontos percentuais, das faixas do histograma usado na mediana.
+HISTOGRAM_WIDTH = 5
+HISTOGRAM_BINS = 100 // HISTOGRAM_WIDTH + 1
+
+# Nota de aprovação padrão, em porcentagem.
+PASSING_GRADE = 60.0
+
+# Dimensões que podem ser usadas nas consultas. O curso não é um eixo do cubo, pois
+# é determinado pela disciplina.
+DIMENSIONS = ('course', 'subject', 'city', 'gender', 'age')
+
+
+def get_age_band(age: int) -> int:
+    """
+    Retorna o índice da faixa etária que contém `age`.
+    """
+    for i, (_, end) in enumerate(AGE_BANDS[:-1]):
+        if age < end:
+            return i
+    return len(AGE_BANDS) - 1
+
+
+class GradeStats:
+    """
+    Estatísticas das notas de um grupo de células do cubo.
+
+    Attributes
+    ----------
+    count: :class:`int`
+        Quantidade de notas.
+    mean: :class:`float`
+        A média das notas.
+    stddev: :class:`float`
+        O desvio padrão das notas.
+    median: :class:`float`
+        A mediana, aproximada pelo histograma.
+    pass_rate: :class:`float`
+        A proporção de notas maiores ou iguais à nota de aprovação.
+    """
+
+    __slots__ = ('count', 'mean', 'median', 'pass_rate', 'stddev')
+
+    def __init__(
+        self,
+        count: int,
+        total: float,
+        squares: float,
+        passed: int,
+        histogram: List[int],
+    ):
+        self.count = count
+        self.mean = total / count if count else 0.0
+        variance = squares / count - self.mean**2 if count else 0.0
+        self.stddev = math.sqrt(max(variance, 0.0))
+        self.pass_rate = passed / count if count else 0.0
+        self.median = self._median(histogram)
+
+    def _median(self, histogram: List[int]) -> float:
+        # Interpola linearmente dentro da faixa que contém a metade das notas.
+        half = self.count / 2
+        seen = 0
+        for i, n in enumerate(histogram):
+            if n and seen + n >= half:
+                return min((i + (half - seen) / n) * HISTOGRAM_WIDTH, 100.0)
+            seen += n
+        return 0.0
+
+
+class GradeCube:
+    """
+    Cubo das notas dos alunos por disciplina, cidade, gênero e faixa etária.
+
+    Apenas as células com notas são guardadas, em um dicionário cuja chave é a
+    disciplina, a cidade, o gênero e a faixa etária. Cada célula guarda a
+    quantidade de notas, a soma, a soma dos quadrados, a quantidade de aprovações
+    e um histograma. Qualquer agrupamento ou filtro é respondido somando células,
+    sem reler os alunos.
+
+    Parameters
+    ----------
+    subjects: Sequence[Tuple[:class:`str`, :class:`str`]]
+        O ID de cada disciplina e o ID do seu curso.
+    passing_grade: :class:`float`
+        A nota de aprovação, em porcentagem.
+    """
+
+    def __init__(
+        self,
+        subjects: Sequence[Tuple[str, str]],
+        passing_grade: float = PASSING_GRADE,
+    ):
+        self.subject_courses = dict(subjects)
+        self.passing_grade = passing_grade
+        # (disciplina, cidade, gênero, faixa etária) -> [quantidade, soma,
+        # soma dos quadrados, aprovações, histograma].
+        self.cells: Dict[Tuple[str, str, str, int], List[Any]] = {}
+
+    @classmethod
+    def build(
+        cls,
+        courses: Mapping[str, Any],
+        users: Iterable[Mapping[str, Any]],
+        passing_grade: float = PASSING_GRADE,
+    ) -> 'GradeCube':
+        """
+        Monta o cubo em uma única passagem pelos alunos.
+
+        Parameters
+        ----------
+        courses: Mapping[:class:`str`, Any]
+            O conteúdo de "cursos.json".
+        users: Iterable[Mapping[:class:`str`, Any]]
+            Os dados dos alunos, como salvos em "usuarios.json".
+        passing_grade: :class:`float`
+            A nota de aprovação, em porcentagem.
+
+        Returns
+        -------
+        :class:`GradeCube`
+            O cubo montado. Notas de disciplinas fora do catálogo são ignoradas.
+        """
+        subjects = [
+            (subject['id'], course_id)
+            for course_id, course in courses.items()
+            for subject in course['subjects']
+        ]
+        cube = cls(subjects, passing_grade)
+
+        for user in users:
+            if not user['grades']:
+                continue
+
+            city = user['city']
+            gender = user['gender'] or 'n'
+            age = get_age_band(user['age'])
+
+            for subject_id, grade in user['grades'].items():
+                if subject_id in cube.subject_courses:
+                    cube._add((subject_id, city, gender, age), grade)
+
+        return cube
+
+    def _get_cell(self, key: Tuple[str, str, str, int]) -> List[Any]:
+        cell = self.cells.get(key)
+        if cell is None:
+            cell = self.cells[key] = [0, 0.0, 0.0, 0, [0] * HISTOGRAM_BINS]
+        return cell
+
+    def _add(self, key: Tuple[str, str, str, int], grade: float):
+        cell = self._get_cell(key)
+        cell[0] += 1
+        cell[1] += grade
+        cell[2] += grade * grade
+        if grade >= self.passing_grade:
+            cell[3] += 1
+        cell[4][int(grade) // HISTOGRAM_WIDTH] += 1
+
+    def merge(self, other: 'GradeCube'):
+        """
+        Soma as células de outro cubo a este, como os cubos de partições diferentes.
+        """
+        self.subject_courses.update(other.subject_courses)
+
+        for key, (count, total, squares, passed, histogram) in other.cells.items():
+            cell = self._get_cell(key)
+            cell[0] += count
+            cell[1] += total
+            cell[2] += squares
+            cell[3] += passed
+            cell[4] = [a + b for a, b in zip(cell[4], histogram)]
+
+    def query(
+        self,
+        group_by: Sequence[str] = (),
+        where: Optional[Mapping[str, str]] = None,
+    ) -> Dict[Tuple[str, ...], GradeStats]:
+        """
+        Agrupa as células do cubo e calcula as estatísticas de cada grupo.
+
+        As células com notas são percorridas uma única vez.
+
+        Parameters
+        ----------
+        group_by: Sequence[:class:`str`]
+            As dimensões do agrupamento, dentre :data:`DIMENSIONS`. Sem dimensões,
+            o resultado tem um único grupo com todas as notas.
+        where: Optional[Mapping[:class:`str`, :class:`str`]]
+            Filtra as células pelo valor de cada dimensão, como ``{'gender': 'm'}``.
+
+        Returns
+        -------
+        Dict[Tuple[:class:`str`, ...], :class:`GradeStats`]
+            As estatísticas de cada grupo com pelo menos uma nota, em ordem.
+        """
+        for dimension in (*group_by, *(where or {})):
+            if dimension not in DIMENSIONS:
+                raise ValueError(f'Dimensão desconhecida: "{dimension}".')
+
+        age_labels = [f'{start} |---------- {end}' for start, end in AGE_BANDS]
+        filters = list((where or {}).items())
+        groups: Dict[Tuple[str, ...], List[Any]] = {}
+
+        for (subject_id, city, gender, age), cell in self.cells.items():
+            labels = {
+                'course': self.subject_courses[subject_id],
+                'subject': subject_id,
+                'city': city,
+                'gender': gender,
+                'age': age_labels[age],
+            }
+            if any(labels[k] != v for k, v in filters):
+                continue
+
+            key = tuple(labels[dimension] for dimension in group_by)
+            group = groups.get(key)
+            if group is None:
+                groups[key] = [*cell[:4], list(cell[4])]
+                continue
+
+            group[0] += cell[0]
+            group[1] += cell[1]
+            group[2] += cell[2]
+            group[3] += cell[3]
+            group[4] = [a + b for a, b in zip(group[4], cell[4])]
+
+        return {key: GradeStats(*groups[key]) for key in sorted(groups)}
+
+    def to_dict(self) -> Dict[str, Any]:
+        # Apenas as células com notas e as faixas não vazias dos histogramas.
+        return {
+            'passing_grade': self.passing_grade,
+            'subjects': [list(s) for s in self.subject_courses.items()],
+            'cells': [
+                [
+                    *key,
+                    *cell[:4],
+                    [[i, n] for i, n in enumerate(cell[4]) if n],
+                ]
+                for key, cell in self.cells.items()
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> 'GradeCube':
+        cube = cls([tuple(s) for s in data['subjects']], data['passing_grade'])
+        for subject_id, city, gender, age, *stats, bins in data['cells']:
+            histogram = [0] * HISTOGRAM_BINS
+            for i, n in bins:
+                histogram[i] = n
+            cube.cells[subject_id, city, gender, age] = [*stats, histogram]
+        return cube
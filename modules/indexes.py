@@ -0,0 +1,330 @@
+import os
+import contextlib
+from typing import (
+    Any,
+    Set,
+    Dict,
+    List,
+    Tuple,
+    Mapping,
+    Iterable,
+    Optional,
+    MutableMapping,
+)
+from collections import defaultdict
+from urllib.parse import quote, unquote
+
+from .data import (
+    resolve_path,
+    get_data_file,
+    get_generation,
+    iter_data_file,
+    lock_data_file,
+    save_data_file,
+    get_shard_files,
+    write_file_atomic,
+)
+from .changelog import record_changes
+from .utilities import normalize
+from .serialization import get_codec
+
+# Pasta dos índices, dentro da pasta de cada partição.
+INDEX_DIR = 'indices'
+
+# Campos indexados. "done" contém as disciplinas concluídas pelo aluno.
+INDEX_FIELDS = ('course', 'city', 'age', 'done')
+
+# Chave do índice de cursos para alunos sem curso.
+NO_COURSE = '-'
+
+
+def get_index_keys(record: Mapping[str, Any]) -> Dict[str, Set[str]]:
+    """
+    Retorna as chaves de cada índice que apontam para um usuário.
+
+    Parameters
+    ----------
+    record: Mapping[:class:`str`, Any]
+        Os dados do usuário, como salvos em "usuarios.json".
+
+    Returns
+    -------
+    Dict[:class:`str`, Set[:class:`str`]]
+        As chaves de cada campo de :data:`INDEX_FIELDS`.
+    """
+    return {
+        'course': {record.get('course_id') or NO_COURSE},
+        'city': {normalize(record['city'])},
+        'age': {str(record['age'])},
+        'done': {
+            subject_id
+            for subject_id, lesson_id in (record.get('current_lesson') or {}).items()
+            if lesson_id == '-'
+        },
+    }
+
+
+def _index_dir(users_path: str) -> str:
+    return f'{os.path.dirname(resolve_path(users_path)) or "."}/{INDEX_DIR}'
+
+
+def _posting_path(users_path: str, field: str, key: str) -> str:
+    return f'{_index_dir(users_path)}/{field}/{quote(key, safe="")}.json'
+
+
+def _read_posting(path: str) -> Set[str]:
+    try:
+        with open(path, 'rb') as file:
+            return set(get_codec().loads(file.read()))
+    except FileNotFoundError:
+        return set()
+
+
+def _write_posting(path: str, usernames: Set[str]):
+    if not usernames:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+        return
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_file_atomic(path, get_codec().dumps(sorted(usernames)))
+
+
+def _get_index_generation(users_path: str) -> Optional[int]:
+    # Sem índices, retorna None, que é diferente de qualquer geração.
+    try:
+        with open(
+            f'{_index_dir(users_path)}/generation', 'r', encoding='utf-8'
+        ) as file:
+            return int(file.read())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _set_index_generation(users_path: str, generation: int):
+    os.makedirs(_index_dir(users_path), exist_ok=True)
+    write_file_atomic(f'{_index_dir(users_path)}/generation', str(generation).encode())
+
+
+def rebuild_index(
+    users_path: str, users: Optional[Iterable[Tuple[str, Mapping[str, Any]]]] = None
+):
+    """
+    Reconstrói os índices de uma partição a partir dos usuários.
+
+    Parameters
+    ----------
+    users_path: :class:`str`
+        O arquivo de usuários da partição.
+    users: Optional[Iterable[Tuple[:class:`str`, Mapping[:class:`str`, Any]]]]
+        Os usuários já carregados. Por padrão, o arquivo é percorrido sem ser
+        carregado inteiro.
+    """
+    generation = get_generation(users_path)
+    postings: Dict[Tuple[str, str], Set[str]] = defaultdict(set)
+
+    for username, record in users if users is not None else iter_data_file(users_path):
+        for field, keys in get_index_keys(record).items():
+            for key in keys:
+                postings[field, key].add(username)
+
+    # A pasta não é apagada, pois outros processos podem estar escrevendo nela.
+    # Cada lista é substituída, e as que não existem mais são removidas.
+    written = set()
+    for (field, key), usernames in postings.items():
+        path = _posting_path(users_path, field, key)
+        _write_posting(path, usernames)
+        written.add(path)
+
+    for field in INDEX_FIELDS:
+        field_dir = f'{_index_dir(users_path)}/{field}'
+        names = os.listdir(field_dir) if os.path.isdir(field_dir) else []
+        for name in names:
+            path = f'{field_dir}/{name}'
+            if name.endswith('.json') and path not in written:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+
+    _set_index_generation(users_path, generation)
+
+
+def save_user_records(
+    path: str, records: Mapping[str, MutableMapping[str, Any]]
+) -> int:
+    """
+    Salva os registros de alguns usuários em um arquivo de usuários, atualiza os
+    índices da partição e adiciona a alteração ao registro de alterações.
+
+    O arquivo fica travado com :func:`lock_data_file` da leitura até os índices,
+    então escritas simultâneas na mesma partição não perdem usuários. Caso o
+    campo "version" de um registro não seja maior que o salvo, ele é ajustado no
+    próprio registro para a versão salva mais um.
+
+    Apenas as listas das chaves que mudaram são reescritas. Caso os índices não
+    correspondam à versão anterior do arquivo, por ele ter sido alterado sem
+    passar por aqui, eles são reconstruídos.
+
+    Parameters
+    ----------
+    path: :class:`str`
+        O arquivo de usuários.
+    records: Mapping[:class:`str`, MutableMapping[:class:`str`, Any]]
+        Os dados de cada usuário, pelo nome de usuário.
+
+    Returns
+    -------
+    :class:`int`
+        A nova geração do arquivo de usuários.
+    """
+    with lock_data_file(path):
+        old_generation = get_generation(path)
+        users = get_data_file(path)
+        previous = {username: users.get(username) for username in records}
+
+        # A versão salva de cada usuário sempre cresce, mesmo que duas instâncias
+        # do mesmo usuário tenham sido alteradas a partir da mesma versão.
+        for username, record in records.items():
+            old = previous[username]
+            if old is not None and record.get('version', 0) <= old.get('version', 0):
+                record['version'] = old.get('version', 0) + 1
+
+        users.update(records)
+        generation = save_data_file(path, users)
+        record_changes(path, generation, records)
+
+        if _get_index_generation(path) != old_generation:
+            rebuild_index(path, users.items())
+        else:
+            _update_index(path, previous, records, generation)
+
+    return generation
+
+
+def _update_index(
+    path: str,
+    previous: Mapping[str, Optional[Mapping[str, Any]]],
+    records: Mapping[str, Mapping[str, Any]],
+    generation: int,
+):
+    # Apenas as listas das chaves que mudaram são reescritas.
+    changes: Dict[Tuple[str, str], Dict[str, bool]] = defaultdict(dict)
+    for username, record in records.items():
+        old = previous[username]
+        old_keys = get_index_keys(old) if old is not None else {}
+        new_keys = get_index_keys(record)
+
+        for field in INDEX_FIELDS:
+            before = old_keys.get(field, set())
+            after = new_keys[field]
+            for key in before - after:
+                changes[field, key][username] = False
+            for key in after - before:
+                changes[field, key][username] = True
+
+    for (field, key), usernames in changes.items():
+        posting_path = _posting_path(path, field, key)
+        posting = _read_posting(posting_path)
+        for username, present in usernames.items():
+            if present:
+                posting.add(username)
+            else:
+                posting.discard(username)
+        _write_posting(posting_path, posting)
+
+    _set_index_generation(path, generation)
+
+
+def query_users(
+    course_id: Optional[str] = None,
+    cities: Iterable[str] = (),
+    ages: Optional[Iterable[int]] = None,
+    finished: Iterable[str] = (),
+    not_finished: Iterable[str] = (),
+) -> List[str]:
+    """
+    Busca os alunos que atendem a todos os filtros usando os índices.
+
+    Em cada partição, as listas dos filtros são lidas da menor para a maior e
+    intersectadas, parando assim que o resultado fica vazio. Os índices
+    desatualizados são reconstruídos antes, com a partição travada.
+
+    Parameters
+    ----------
+    course_id: Optional[:class:`str`]
+        O ID do curso.
+    cities: Iterable[:class:`str`]
+        As cidades aceitas. A comparação ignora acentos e maiúsculas.
+    ages: Optional[Iterable[:class:`int`]]
+        As idades aceitas, como ``range(18, 21)``.
+    finished: Iterable[:class:`str`]
+        IDs das disciplinas que o aluno deve ter concluído.
+    not_finished: Iterable[:class:`str`]
+        IDs das disciplinas que o aluno não pode ter concluído.
+
+    Returns
+    -------
+    List[:class:`str`]
+        Os nomes de usuário encontrados, em ordem.
+    """
+    # Cada filtro é uma lista de chaves; o aluno precisa estar em uma delas.
+    filters: List[List[Tuple[str, str]]] = []
+    if course_id is not None:
+        filters.append([('course', course_id)])
+    if cities:
+        filters.append([('city', normalize(city)) for city in cities])
+    if ages is not None:
+        filters.append([('age', str(age)) for age in ages])
+    filters.extend([('done', subject_id)] for subject_id in finished)
+    excluded = [('done', subject_id) for subject_id in not_finished]
+
+    result = []
+
+    for path in get_shard_files('usuarios.json'):
+        if not os.path.exists(resolve_path(path)):
+            continue
+        if _get_index_generation(path) != get_generation(path):
+            # A partição é travada como em save_user_records, para que uma escrita
+            # concorrente não fique de fora de um índice marcado como atual.
+            with lock_data_file(path):
+                if _get_index_generation(path) != get_generation(path):
+                    rebuild_index(path)
+
+        result.extend(_query_shard(path, filters, excluded))
+
+    return sorted(result)
+
+
+def _query_shard(
+    path: str, filters: List[List[Tuple[str, str]]], excluded: List[Tuple[str, str]]
+) -> Set[str]:
+    def size(keys: List[Tuple[str, str]]) -> int:
+        return sum(
+            os.path.getsize(p)
+            for p in (_posting_path(path, *key) for key in keys)
+            if os.path.exists(p)
+        )
+
+    def read(keys: List[Tuple[str, str]]) -> Set[str]:
+        return set().union(*(_read_posting(_posting_path(path, *key)) for key in keys))
+
+    if not filters:
+        # Sem filtros positivos, o ponto de partida são todos os alunos.
+        course_dir = f'{_index_dir(path)}/course'
+        names = os.listdir(course_dir) if os.path.isdir(course_dir) else []
+        candidates = read(
+            [('course', unquote(name[: -len('.json')])) for name in names]
+        )
+    else:
+        filters = sorted(filters, key=size)
+        candidates = read(filters[0])
+        for keys in filters[1:]:
+            if not candidates:
+                break
+            candidates &= read(keys)
+
+    for key in excluded:
+        if not candidates:
+            break
+        candidates -= _read_posting(_posting_path(path, *key))
+
+    return candidates
@@ -0,0 +1,476 @@
+import os
+import sys
+import time
+import threading
+import traceback
+import contextlib
+import multiprocessing
+from typing import Any, Dict, List, Callable, Iterator, Optional
+
+from . import data
+from .data import (
+    data_path,
+    resolve_path,
+    get_data_file,
+    lock_data_file,
+    save_data_file,
+)
+from .utilities import is_process_running
+
+# Pasta das tarefas, dentro da pasta de dados.
+JOBS_DIR = 'tarefas'
+
+# Prioridades, da maior para a menor.
+PRIORITIES = ('alta', 'normal', 'baixa')
+
+PENDING = 'pendente'
+RUNNING = 'executando'
+DONE = 'concluida'
+FAILED = 'erro'
+
+# Tentativas de uma tarefa cujo processo foi encerrado sem registrar o resultado,
+# até ela ser marcada com erro.
+MAX_ATTEMPTS = 3
+
+# Prioridade das tarefas no escalonador do sistema, para que os alunos sejam
+# atendidos antes. Veja :func:`os.nice`.
+JOB_NICENESS = 10
+
+
+class RateLimiter:
+    """
+    Limita a quantidade de bytes por segundo com um balde de fichas, esperando
+    quando o limite é ultrapassado.
+
+    O balde comporta um segundo de bytes, então uma leitura grande logo após um
+    período parado não espera, e as seguintes esperam até a média voltar ao limite.
+
+    Parameters
+    ----------
+    rate: :class:`float`
+        Bytes por segundo.
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.total = 0
+
+        self._tokens = rate
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __call__(self, size: int):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.rate, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= size
+            self.total += size
+
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        if delay:
+            time.sleep(delay)
+
+
+class JobContext:
+    """
+    O que uma tarefa recebe ao ser executada.
+
+    Parameters
+    ----------
+    job: Dict[:class:`str`, Any]
+        A tarefa, como retornada por :func:`get_job`.
+    limiter: :class:`RateLimiter`
+        O limite de bytes por segundo do processo da tarefa. Leituras e escritas
+        dos arquivos de dados já passam por ele; outros arquivos devem chamá-lo.
+    """
+
+    def __init__(self, job: Dict[str, Any], limiter: RateLimiter):
+        self.id: int = job['id']
+        self.args: Dict[str, Any] = job['args']
+        # Salvo a cada passo concluído, e recebido de volta quando uma tarefa
+        # interrompida é retomada.
+        self.checkpoint: Dict[str, Any] = job['checkpoint']
+        self.limiter = limiter
+
+
+# Uma tarefa é um gerador que avança um passo por vez. O progresso é salvo a cada
+# valor gerado, então os passos devem ser curtos e repetíveis.
+JobFunction = Callable[[JobContext], Iterator[None]]
+
+
+def _jobs_root() -> str:
+    return resolve_path(data_path(JOBS_DIR))
+
+
+def _job_path(job_id: int) -> str:
+    return f'{_jobs_root()}/{job_id}.json'
+
+
+def _claim_path(job_id: int) -> str:
+    return f'{_jobs_root()}/{job_id}.lock'
+
+
+def claim_job(job_id: int) -> bool:
+    """
+    Reserva uma tarefa pendente para o escalonador atual, para que dois
+    escalonadores nunca executem a mesma tarefa.
+
+    A reserva é o arquivo "<número>.lock", na pasta das tarefas, criado com
+    ``O_EXCL`` e com o número do processo do escalonador. Uma reserva cujo escalonador e cujo processo
+    da tarefa foram encerrados é descartada. A verificação e a criação acontecem
+    com a tarefa travada por :func:`lock_data_file`, então dois escalonadores não
+    descartam a mesma reserva e a recriam ao mesmo tempo.
+
+    Parameters
+    ----------
+    job_id: :class:`int`
+        O número da tarefa.
+
+    Returns
+    -------
+    :class:`bool`
+        Se a tarefa foi reservada. Caso contrário, outro escalonador a reservou ou
+        ela não está mais pendente.
+    """
+    path = _claim_path(job_id)
+
+    with lock_data_file(_job_path(job_id)):
+        owner = _get_claim_owner(job_id)
+        if owner is not None:
+            job_pid = get_job(job_id).get('pid')
+            if (owner and is_process_running(owner)) or (
+                job_pid and is_process_running(job_pid)
+            ):
+                return False
+            # A reserva é de um escalonador encerrado sem liberá-la.
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+
+        if get_job(job_id).get('status') != PENDING:
+            return False
+
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            file.write(str(os.getpid()))
+
+    return True
+
+
+def release_job(job_id: int):
+    """
+    Libera a reserva de uma tarefa feita por :func:`claim_job`.
+    """
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(_claim_path(job_id))
+
+
+def _get_claim_owner(job_id: int) -> Optional[int]:
+    try:
+        with open(_claim_path(job_id), encoding='utf-8') as file:
+            content = file.read()
+    except FileNotFoundError:
+        return None
+
+    # Uma reserva vazia está sendo criada, ou foi interrompida antes de ser escrita.
+    return int(content) if content.isdigit() else 0
+
+
+def get_job_log_path(job_id: int) -> str:
+    """
+    Retorna o arquivo com a saída da tarefa.
+    """
+    return f'{_jobs_root()}/{job_id}.log'
+
+
+def submit_job(kind: str, args: Dict[str, Any], priority: str = 'normal') -> int:
+    """
+    Adiciona uma tarefa à fila.
+
+    Parameters
+    ----------
+    kind: :class:`str`
+        O tipo da tarefa, uma chave do dicionário passado ao :class:`Scheduler`.
+    args: Dict[:class:`str`, Any]
+        Os argumentos da tarefa.
+    priority: :class:`str`
+        Uma das :data:`PRIORITIES`.
+
+    Returns
+    -------
+    :class:`int`
+        O número da tarefa.
+    """
+    if priority not in PRIORITIES:
+        raise ValueError(f'Prioridade inválida: {priority}')
+
+    root = _jobs_root()
+    os.makedirs(root, exist_ok=True)
+
+    # O número é reservado criando o arquivo, então dois processos não o repetem.
+    job_id = max((job['id'] for job in get_jobs()), default=0) + 1
+    while True:
+        try:
+            os.close(os.open(_job_path(job_id), os.O_WRONLY | os.O_CREAT | os.O_EXCL))
+            break
+        except FileExistsError:
+            job_id += 1
+
+    save_job(
+        {
+            'id': job_id,
+            'kind': kind,
+            'args': args,
+            'priority': priority,
+            'status': PENDING,
+            'submitted': time.time(),
+            'started': None,
+            'finished': None,
+            'runtime': 0.0,
+            'bytes': 0,
+            'attempts': 0,
+            'pid': None,
+            'checkpoint': {},
+            'error': None,
+        }
+    )
+
+    return job_id
+
+
+def get_job(job_id: int) -> Dict[str, Any]:
+    return get_data_file(_job_path(job_id))
+
+
+def save_job(job: Dict[str, Any]):
+    save_data_file(_job_path(job['id']), job)
+
+
+def get_jobs() -> List[Dict[str, Any]]:
+    """
+    Retorna todas as tarefas, em ordem de número.
+    """
+    try:
+        names = os.listdir(_jobs_root())
+    except FileNotFoundError:
+        return []
+
+    jobs = []
+    for name in names:
+        number, _, extension = name.partition('.')
+        if number.isdigit() and extension == 'json':
+            job = get_job(int(number))
+            # Arquivo reservado por submit_job e ainda não salvo.
+            if job:
+                jobs.append(job)
+
+    return sorted(jobs, key=lambda job: job['id'])
+
+
+def run_job(job_id: int, kinds: Dict[str, JobFunction], byte_rate: float):
+    """
+    Executa uma tarefa no processo atual, salvando o progresso a cada passo.
+
+    A saída é escrita em :func:`get_job_log_path`. Um Ctrl+C devolve a tarefa à
+    fila, para ser retomada do último passo salvo.
+
+    Parameters
+    ----------
+    job_id: :class:`int`
+        O número da tarefa.
+    kinds: Dict[:class:`str`, :data:`JobFunction`]
+        As funções de cada tipo de tarefa.
+    byte_rate: :class:`float`
+        Bytes lidos e escritos por segundo neste processo.
+    """
+    log = open(get_job_log_path(job_id), 'a', buffering=1, encoding='utf-8')  # noqa: SIM115
+    sys.stdout = sys.stderr = log
+
+    if hasattr(os, 'nice'):
+        os.nice(JOB_NICENESS)
+
+    limiter = RateLimiter(byte_rate)
+    data.set_io_hook(limiter)
+
+    job = get_job(job_id)
+    job.update(status=RUNNING, pid=os.getpid(), attempts=job['attempts'] + 1)
+    job['started'] = job['started'] or time.time()
+    save_job(job)
+
+    runtime = job['runtime']
+    start = time.perf_counter()
+
+    def update():
+        job['runtime'] = runtime + time.perf_counter() - start
+        job['bytes'] = job['bytes'] + limiter.total
+        limiter.total = 0
+
+    print(f'Tentativa {job["attempts"]}, {time.ctime()}')
+    try:
+        for _ in kinds[job['kind']](JobContext(job, limiter)):
+            update()
+            save_job(job)
+        job['status'] = DONE
+    except KeyboardInterrupt:
+        job['status'] = PENDING
+        print('Interrompida.')
+    except SystemExit as e:
+        # Erros dos scripts executados como tarefas, como parser.exit.
+        job['status'] = DONE if e.code in (0, None) else FAILED
+        job['error'] = None if job['status'] == DONE else f'Saída {e.code}'
+    except Exception as e:  # noqa: BLE001
+        traceback.print_exc()
+        job.update(status=FAILED, error=f'{type(e).__name__}: {e}')
+    finally:
+        update()
+        job['pid'] = None
+        if job['status'] != PENDING:
+            job['finished'] = time.time()
+        save_job(job)
+
+        data.set_io_hook(None)
+        sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+        log.close()
+
+
+class Scheduler:
+    """
+    Executa as tarefas da fila em processos separados, em ordem de prioridade e
+    de chegada, com um limite de tarefas simultâneas e de bytes por segundo.
+
+    O limite de bytes é dividido entre as tarefas simultâneas, e cada processo
+    tem prioridade menor no sistema, para que as tarefas não atrasem os alunos.
+
+    Parameters
+    ----------
+    kinds: Dict[:class:`str`, :data:`JobFunction`]
+        As funções de cada tipo de tarefa.
+    concurrency: :class:`int`
+        Quantidade máxima de tarefas simultâneas.
+    byte_rate: :class:`float`
+        Bytes lidos e escritos por segundo, somando todas as tarefas.
+    """
+
+    def __init__(
+        self, kinds: Dict[str, JobFunction], concurrency: int, byte_rate: float
+    ):
+        self.kinds = kinds
+        self.concurrency = concurrency
+        self.byte_rate = byte_rate
+
+        self.running: Dict[int, multiprocessing.Process] = {}
+
+    def recover(self):
+        """
+        Devolve à fila as tarefas de processos encerrados sem registrar o resultado,
+        como após uma queda do computador.
+        """
+        for job in get_jobs():
+            owner = _get_claim_owner(job['id'])
+            if (
+                job['status'] == RUNNING
+                and not (job['pid'] and is_process_running(job['pid']))
+                and not (owner and is_process_running(owner))
+            ):
+                self._requeue(job)
+
+    def _requeue(self, job: Dict[str, Any]):
+        if job['attempts'] >= MAX_ATTEMPTS:
+            job.update(status=FAILED, error='Processo encerrado', finished=time.time())
+        else:
+            job['status'] = PENDING
+        job['pid'] = None
+        save_job(job)
+
+    def _next_jobs(self) -> List[Dict[str, Any]]:
+        pending = [
+            job
+            for job in get_jobs()
+            if job['status'] == PENDING and job['id'] not in self.running
+        ]
+        return sorted(
+            pending, key=lambda job: (PRIORITIES.index(job['priority']), job['id'])
+        )
+
+    def _start(self, job: Dict[str, Any]) -> bool:
+        if not claim_job(job['id']):
+            return False
+
+        process = multiprocessing.Process(
+            target=run_job,
+            args=(job['id'], self.kinds, self.byte_rate / self.concurrency),
+            name=f'tarefa-{job["id"]}',
+        )
+        try:
+            process.start()
+        except BaseException:
+            release_job(job['id'])
+            raise
+        self.running[job['id']] = process
+
+        return True
+
+    def _reap(self, on_finish: Optional[Callable[[Dict[str, Any]], None]]):
+        for job_id, process in list(self.running.items()):
+            if process.is_alive():
+                continue
+
+            process.join()
+            del self.running[job_id]
+
+            job = get_job(job_id)
+            if job['status'] == RUNNING:
+                # O processo foi encerrado no meio de um passo.
+                self._requeue(job)
+            release_job(job_id)
+            if on_finish is not None:
+                on_finish(job)
+
+    def run(
+        self,
+        *,
+        follow: bool = False,
+        interval: float = 1.0,
+        on_finish: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        """
+        Executa as tarefas até a fila esvaziar.
+
+        Parameters
+        ----------
+        follow: :class:`bool`
+            Se verdadeiro, continua esperando novas tarefas.
+        interval: :class:`float`
+            Segundos entre as verificações da fila.
+        on_finish: Optional[Callable[[Dict[:class:`str`, Any]], None]]
+            Chamada com cada tarefa cujo processo terminou.
+        """
+        self.recover()
+
+        try:
+            while True:
+                self._reap(on_finish)
+
+                # Tarefas reservadas por outro escalonador são puladas.
+                pending = self._next_jobs()
+                for job in pending:
+                    if len(self.running) >= self.concurrency:
+                        break
+                    self._start(job)
+
+                if not self.running and not pending and not follow:
+                    break
+                time.sleep(interval)
+        finally:
+            # Com Ctrl+C, os processos das tarefas também o recebem e devolvem suas
+            # tarefas à fila.
+            for process in self.running.values():
+                process.join()
+            with contextlib.suppress(KeyboardInterrupt):
+                self._reap(on_finish)
@@ -1,5 +1,5 @@
-import random
 import hashlib
+import secrets
 
 
 def hash_password(password: str):
@@ -17,7 +17,9 @@ def hash_password(password: str):
         O hash da senha.
     """
 
-    salt = random.randbytes(8)
+    # "secrets" é usado pois o estado de "random" é copiado para processos filhos,
+    # o que geraria o mesmo salt em hashes feitos em paralelo.
+    salt = secrets.token_bytes(8)
 
     salted_pwd = password.encode() + salt
 
@@ -0,0 +1,325 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+import contextlib
+from typing import Any, Dict, List, Optional
+
+from . import data
+from .data import data_path, resolve_path, get_data_file, lock_data_file
+from .indexes import save_user_records
+from .utilities import is_process_running
+from .serialization import get_codec
+
+# Cada processo tem seu próprio diário, identificado pelo PID.
+JOURNAL_PREFIX = 'usuarios.'
+JOURNAL_SUFFIX = '.journal'
+
+
+class WriteBehindQueue:
+    """
+    Fila de escrita em segundo plano dos usuários.
+
+    :meth:`User.write` enfileira o registro e retorna imediatamente; uma thread
+    salva os arquivos depois. Escritas repetidas de um mesmo usuário antes do
+    salvamento são combinadas em uma só.
+
+    Antes de ser aceito, cada registro é adicionado a um diário ("journal"), que é
+    reaplicado por :meth:`recover` caso o processo termine antes de salvar.
+
+    Parameters
+    ----------
+    max_pending: :class:`int`
+        Quantidade de usuários pendentes que dispara um salvamento.
+    max_delay: :class:`float`
+        Tempo máximo, em segundos, que um registro fica pendente.
+    fsync: :class:`bool`
+        Se o diário deve ser sincronizado com o disco a cada registro. Sem isso, o
+        diário protege contra o fim do processo, mas não contra falhas do sistema.
+    """
+
+    def __init__(
+        self, max_pending: int = 100, max_delay: float = 1.0, *, fsync: bool = False
+    ):
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        self.fsync = fsync
+
+        # Caminho do arquivo -> nome de usuário -> registro.
+        self._pending: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._pending_count = 0
+        self._condition = threading.Condition()
+        # Impede dois salvamentos simultâneos (da thread e de um flush manual).
+        self._flush_lock = threading.Lock()
+        self._stopped = False
+
+        self._journal_path = resolve_path(
+            data_path(f'{JOURNAL_PREFIX}{os.getpid()}{JOURNAL_SUFFIX}')
+        )
+        self._journal = open(self._journal_path, 'ab')  # noqa: SIM115
+
+        self._thread = threading.Thread(
+            target=self._run, name='write-behind', daemon=True
+        )
+        self._thread.start()
+
+    def enqueue(self, path: str, username: str, record: Dict[str, Any]):
+        """
+        Registra no diário e enfileira o registro de um usuário.
+
+        Parameters
+        ----------
+        path: :class:`str`
+            O arquivo de usuários onde o registro deve ser salvo.
+        username: :class:`str`
+            O nome de usuário.
+        record: Dict[:class:`str`, Any]
+            Os dados do usuário.
+        """
+        codec = get_codec()
+        line = codec.dumps({'path': path, 'username': username, 'record': record})
+
+        with self._condition:
+            self._journal.write(line + b'\n')
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+
+            users = self._pending.setdefault(path, {})
+            if username not in users:
+                self._pending_count += 1
+            # Uma cópia é guardada, pois o registro ainda pode ser alterado.
+            users[username] = codec.loads(codec.dumps(record))
+
+            if self._pending_count >= self.max_pending:
+                self._condition.notify()
+
+    def get_pending(self, path: str, username: str) -> Optional[Dict[str, Any]]:
+        """
+        Retorna o registro pendente de um usuário, caso exista.
+        """
+        with self._condition:
+            record = self._pending.get(path, {}).get(username)
+            if record is None:
+                return None
+
+            codec = get_codec()
+            return codec.loads(codec.dumps(record))
+
+    def flush(self):
+        """
+        Salva todos os registros pendentes e limpa o diário.
+        """
+        with self._flush_lock:
+            with self._condition:
+                pending = self._pending
+                self._pending = {}
+                self._pending_count = 0
+
+                if not pending:
+                    return
+
+                # Os registros aceitos a partir daqui vão para um diário novo. O
+                # antigo só é apagado depois que os arquivos forem salvos.
+                self._journal.close()
+                flushing_path = f'{self._journal_path}.flushing'
+                _append_file(self._journal_path, flushing_path)
+                self._journal = open(self._journal_path, 'wb')  # noqa: SIM115
+
+            try:
+                for path, records in pending.items():
+                    save_user_records(path, records)
+            except Exception:
+                # Devolve à fila os registros que não foram substituídos por
+                # registros mais novos. Eles continuam no diário ".flushing".
+                with self._condition:
+                    for path, records in pending.items():
+                        users = self._pending.setdefault(path, {})
+                        for username, record in records.items():
+                            if username not in users:
+                                users[username] = record
+                                self._pending_count += 1
+                raise
+
+            os.remove(flushing_path)
+
+    def stop(self):
+        """
+        Salva os registros pendentes e encerra a thread.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+        self._thread.join()
+        self.flush()
+        self._journal.close()
+
+    def _run(self):
+        failing = False
+
+        while True:
+            with self._condition:
+                if failing:
+                    # Após uma falha, como um disco cheio, a thread espera o
+                    # intervalo inteiro, mesmo com a fila cheia, para não ocupar a
+                    # CPU com novas tentativas.
+                    deadline = time.monotonic() + self.max_delay
+                    while not self._stopped and time.monotonic() < deadline:
+                        self._condition.wait(deadline - time.monotonic())
+                elif not self._stopped and self._pending_count < self.max_pending:
+                    self._condition.wait(self.max_delay)
+                if self._stopped:
+                    return
+
+            try:
+                self.flush()
+            except Exception as e:  # noqa: BLE001
+                # Os registros voltaram para a fila e serão salvos na próxima vez.
+                # O erro é exibido uma vez a cada sequência de falhas.
+                if not failing:
+                    print(
+                        f'Erro ao salvar os usuários: {e}. '
+                        f'Tentando novamente a cada {self.max_delay}s.',
+                        file=sys.stderr,
+                    )
+                failing = True
+            else:
+                failing = False
+
+
+def _append_file(source: str, destination: str):
+    # Move o conteúdo de `source` para o final de `destination`. Um diário
+    # ".flushing" só existe aqui caso um salvamento anterior tenha falhado.
+    if not os.path.exists(destination):
+        os.replace(source, destination)
+        return
+
+    with open(source, 'rb') as src:
+        content = src.read()
+    with open(destination, 'ab') as dst:
+        dst.write(content)
+    os.remove(source)
+
+
+def _find_journals(directory: str) -> List[str]:
+    # Diários de processos que não estão mais em execução, em ordem de aplicação.
+    paths = []
+
+    for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else ():
+        if not name.startswith(JOURNAL_PREFIX) or JOURNAL_SUFFIX not in name:
+            continue
+
+        pid = name[len(JOURNAL_PREFIX) : name.index(JOURNAL_SUFFIX)]
+        if not pid.isdigit():
+            continue
+        # O diário deste processo é de um processo anterior com o mesmo PID.
+        if int(pid) != os.getpid() and is_process_running(int(pid)):
+            continue
+
+        # O diário ".flushing" é mais antigo, então vem primeiro.
+        base = f'{directory}/{JOURNAL_PREFIX}{pid}{JOURNAL_SUFFIX}'
+        for path in (f'{base}.flushing', base):
+            if path not in paths and os.path.exists(path):
+                paths.append(path)
+
+    return paths
+
+
+def recover() -> int:
+    """
+    Reaplica os registros dos diários que não chegaram a ser salvos.
+
+    Apenas os diários de processos que não estão mais em execução são reaplicados,
+    e depois apagados. O registro de um usuário só é reaplicado caso sua versão
+    seja maior que a salva.
+
+    Returns
+    -------
+    :class:`int`
+        A quantidade de registros reaplicados.
+    """
+    paths = _find_journals(resolve_path(data.DATA_DIR))
+    records: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    count = 0
+
+    for path in paths:
+        # Outro processo iniciado ao mesmo tempo pode ter reaplicado o diário.
+        with contextlib.suppress(FileNotFoundError), open(path, 'rb') as file:
+            for line in file:
+                try:
+                    entry = get_codec().loads(line)
+                except json.JSONDecodeError:
+                    # Uma linha incompleta só pode ser a última, que não foi aceita.
+                    break
+                users = records.setdefault(entry['path'], {})
+                users[entry['username']] = entry['record']
+
+    for path, users_records in records.items():
+        # Um registro só é reaplicado se for mais novo que o salvo, pois o usuário
+        # pode ter sido alterado por outro processo depois do diário.
+        with lock_data_file(path):
+            users = get_data_file(path)
+            newer = {
+                username: record
+                for username, record in users_records.items()
+                if username not in users
+                or record.get('version', 0) > users[username].get('version', 0)
+            }
+            if newer:
+                save_user_records(path, newer)
+                count += len(newer)
+
+    for path in paths:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+    return count
+
+
+_queue: Optional[WriteBehindQueue] = None
+
+
+def get_write_behind() -> Optional[WriteBehindQueue]:
+    """
+    Retorna a fila de escrita em segundo plano, caso esteja ativada.
+    """
+    return _queue
+
+
+def enable_write_behind(
+    max_pending: int = 100, max_delay: float = 1.0, *, fsync: bool = False
+) -> WriteBehindQueue:
+    """
+    Ativa a escrita em segundo plano dos usuários neste processo.
+
+    Os diários de execuções anteriores que foram interrompidas são reaplicados
+    antes, e os registros pendentes são salvos quando o interpretador é encerrado.
+
+    Returns
+    -------
+    :class:`WriteBehindQueue`
+        A fila criada.
+    """
+    global _queue
+
+    if _queue is None:
+        recover()
+        _queue = WriteBehindQueue(max_pending, max_delay, fsync=fsync)
+        atexit.register(disable_write_behind)
+
+    return _queue
+
+
+def disable_write_behind():
+    """
+    Salva os registros pendentes e desativa a escrita em segundo plano.
+    """
+    global _queue
+
+    if _queue is not None:
+        queue = _queue
+        _queue = None
+        queue.stop()
@@ -0,0 +1,141 @@
+import os
+import json
+import importlib.util
+from typing import Any, Dict, Union, Optional
+
+# Variável de ambiente que força um codec específico, como "json".
+CODEC_VARIABLE = 'PIM_JSON_CODEC'
+
+
+class Codec:
+    """
+    Converte os dados dos arquivos para JSON e vice-versa.
+
+    Todos os codecs produzem JSON em UTF-8, sem escapar caracteres não ASCII, e
+    leem os arquivos escritos por qualquer outro codec.
+
+    Attributes
+    ----------
+    name: :class:`str`
+        O nome do codec.
+    module: Optional[:class:`str`]
+        A biblioteca opcional da qual o codec depende.
+    """
+
+    name = 'json'
+    module: Optional[str] = None
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        """
+        Decodifica um documento JSON.
+
+        Raises
+        ------
+        json.JSONDecodeError
+            O documento não é um JSON válido.
+        """
+        return json.loads(data)
+
+    def dumps(self, obj: Any, *, pretty: bool = False) -> bytes:
+        """
+        Codifica um objeto em JSON.
+
+        Parameters
+        ----------
+        obj: Any
+            O objeto a ser codificado.
+        pretty: :class:`bool`
+            Se o JSON deve ser indentado com 2 espaços, para arquivos editados à
+            mão. Caso contrário, é gerado sem espaços.
+        """
+        if pretty:
+            return json.dumps(obj, ensure_ascii=False, indent=2).encode()
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+class OrjsonCodec(Codec):
+    name = 'orjson'
+    module = 'orjson'
+
+    def __init__(self):
+        import orjson
+
+        self._orjson = orjson
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        # orjson.JSONDecodeError é uma subclasse de json.JSONDecodeError.
+        return self._orjson.loads(data)
+
+    def dumps(self, obj: Any, *, pretty: bool = False) -> bytes:
+        return self._orjson.dumps(
+            obj, option=self._orjson.OPT_INDENT_2 if pretty else 0
+        )
+
+
+class MsgspecCodec(Codec):
+    name = 'msgspec'
+    module = 'msgspec'
+
+    def __init__(self):
+        import msgspec
+
+        self._msgspec = msgspec
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        try:
+            return self._decoder.decode(data)
+        except self._msgspec.DecodeError as e:
+            raise json.JSONDecodeError(str(e), '', 0) from e
+
+    def dumps(self, obj: Any, *, pretty: bool = False) -> bytes:
+        data = self._encoder.encode(obj)
+        return self._msgspec.json.format(data, indent=2) if pretty else data
+
+
+# Em ordem de preferência. O codec da biblioteca padrão está sempre disponível.
+CODECS = (OrjsonCodec, MsgspecCodec, Codec)
+
+_codec: Optional[Codec] = None
+
+
+def get_available_codecs() -> Dict[str, Codec]:
+    """
+    Retorna os codecs cujas bibliotecas estão instaladas, em ordem de preferência.
+    """
+    return {
+        cls.name: cls()
+        for cls in CODECS
+        if cls.module is None or importlib.util.find_spec(cls.module) is not None
+    }
+
+
+def get_codec() -> Codec:
+    """
+    Retorna o codec usado nos arquivos de dados.
+
+    É o primeiro codec disponível de :data:`CODECS`, a menos que outro seja
+    escolhido pela variável de ambiente ``PIM_JSON_CODEC``.
+
+    Raises
+    ------
+    ValueError
+        O codec escolhido não existe ou não está instalado.
+    """
+    global _codec
+
+    if _codec is None:
+        codecs = get_available_codecs()
+        name = os.environ.get(CODEC_VARIABLE)
+
+        if name is None:
+            _codec = next(iter(codecs.values()))
+        elif name in codecs:
+            _codec = codecs[name]
+        else:
+            raise ValueError(
+                f'Codec "{name}" indisponível. Opções: {", ".join(codecs)}.'
+            )
+
+    return _codec
@@ -0,0 +1,190 @@
+import os
+import hmac
+import time
+import base64
+import hashlib
+import secrets
+import contextlib
+from typing import Dict, Tuple, Optional
+from collections import OrderedDict
+
+from .data import (
+    data_path,
+    resolve_path,
+    get_data_file,
+    get_user_file,
+    get_generation,
+    lock_data_file,
+    save_data_file,
+)
+from .changelog import record_changes
+
+# Chave secreta usada para assinar os tokens, na pasta de dados.
+SECRET_FILE = 'chave_sessao.bin'  # noqa: S105
+# Época de sessão de cada usuário, em cada partição.
+EPOCHS_FILE = 'sessoes.json'
+# Arquivo do token no computador do aluno. Pode ser alterado por PIM_SESSION_FILE.
+SESSION_FILE = os.path.join(os.path.expanduser('~'), '.pim_sessao')
+
+# Validade padrão de um token, em segundos.
+SESSION_TTL = 30 * 24 * 3600
+# Quantidade máxima de tokens verificados mantidos em memória.
+CACHE_SIZE = 1024
+
+_secret: Optional[bytes] = None
+# Token -> (nome de usuário, expiração, época), já com a assinatura verificada.
+_token_cache: 'OrderedDict[str, Tuple[str, int, int]]' = OrderedDict()
+# Arquivo de épocas -> (geração, épocas), para não relê-lo a cada verificação.
+_epochs_cache: Dict[str, Tuple[int, Dict[str, int]]] = {}
+
+
+def _get_secret() -> bytes:
+    global _secret
+
+    if _secret is None:
+        path = resolve_path(data_path(SECRET_FILE))
+        try:
+            # A chave é criada apenas uma vez, mesmo com processos simultâneos.
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass
+        else:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(secrets.token_bytes(32))
+
+        with open(path, 'rb') as file:
+            _secret = file.read()
+
+    return _secret
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(_get_secret(), payload.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip('=')
+
+
+def get_epoch(username: str) -> int:
+    """
+    Retorna a época de sessão de um usuário, que invalida os tokens antigos ao
+    ser incrementada.
+    """
+    path = get_user_file(EPOCHS_FILE, username)
+    generation = get_generation(path)
+
+    cached = _epochs_cache.get(path)
+    if cached is None or cached[0] != generation:
+        cached = _epochs_cache[path] = (generation, get_data_file(path))
+
+    return cached[1].get(username, 0)
+
+
+def revoke_sessions(username: str):
+    """
+    Invalida todos os tokens de sessão emitidos para um usuário.
+    """
+    path = get_user_file(EPOCHS_FILE, username)
+
+    with lock_data_file(path):
+        epochs = get_data_file(path)
+        epochs[username] = epochs.get(username, 0) + 1
+
+        generation = save_data_file(path, epochs)
+        record_changes(path, generation, {username: epochs[username]})
+
+
+def create_token(username: str, ttl: int = SESSION_TTL) -> str:
+    """
+    Cria um token de sessão assinado para um usuário.
+
+    O token contém o nome de usuário, a expiração e a época de sessão atual do
+    usuário, seguidos de uma assinatura HMAC-SHA256 com a chave secreta.
+
+    Parameters
+    ----------
+    username: :class:`str`
+        O nome de usuário.
+    ttl: :class:`int`
+        A validade do token, em segundos.
+
+    Returns
+    -------
+    :class:`str`
+        O token.
+    """
+    payload = f'{username}:{int(time.time()) + ttl}:{get_epoch(username)}'
+    return f'{payload}:{_sign(payload)}'
+
+
+def verify_token(token: str) -> Optional[str]:
+    """
+    Verifica um token de sessão.
+
+    A assinatura de um token só é calculada na primeira verificação; as seguintes
+    consultam apenas o cache e a época do usuário. O arquivo de senhas não é lido.
+
+    Parameters
+    ----------
+    token: :class:`str`
+        O token, como retornado por :func:`create_token`.
+
+    Returns
+    -------
+    :class:`str`
+        O nome de usuário do token.
+    :class:`None`
+        Caso o token seja inválido, tenha expirado ou tenha sido revogado.
+    """
+    entry = _token_cache.get(token)
+
+    if entry is None:
+        payload, _, signature = token.rpartition(':')
+        # Comparados como bytes, pois compare_digest não aceita textos não ASCII.
+        if not hmac.compare_digest(signature.encode(), _sign(payload).encode()):
+            return None
+
+        username, expiry, epoch = payload.rsplit(':', 2)
+        entry = (username, int(expiry), int(epoch))
+
+        _token_cache[token] = entry
+        if len(_token_cache) > CACHE_SIZE:
+            _token_cache.popitem(last=False)
+    else:
+        _token_cache.move_to_end(token)
+
+    username, expiry, epoch = entry
+    if expiry < time.time() or epoch != get_epoch(username):
+        return None
+
+    return username
+
+
+def get_session_file() -> str:
+    return os.environ.get('PIM_SESSION_FILE', SESSION_FILE)
+
+
+def load_session_token() -> Optional[str]:
+    """
+    Retorna o token salvo neste computador, caso exista.
+    """
+    try:
+        with open(get_session_file(), 'r', encoding='utf-8') as file:
+            return file.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def save_session_token(token: str):
+    """
+    Salva o token neste computador, legível apenas pelo usuário do sistema.
+    """
+    fd = os.open(get_session_file(), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as file:
+        file.write(token)
+
+
+def clear_session_token():
+    """
+    Apaga o token salvo neste computador.
+    """
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(get_session_file())
@@ -0,0 +1,285 @@
+import os
+import time
+import shutil
+import secrets
+import contextlib
+from typing import Dict, List
+
+from . import data
+from .data import resolve_path, get_generation, lock_data_files
+from .utilities import is_process_running
+from .serialization import get_codec
+
+# Pasta das cópias, dentro da pasta de dados.
+SNAPSHOT_DIR = 'snapshots'
+
+# Pastas da pasta de dados que não entram nas cópias.
+SKIPPED_DIRS = frozenset({SNAPSHOT_DIR, 'indices', 'tarefas'})
+
+# Arquivo da cópia com a geração de cada arquivo de dados copiado.
+MANIFEST_FILE = 'geracoes.snapshot'
+
+# Tentativas de copiar sem nenhuma escrita no meio antes de travar os arquivos.
+SNAPSHOT_ATTEMPTS = 5
+
+# Cópias marcadas para remoção há mais tempo que isso são de uma coleta interrompida.
+STALE_DELETE_AGE = 3600
+
+
+def _snapshots_root() -> str:
+    return resolve_path(f'{data.DATA_DIR}/{SNAPSHOT_DIR}')
+
+
+def _list_snapshots() -> List[int]:
+    try:
+        names = os.listdir(_snapshots_root())
+    except FileNotFoundError:
+        return []
+
+    return sorted(int(name) for name in names if name.isdigit())
+
+
+def _pins(snapshot_id: int) -> List[str]:
+    root = _snapshots_root()
+    prefix = f'{snapshot_id}.'
+    return [
+        f'{root}/{name}'
+        for name in os.listdir(root)
+        if name.startswith(prefix) and name.endswith('.pin')
+    ]
+
+
+def _is_pin_alive(pin_path: str) -> bool:
+    # Nome do arquivo: <cópia>.<pid>.<aleatório>.pin
+    pid = int(os.path.basename(pin_path).split('.')[1])
+    return is_process_running(pid)
+
+
+class Snapshot:
+    """
+    Uma cópia fixa dos arquivos de dados, marcada como em uso enquanto estiver
+    aberta.
+
+    Os arquivos da cópia são links para as versões dos arquivos de dados no momento
+    da cópia. Como os arquivos de dados são sempre substituídos, e nunca alterados,
+    as escritas seguintes não mudam a cópia e não esperam pelos leitores.
+
+    Parameters
+    ----------
+    snapshot_id: :class:`int`
+        O número da cópia, crescente.
+    pin_path: :class:`str`
+        O arquivo que marca a cópia como em uso.
+    """
+
+    def __init__(self, snapshot_id: int, pin_path: str):
+        self.id = snapshot_id
+        self.root = f'{_snapshots_root()}/{snapshot_id}'
+        self._pin_path = pin_path
+
+    def path(self, path: str) -> str:
+        """
+        Retorna o caminho de um arquivo de dados dentro da cópia.
+
+        Parameters
+        ----------
+        path: :class:`str`
+            O caminho do arquivo na pasta de dados, como retornado por
+            :func:`modules.data.data_path` ou :func:`modules.data.get_shard_files`.
+
+        Returns
+        -------
+        :class:`str`
+            O caminho do arquivo na cópia.
+        """
+        relative = os.path.relpath(resolve_path(path), resolve_path(data.DATA_DIR))
+        return f'{self.root}/{relative}'
+
+    def get_generations(self) -> Dict[str, int]:
+        """
+        Retorna a geração de cada arquivo da cópia, pelo caminho relativo à pasta
+        de dados, separado por "/". Veja :func:`modules.data.get_generation`.
+        """
+        with open(f'{self.root}/{MANIFEST_FILE}', 'rb') as file:
+            return get_codec().loads(file.read())
+
+    def release(self):
+        """
+        Libera a cópia e remove as cópias que não estão mais em uso.
+        """
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self._pin_path)
+
+        collect_snapshots()
+
+    def __enter__(self) -> 'Snapshot':
+        return self
+
+    def __exit__(self, *_):
+        self.release()
+
+
+def create_snapshot() -> int:
+    """
+    Cria uma cópia dos arquivos JSON da pasta de dados usando links.
+
+    As gerações dos arquivos são lidas antes e depois de ligá-los, e a cópia é
+    refeita caso alguma tenha mudado, então a cópia mostra todos os arquivos em um
+    mesmo instante. Após :data:`SNAPSHOT_ATTEMPTS` tentativas, os arquivos são
+    travados enquanto são ligados, o que faz as escritas esperarem por alguns
+    milissegundos. As gerações ficam em :data:`MANIFEST_FILE`; veja
+    :meth:`Snapshot.get_generations`.
+
+    Returns
+    -------
+    :class:`int`
+        O número da cópia, maior que o de todas as anteriores.
+    """
+    data_dir = resolve_path(data.DATA_DIR)
+    root = _snapshots_root()
+    os.makedirs(root, exist_ok=True)
+
+    # A cópia é montada em uma pasta temporária e publicada com uma renomeação.
+    for _ in range(SNAPSHOT_ATTEMPTS):
+        building = f'{root}/{os.getpid()}.{secrets.token_hex(4)}.building'
+        generations = _link_files(data_dir, building)
+        if _read_generations(data_dir) == generations:
+            break
+
+        shutil.rmtree(building, ignore_errors=True)
+    else:
+        paths = [f'{data_dir}/{relative}' for relative in _read_generations(data_dir)]
+        with lock_data_files(paths):
+            building = f'{root}/{os.getpid()}.{secrets.token_hex(4)}.building'
+            generations = _link_files(data_dir, building)
+
+    with open(f'{building}/{MANIFEST_FILE}', 'wb') as file:
+        file.write(get_codec().dumps(generations))
+
+    snapshot_id = max(_list_snapshots(), default=0) + 1
+    while not _publish(building, f'{root}/{snapshot_id}'):
+        snapshot_id += 1
+
+    return snapshot_id
+
+
+def _read_generations(data_dir: str) -> Dict[str, int]:
+    # Caminho relativo de cada arquivo JSON -> geração.
+    generations = {}
+    for dirpath, dirnames, filenames in os.walk(data_dir):
+        dirnames[:] = [name for name in dirnames if name not in SKIPPED_DIRS]
+
+        relative = os.path.relpath(dirpath, data_dir).replace(os.sep, '/')
+        for name in filenames:
+            if name.endswith('.json'):
+                path = name if relative == '.' else f'{relative}/{name}'
+                generations[path] = get_generation(f'{dirpath}/{name}')
+
+    return generations
+
+
+def _link_files(data_dir: str, building: str) -> Dict[str, int]:
+    # Liga os arquivos na pasta da cópia e retorna as gerações lidas antes disso.
+    os.mkdir(building)
+
+    generations = _read_generations(data_dir)
+    for relative in generations:
+        target = f'{building}/{relative}'
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        _link_file(f'{data_dir}/{relative}', target)
+
+    return generations
+
+
+def _link_file(source: str, target: str):
+    try:
+        os.link(source, target)
+    except FileNotFoundError:
+        # O arquivo foi removido durante a cópia.
+        pass
+    except OSError:
+        # Sistemas de arquivos sem links recebem uma cópia comum.
+        shutil.copyfile(source, target)
+
+
+def _publish(building: str, path: str) -> bool:
+    try:
+        os.rename(building, path)
+    except OSError:
+        # Outro processo publicou uma cópia com o mesmo número.
+        if not os.path.isdir(building) or not os.path.isdir(path):
+            raise
+        return False
+
+    return True
+
+
+def open_snapshot() -> Snapshot:
+    """
+    Cria uma cópia dos arquivos de dados e a marca como em uso.
+
+    A cópia continua existindo até :meth:`Snapshot.release`, mesmo que outras mais
+    novas sejam criadas.
+
+    Returns
+    -------
+    :class:`Snapshot`
+        A cópia, que pode ser usada com ``with``.
+    """
+    root = _snapshots_root()
+
+    while True:
+        snapshot_id = create_snapshot()
+
+        pin_path = f'{root}/{snapshot_id}.{os.getpid()}.{secrets.token_hex(4)}.pin'
+        with open(pin_path, 'wb'):
+            pass
+
+        # Caso a cópia tenha sido removida antes da marcação, outra é criada.
+        # Veja :func:`collect_snapshots`.
+        if os.path.isdir(f'{root}/{snapshot_id}'):
+            return Snapshot(snapshot_id, pin_path)
+
+        os.remove(pin_path)
+
+
+def collect_snapshots():
+    """
+    Remove as cópias que não estão em uso por nenhum processo em execução.
+
+    Uma cópia é primeiro renomeada e só então suas marcações são conferidas. Assim,
+    um leitor que a marcou antes da renomeação é visto aqui, e um que a marcou
+    depois vê que ela não existe mais e cria outra.
+    """
+    root = _snapshots_root()
+
+    for snapshot_id in _list_snapshots():
+        pins = _pins(snapshot_id)
+        for pin in pins:
+            if not _is_pin_alive(pin):
+                # A marcação é de um processo que foi encerrado sem liberá-la.
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(pin)
+        if any(os.path.exists(pin) for pin in pins):
+            continue
+
+        deleting = f'{root}/{snapshot_id}.{os.getpid()}.deleting'
+        try:
+            os.rename(f'{root}/{snapshot_id}', deleting)
+        except FileNotFoundError:
+            continue
+
+        if _pins(snapshot_id):
+            os.rename(deleting, f'{root}/{snapshot_id}')
+            continue
+
+        shutil.rmtree(deleting, ignore_errors=True)
+
+    # Sobras de processos encerrados no meio da criação ou da remoção.
+    now = time.time()
+    for name in os.listdir(root) if os.path.isdir(root) else ():
+        path = f'{root}/{name}'
+        if name.endswith(('.building', '.deleting')) and (
+            now - os.path.getmtime(path) > STALE_DELETE_AGE
+        ):
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,347 @@
+import time
+import threading
+from typing import Dict, List, Tuple, Optional
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from .data import (
+    get_data_file,
+    get_user_file,
+    get_generation,
+    lock_data_file,
+    save_data_file,
+    get_shard_files,
+)
+
+# Origem das tentativas de login quando o programa é usado no próprio computador.
+LOCAL_SOURCE = 'local'
+
+# Origem da sessão atual, como o endereço do aluno conectado ao supervisor.
+current_source: ContextVar[str] = ContextVar('current_source', default=LOCAL_SOURCE)
+
+
+@dataclass
+class _Bucket:
+    __slots__ = ('blocked_until', 'penalties', 'tokens', 'updated')
+    tokens: float
+    updated: float
+    # Quantas falhas aconteceram com o balde vazio, para o recuo exponencial.
+    penalties: int
+    blocked_until: float
+
+
+class Throttle:
+    """
+    Limita falhas por chave com baldes de fichas e recuo exponencial.
+
+    Cada falha consome uma ficha, e as fichas são repostas com o tempo. Com o
+    balde vazio, cada nova falha bloqueia a chave por um tempo que dobra a cada
+    falha, até `max_delay`. Nenhum método espera: o tempo restante de bloqueio é
+    retornado para quem chamou decidir o que fazer.
+
+    As chaves ficam em um LRU limitado a `max_entries`, então uma enxurrada de
+    chaves diferentes não aumenta o uso de memória. Chaves bloqueadas ou em recuo
+    não são descartadas pelo LRU; caso as mais antigas estejam todas assim, as
+    chaves novas dividem um mesmo balde até que alguma possa ser descartada.
+
+    Parameters
+    ----------
+    capacity: :class:`int`
+        Falhas permitidas em sequência antes do primeiro bloqueio.
+    refill_rate: :class:`float`
+        Fichas repostas por segundo.
+    base_delay: :class:`float`
+        Bloqueio após a primeira falha com o balde vazio, em segundos.
+    max_delay: :class:`float`
+        Bloqueio máximo, em segundos.
+    max_entries: :class:`int`
+        Quantidade máxima de chaves guardadas.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 5,
+        refill_rate: float = 1 / 60,
+        base_delay: float = 1.0,
+        max_delay: float = 900.0,
+        max_entries: int = 10_000,
+    ):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_entries = max_entries
+
+        self._buckets: 'OrderedDict[str, _Bucket]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    # Chaves mais antigas examinadas ao procurar uma que possa ser descartada.
+    EVICTION_SCAN = 32
+    # Chave do balde compartilhado pelas chaves novas quando o LRU está cheio.
+    OVERFLOW_KEY = '\0'
+
+    def _refill(self, bucket: _Bucket, now: float):
+        bucket.tokens = min(
+            self.capacity, bucket.tokens + (now - bucket.updated) * self.refill_rate
+        )
+        bucket.updated = now
+
+        # Com o balde cheio de novo, o recuo recomeça do início.
+        if bucket.tokens >= self.capacity:
+            bucket.penalties = 0
+
+    def check(self, key: str, now: Optional[float] = None) -> float:
+        """
+        Retorna quantos segundos faltam para a chave poder tentar de novo.
+
+        Parameters
+        ----------
+        key: :class:`str`
+            A chave, como um nome de usuário.
+        now: Optional[:class:`float`]
+            O horário atual de :func:`time.monotonic`.
+
+        Returns
+        -------
+        :class:`float`
+            O tempo restante de bloqueio, ou 0 caso a chave não esteja bloqueada.
+        """
+        now = time.monotonic() if now is None else now
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None and len(self._buckets) >= self.max_entries:
+                bucket = self._buckets.get(self.OVERFLOW_KEY)
+            if bucket is None:
+                return 0.0
+
+            return max(bucket.blocked_until - now, 0.0)
+
+    def record_failure(self, key: str, now: Optional[float] = None) -> float:
+        """
+        Registra uma falha da chave.
+
+        Returns
+        -------
+        :class:`float`
+            O tempo de bloqueio causado pela falha, ou 0 caso ainda haja fichas.
+        """
+        now = time.monotonic() if now is None else now
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None and not self._make_room(now):
+                key = self.OVERFLOW_KEY
+                bucket = self._buckets.get(key)
+
+            if bucket is None:
+                bucket = self._buckets[key] = _Bucket(self.capacity, now, 0, 0.0)
+            else:
+                self._buckets.move_to_end(key)
+                self._refill(bucket, now)
+
+            return self._consume(bucket, now)
+
+    def _make_room(self, now: float) -> bool:
+        # Descarta a chave mais antiga que não esteja bloqueada nem em recuo. As
+        # que estão vão para o fim da fila, para não serem examinadas de novo logo.
+        if len(self._buckets) < self.max_entries:
+            return True
+
+        for _ in range(min(self.EVICTION_SCAN, len(self._buckets))):
+            key, bucket = next(iter(self._buckets.items()))
+            self._refill(bucket, now)
+            if key != self.OVERFLOW_KEY and (
+                bucket.penalties == 0 and bucket.blocked_until <= now
+            ):
+                del self._buckets[key]
+                return True
+            self._buckets.move_to_end(key)
+
+        return False
+
+    def _consume(self, bucket: _Bucket, now: float) -> float:
+        # Consome uma ficha ou, com o balde vazio, bloqueia com recuo exponencial.
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return 0.0
+
+        bucket.penalties += 1
+        delay = min(self.base_delay * 2 ** (bucket.penalties - 1), self.max_delay)
+        bucket.blocked_until = now + delay
+
+        return delay
+
+    def reset(self, key: str):
+        """
+        Remove a chave, como após um login bem-sucedido.
+        """
+        with self._lock:
+            self._buckets.pop(key, None)
+
+
+class StoredThrottle(Throttle):
+    """
+    :class:`Throttle` cujos baldes ficam em um arquivo de dados particionado, como
+    os usuários, e valem para todos os processos e reinícios.
+
+    Cada falha trava a partição da chave com :func:`lock_data_file` enquanto o
+    balde é atualizado. As verificações leem o arquivo apenas quando sua geração
+    muda. Os baldes cheios e sem bloqueio são removidos do arquivo, então ele só
+    guarda as chaves com falhas recentes. O horário usado é o de
+    :func:`time.time`, comum a todos os processos.
+
+    Parameters
+    ----------
+    name: :class:`str`
+        O nome do arquivo em cada partição.
+    **kwargs
+        Os limites, como em :class:`Throttle`.
+    """
+
+    def __init__(self, name: str, **kwargs):
+        super().__init__(**kwargs)
+        self.name = name
+        # Arquivo -> (geração, baldes), para não relê-lo a cada verificação.
+        self._cache: Dict[str, Tuple[int, Dict[str, List[float]]]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(get_data_file(path)) for path in get_shard_files(self.name))
+
+    def _read(self, path: str) -> Dict[str, List[float]]:
+        generation = get_generation(path)
+        cached = self._cache.get(path)
+        if cached is None or cached[0] != generation:
+            cached = self._cache[path] = (generation, get_data_file(path))
+        return cached[1]
+
+    def check(self, key: str, now: Optional[float] = None) -> float:
+        now = time.time() if now is None else now
+
+        entry = self._read(get_user_file(self.name, key)).get(key)
+        if entry is None:
+            return 0.0
+
+        return max(_Bucket(*entry).blocked_until - now, 0.0)
+
+    def record_failure(self, key: str, now: Optional[float] = None) -> float:
+        now = time.time() if now is None else now
+        path = get_user_file(self.name, key)
+
+        with lock_data_file(path):
+            buckets = get_data_file(path)
+
+            entry = buckets.get(key)
+            bucket = _Bucket(*entry) if entry else _Bucket(self.capacity, now, 0, 0.0)
+            self._refill(bucket, now)
+            delay = self._consume(bucket, now)
+
+            buckets[key] = [
+                bucket.tokens,
+                bucket.updated,
+                bucket.penalties,
+                bucket.blocked_until,
+            ]
+            self._prune(buckets, now)
+            save_data_file(path, buckets)
+
+        return delay
+
+    def _prune(self, buckets: Dict[str, List[float]], now: float):
+        for key, entry in list(buckets.items()):
+            bucket = _Bucket(*entry)
+            self._refill(bucket, now)
+            if bucket.tokens >= self.capacity and bucket.blocked_until <= now:
+                del buckets[key]
+
+    def reset(self, key: str):
+        path = get_user_file(self.name, key)
+        # A maioria dos logins não tem falhas, e o arquivo não precisa ser salvo.
+        if key not in self._read(path):
+            return
+
+        with lock_data_file(path):
+            buckets = get_data_file(path)
+            if buckets.pop(key, None) is not None:
+                save_data_file(path, buckets)
+
+
+# Arquivo dos baldes das contas existentes, em cada partição.
+ATTEMPTS_FILE = 'tentativas.json'
+
+# Falhas de login por conta existente, por nome de usuário inexistente e por
+# origem. As contas existentes ficam no disco, para que reconectar ou trocar de
+# processo não libere as tentativas. A origem tem mais fichas, pois vários alunos
+# podem compartilhar o mesmo endereço.
+stored_account_throttle = StoredThrottle(ATTEMPTS_FILE, capacity=5)
+account_throttle = Throttle(capacity=5)
+source_throttle = Throttle(capacity=20, refill_rate=1 / 6)
+
+
+def check_login(username: str, source: Optional[str] = None) -> float:
+    """
+    Retorna quantos segundos faltam para poder tentar o login.
+
+    Parameters
+    ----------
+    username: :class:`str`
+        O nome de usuário digitado.
+    source: Optional[:class:`str`]
+        A origem da tentativa. Por padrão, a de :data:`current_source`.
+
+    Returns
+    -------
+    :class:`float`
+        O tempo restante de bloqueio, ou 0 caso o login possa ser tentado.
+    """
+    source = current_source.get() if source is None else source
+    return max(
+        stored_account_throttle.check(username),
+        account_throttle.check(username),
+        source_throttle.check(source),
+    )
+
+
+def record_login_failure(
+    username: str, source: Optional[str] = None, *, exists: bool = True
+) -> float:
+    """
+    Registra um login que falhou, por usuário inexistente ou senha incorreta.
+
+    Parameters
+    ----------
+    username: :class:`str`
+        O nome de usuário digitado.
+    source: Optional[:class:`str`]
+        A origem da tentativa. Por padrão, a de :data:`current_source`.
+    exists: :class:`bool`
+        Se a conta existe. As falhas de contas existentes são salvas no disco; as
+        de nomes inexistentes ficam apenas em memória, para que nomes aleatórios
+        não aumentem os arquivos.
+
+    Returns
+    -------
+    :class:`float`
+        O tempo de bloqueio causado pela falha, ou 0 caso ainda haja tentativas.
+    """
+    source = current_source.get() if source is None else source
+    throttle = stored_account_throttle if exists else account_throttle
+    return max(
+        throttle.record_failure(username),
+        source_throttle.record_failure(source),
+    )
+
+
+def record_login_success(username: str):
+    """
+    Registra um login bem-sucedido, liberando as tentativas do usuário.
+
+    As falhas da origem são mantidas, para que uma conta válida não sirva para
+    liberar as tentativas contra as demais.
+    """
+    stored_account_throttle.reset(username)
+    account_throttle.reset(username)
@@ -1,20 +1,35 @@
 import re
 import sys
-import time
-from typing import Optional, MutableMapping
+import math
+from typing import Any, Dict, Optional, MutableMapping
 from getpass import getpass
 from functools import cached_property
 
-from .data import get_data_file, save_data_file
-from .courses import Course
+from .data import (
+    get_data_file,
+    get_user_file,
+    get_generation,
+    lock_data_file,
+    save_data_file,
+)
+from .courses import Course, get_course
+from .indexes import save_user_records
+from .sessions import revoke_sessions
+from .throttle import check_login, record_login_failure, record_login_success
+from .changelog import record_changes
 from .passwords import hash_password, check_password
 from .utilities import get_choice, print_menu
+from .persistence import get_write_behind
 
 USER_REGEX = re.compile(r'^(?=[\w\-.]+$)[^-_.].*[^-_.]$')
 NAME_REGEX = re.compile(r'^[A-Za-zÀ-ž ]{3,}$')
+MIN_AGE = 14
 
 
 class User:
+    # Atributos que não são salvos no disco.
+    _TRANSIENT = frozenset({'course', '_generation'})
+
     def __init__(
         self,
         full_name: str,
@@ -25,6 +40,8 @@ class User:
         course_id: Optional[str] = None,
         current_lesson: Optional[MutableMapping[str, str]] = None,
         grades: Optional[MutableMapping[str, float]] = None,
+        attempts: Optional[MutableMapping[str, Dict[str, Any]]] = None,
+        version: int = 0,
     ):
         self.age = age
         self.username = username
@@ -36,6 +53,13 @@ class User:
         self.current_lesson: MutableMapping[str, str] = (
             current_lesson if current_lesson else {}
         )
+        self.attempts: MutableMapping[str, Dict[str, Any]] = (
+            attempts if attempts else {}
+        )
+        # Incrementada a cada escrita do usuário.
+        self.version = version
+        # Geração do arquivo de usuários na última leitura ou escrita deste usuário.
+        self._generation: Optional[int] = None
 
     def __eq__(self, other):
         if not isinstance(other, User):
@@ -64,10 +88,7 @@ class User:
         if self.course_id is None:
             return None
 
-        courses = get_data_file('data/cursos.json')
-        course = courses[self.course_id]
-
-        return Course.from_dict(course)
+        return get_course(self.course_id)
 
     @classmethod
     def find(cls, username: str) -> Optional['User']:
@@ -86,20 +107,42 @@ class User:
         :class:`None`
             Caso o usuário não seja encontrado.
         """
-        users = get_data_file('data/usuarios.json')
+        path = get_user_file('usuarios.json', username)
+
+        queue = get_write_behind()
+        pending = queue.get_pending(path, username) if queue is not None else None
+        if pending is not None:
+            return cls(**pending)
+
+        # A geração é lida antes dos dados, assim uma escrita concorrente no máximo
+        # causa uma releitura desnecessária em :meth:`update`.
+        generation = get_generation(path)
+        users = get_data_file(path)
         user = users.get(username)
 
         if user is None:
             return None
 
-        return cls(**user)
+        user = cls(**user)
+        user._generation = generation
+
+        return user
 
     def _set_password(self, new_password: str):
-        logins = get_data_file('data/logins.json')
+        path = get_user_file('logins.json', self.username)
+        password_hash = hash_password(new_password)
+
+        # A partição é travada da leitura até o registro, para que cadastros
+        # simultâneos em outros processos não sobrescrevam este login.
+        with lock_data_file(path):
+            logins = get_data_file(path)
+            logins[self.username] = password_hash
 
-        logins[self.username] = hash_password(new_password)
+            generation = save_data_file(path, logins)
+            record_changes(path, generation, {self.username: password_hash})
 
-        save_data_file('data/logins.json', logins)
+        # Os tokens de sessão emitidos com a senha anterior deixam de valer.
+        revoke_sessions(self.username)
 
     def check_password(self, password: str) -> bool:
         """
@@ -115,7 +158,7 @@ class User:
         :class:`bool`
             Se a senha é igual à armazenada.
         """
-        logins = get_data_file('data/logins.json')
+        logins = get_data_file(get_user_file('logins.json', self.username))
         user_password = logins.get(self.username)
 
         if user_password is None:
@@ -123,27 +166,119 @@ class User:
 
         return check_password(user_password, password)
 
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Retorna os dados do usuário no formato em que são salvos no disco.
+
+        Returns
+        -------
+        Dict[:class:`str`, :class:`typing.Any`]
+            Os dados do usuário.
+        """
+        # Coleta os dados dinamicamente, removendo o prefixo '_'.
+        return {
+            key.lstrip('_'): value
+            for key, value in self.__dict__.items()
+            if key not in self._TRANSIENT
+        }
+
     def write(self):
         """
         Salva os dados do usuário no disco.
+
+        Caso a escrita em segundo plano esteja ativada, o registro é apenas
+        enfileirado. Veja :func:`modules.persistence.enable_write_behind`.
         """
-        # Coleta os dados dinamicamente, removendo o prefixo '_'.
-        data = {key.lstrip('_'): value for key, value in self.__dict__.items()}
+        path = get_user_file('usuarios.json', self.username)
+
+        self.version += 1
 
-        users = get_data_file('data/usuarios.json')
-        users[self.username] = data
+        queue = get_write_behind()
+        if queue is not None:
+            queue.enqueue(path, self.username, self.to_dict())
+            return
 
-        save_data_file('data/usuarios.json', users)
+        record = self.to_dict()
+        self._generation = save_user_records(path, {self.username: record})
+        self.version = record['version']
 
     def update(self):
         """
         Atualiza essa instância do usuário a partir do disco.
+
+        O arquivo de usuários só é lido caso sua geração tenha mudado desde a última
+        leitura ou escrita deste usuário. Caso o usuário ainda não esteja no
+        arquivo, a instância não é alterada.
         """
-        data = get_data_file('data/usuarios.json')
-        for key, value in data[self.username].items():
+        path = get_user_file('usuarios.json', self.username)
+
+        # Com a escrita em segundo plano, o registro pendente é o mais recente.
+        queue = get_write_behind()
+        if queue is not None and queue.get_pending(path, self.username) is not None:
+            return
+
+        generation = get_generation(path)
+        if generation == self._generation:
+            return
+
+        data = get_data_file(path).get(self.username)
+        if data is None:
+            return
+
+        self._generation = generation
+        for key, value in data.items():
             setattr(self, key, value)
 
 
+def validate_account(
+    full_name: str, age: str, gender: str, city: str, username: str, password: str
+) -> Optional[str]:
+    """
+    Valida os dados de um cadastro com as mesmas regras de :func:`create_account`.
+
+    Os dados devem estar normalizados da mesma forma que no cadastro interativo,
+    ou seja, nomes e cidades em formato de título e sem espaços nas extremidades.
+
+    Parameters
+    ----------
+    full_name: :class:`str`
+        Nome completo.
+    age: :class:`str`
+        Idade, ainda em forma de texto.
+    gender: :class:`str`
+        Gênero, sendo "h", "m" ou "n".
+    city: :class:`str`
+        Cidade.
+    username: :class:`str`
+        Nome de usuário.
+    password: :class:`str`
+        Senha.
+
+    Returns
+    -------
+    :class:`str`
+        A mensagem de erro do primeiro campo inválido.
+    :class:`None`
+        Caso todos os campos sejam válidos.
+    """
+    if not NAME_REGEX.match(full_name):
+        return 'Nome inválido. Deve conter pelo menos 3 letras.'
+    if gender not in ('h', 'm', 'n'):
+        return 'Gênero inválido.'
+    if not age.isdigit():
+        return 'Idade inválida.'
+    if int(age) < MIN_AGE:
+        return f'É necessário ter mais de {MIN_AGE} anos para usar o serviço.'
+    if not NAME_REGEX.match(city):
+        return 'Cidade inválida. Deve conter pelo menos 3 letras.'
+    if not USER_REGEX.match(username):
+        return 'Nome de usuário inválido. Deve conter apenas letras, números, hífens e sublinhados.'
+    if len(password) == 0:
+        return 'Senha vazia.'
+
+    return None
+
+
 def create_account() -> User:  # noqa: C901
     """
     Cadastra um novo usuário.
@@ -181,8 +316,8 @@ def create_account() -> User:  # noqa: C901
             continue
 
         age = int(age)
-        if age < 14:
-            print('É necessário ter mais de 14 anos para usar o serviço.')
+        if age < MIN_AGE:
+            print(f'É necessário ter mais de {MIN_AGE} anos para usar o serviço.')
             sys.exit(0)
 
         break
@@ -239,20 +374,37 @@ def login_account() -> User:
     :class:`User`
         O usuário logado.
     """
+    message = ''
+
     while True:
-        print_menu('Realizando login...', 'Aperte Ctrl+C para voltar.', title='Entrada')
+        print_menu(
+            'Realizando login...',
+            'Aperte Ctrl+C para voltar.',
+            *(('', message) if message else ()),
+            title='Entrada',
+        )
         username = input('Seu usuário > ').strip().lower()
 
+        # As tentativas são limitadas por usuário e por origem. Em vez de esperar,
+        # o aluno é avisado de quanto tempo falta para tentar de novo.
+        retry_after = check_login(username)
+        if retry_after:
+            message = (
+                f'Muitas tentativas. Tente novamente em {math.ceil(retry_after)}s.'
+            )
+            continue
+
         user = User.find(username)
         if user is None:
-            print('Usuário não encontrado.')
-            time.sleep(0.5)
+            record_login_failure(username, exists=False)
+            message = 'Usuário não encontrado.'
             continue
 
         password = getpass('Sua senha (não é exibida)> ')
 
         if user.check_password(password):
+            record_login_success(username)
             return user
 
-        print('Senha incorreta.\n')
-        time.sleep(0.5)
+        record_login_failure(username)
+        message = 'Senha incorreta.'
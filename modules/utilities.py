@@ -1,5 +1,7 @@
+import os
 import shutil
-from typing import Union, TypeVar, Callable, Iterable, Optional, Sequence
+import unicodedata
+from typing import Dict, List, Union, TypeVar, Callable, Iterable, Optional, Sequence
 
 T = TypeVar('T')
 
@@ -65,7 +67,11 @@ def get_choice(
         if selected == '':
             return default
 
-        if selected[0] not in options:
+        # Opções com mais de um caractere, como "12", precisam ser digitadas inteiras.
+        if selected in options:
+            return selected
+
+        if selected.isdigit() or selected[0] not in options:
             return None
 
         return selected[0]
@@ -92,3 +98,292 @@ def find(
         O primeiro elemento que satisfaz a condição, ou `default` se nenhum elemento satisfizer a condição.
     """
     return next((item for item in sequence if predicate(item)), default)
+
+
+def is_process_running(pid: int) -> bool:
+    """
+    Verifica se existe um processo em execução com o PID dado.
+
+    Parameters
+    ----------
+    pid: :class:`int`
+        O ID do processo.
+
+    Returns
+    -------
+    :class:`bool`
+        Se o processo está em execução.
+    """
+    if pid == os.getpid():
+        return True
+
+    if os.name == 'nt':
+        import ctypes
+
+        # No Windows, os.kill encerraria o processo, então a API é usada diretamente.
+        kernel32 = ctypes.windll.kernel32  # type: ignore
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # noqa: FBT003
+        if not handle:
+            return False
+
+        exit_code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        kernel32.CloseHandle(handle)
+
+        return exit_code.value == 259  # STILL_ACTIVE
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    return True
+
+
+def get_process_memory(pid: int) -> Optional[Dict[str, int]]:
+    """
+    Retorna o uso de memória de um processo, separando o que é exclusivo dele.
+
+    Disponível apenas no Linux, onde é lido de "/proc/<pid>/smaps_rollup".
+
+    Parameters
+    ----------
+    pid: :class:`int`
+        O ID do processo.
+
+    Returns
+    -------
+    Dict[:class:`str`, :class:`int`]
+        Em bytes: "rss" (residente), "pss" (com as páginas compartilhadas divididas
+        entre os processos) e "uss" (páginas exclusivas do processo).
+    :class:`None`
+        Caso a informação não esteja disponível.
+    """
+    try:
+        with open(f'/proc/{pid}/smaps_rollup', 'r', encoding='utf-8') as file:
+            lines = file.readlines()
+    except OSError:
+        return None
+
+    fields = {}
+    for line in lines:
+        name, _, value = line.partition(':')
+        if value.strip().endswith('kB'):
+            fields[name] = int(value.split()[0]) * 1024
+
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'uss': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+    }
+
+
+def normalize(text: str) -> str:
+    """
+    Normaliza um texto para buscas, removendo acentos e diferenças de maiúsculas.
+
+    Parameters
+    ----------
+    text: :class:`str`
+        O texto a ser normalizado.
+
+    Returns
+    -------
+    :class:`str`
+        O texto normalizado.
+    """
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+class PrefixIndex:
+    """
+    Índice de prefixos das palavras de uma lista de textos.
+
+    Cada prefixo de cada palavra aponta para a lista ordenada dos textos que o
+    contêm, então uma busca custa o tamanho do resultado, e não da lista.
+
+    Parameters
+    ----------
+    texts: Sequence[:class:`str`]
+        Os textos a serem indexados.
+    """
+
+    def __init__(self, texts: Sequence[str]):
+        self._postings: Dict[str, List[int]] = {}
+
+        for i, text in enumerate(texts):
+            prefixes = set()
+            for word in normalize(text).split():
+                prefixes.update(word[:end] for end in range(1, len(word) + 1))
+
+            for prefix in prefixes:
+                self._postings.setdefault(prefix, []).append(i)
+
+    def search(self, query: str, within: Optional[Sequence[int]] = None) -> List[int]:
+        """
+        Busca os textos que contêm palavras começando com cada palavra da busca.
+
+        Parameters
+        ----------
+        query: :class:`str`
+            A busca.
+        within: Optional[Sequence[:class:`int`]]
+            Se especificado, limita o resultado a estes índices. Usado para refinar
+            o resultado de uma busca anterior.
+
+        Returns
+        -------
+        List[:class:`int`]
+            Os índices dos textos encontrados, em ordem.
+        """
+        postings = sorted(
+            (self._postings.get(word, []) for word in normalize(query).split()),
+            key=len,
+        )
+        if within is not None:
+            postings.append(list(within))
+
+        if not postings:
+            return []
+
+        # Começa pela menor lista para que as interseções sejam baratas.
+        result = postings[0]
+        for posting in postings[1:]:
+            allowed = set(posting)
+            result = [i for i in result if i in allowed]
+
+        return result
+
+
+class Menu:
+    """
+    Menu de seleção paginado e com busca.
+
+    As opções são numeradas a partir de 1 e mantêm seus números mesmo quando
+    filtradas. Apenas a página visível é desenhada, e o tamanho da página depende da
+    altura do terminal.
+
+    Parameters
+    ----------
+    options: Sequence[:class:`str`]
+        Os textos das opções.
+    title: :class:`str`
+        O título do menu.
+    header: Sequence[:class:`str`]
+        Textos exibidos acima das opções.
+    back_label: Optional[:class:`str`]
+        Se especificado, adiciona a opção "0" com este texto.
+    """
+
+    # Linhas ocupadas pelas bordas, pela paginação, pelas instruções e pela entrada.
+    RESERVED_LINES = 8
+
+    def __init__(
+        self,
+        options: Sequence[str],
+        *,
+        title: str,
+        header: Sequence[str] = (),
+        back_label: Optional[str] = None,
+    ):
+        self.options = options
+        self.title = title
+        self.header = header
+        self.back_label = back_label
+
+        self._index = PrefixIndex(options)
+        self._query = ''
+        self._visible: List[int] = list(range(len(options)))
+        self._page = 0
+        # Aviso exibido no próximo desenho do menu, como uma opção inválida.
+        self._message = ''
+
+    @property
+    def page_size(self) -> int:
+        lines = shutil.get_terminal_size().lines
+        reserved = (
+            self.RESERVED_LINES + len(self.header) + (self.back_label is not None)
+        )
+        return max(lines - reserved, 3)
+
+    def _filter(self, query: str):
+        # Se a busca só acrescenta texto à anterior, basta refinar o resultado atual.
+        within = (
+            self._visible if self._query and query.startswith(self._query) else None
+        )
+
+        self._visible = self._index.search(query, within)
+        self._query = query
+        self._page = 0
+
+    def _clear_filter(self):
+        self._visible = list(range(len(self.options)))
+        self._query = ''
+        self._page = 0
+
+    def _draw(self):
+        page_size = self.page_size
+        page_count = max((len(self._visible) - 1) // page_size + 1, 1)
+        self._page = min(self._page, page_count - 1)
+
+        start = self._page * page_size
+        texts = [*self.header]
+        texts.extend(
+            f'[{i + 1}] {self.options[i]}'
+            for i in self._visible[start : start + page_size]
+        )
+
+        if not self._visible:
+            texts.append('Nenhuma opção encontrada.')
+        if self.back_label is not None:
+            texts.append(f'[0] {self.back_label}')
+
+        texts.append('')
+        if self._message:
+            texts.append(self._message)
+            self._message = ''
+        if self._query:
+            texts.append(f'Filtro: "{self._query}" ([/] limpa o filtro).')
+        if page_count > 1:
+            texts.append(
+                f'Página {self._page + 1} de {page_count} ([<] anterior, [>] próxima).'
+            )
+        texts.append('Digite o número da opção ou parte do nome para buscar.')
+
+        print_menu(*texts, title=self.title)
+
+    def select(self) -> Optional[int]:
+        """
+        Exibe o menu até que o usuário escolha uma opção.
+
+        Returns
+        -------
+        :class:`int`
+            O índice da opção escolhida em `options`.
+        :class:`None`
+            Caso o usuário escolha a opção "0".
+        """
+        while True:
+            self._draw()
+            selected = input('> ').strip()
+
+            if selected == '>':
+                self._page += 1
+            elif selected == '<':
+                self._page = max(self._page - 1, 0)
+            elif selected == '/':
+                self._clear_filter()
+            elif selected.isdigit():
+                choice = int(selected)
+
+                if choice == 0 and self.back_label is not None:
+                    return None
+                if 1 <= choice <= len(self.options):
+                    return choice - 1
+
+                self._message = 'Opção inválida.'
+            elif selected:
+                self._filter(selected)
@@ -0,0 +1,51 @@
+import sys
+import argparse
+
+from modules.indexes import query_users
+
+
+def parse_ages(value: str) -> range:
+    start, _, end = value.partition('-')
+    try:
+        return range(int(start), int(end or start) + 1)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Idade inválida: "{value}".') from None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Busca alunos pelos índices de curso, cidade, idade e disciplinas '
+        'concluídas.'
+    )
+    parser.add_argument('--curso', help='ID do curso, como "ADS"')
+    parser.add_argument('--cidade', action='append', default=[], help='pode repetir')
+    parser.add_argument(
+        '--idade', type=parse_ages, help='idade ou faixa de idades, como "18-20"'
+    )
+    parser.add_argument(
+        '--concluiu', action='append', default=[], help='ID da disciplina; pode repetir'
+    )
+    parser.add_argument(
+        '--nao-concluiu',
+        action='append',
+        default=[],
+        help='ID da disciplina; pode repetir',
+    )
+    args = parser.parse_args()
+
+    usernames = query_users(
+        course_id=args.curso,
+        cities=args.cidade,
+        ages=args.idade,
+        finished=args.concluiu,
+        not_finished=args.nao_concluiu,
+    )
+
+    for username in usernames:
+        print(username)
+
+    print(f'{len(usernames)} alunos encontrados.', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
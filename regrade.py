@@ -0,0 +1,225 @@
+import time
+import argparse
+from typing import Any, Dict, List, Tuple, Iterator, Optional
+from collections import Counter
+
+from modules.data import data_path, get_data_file, iter_data_file, rewrite_shard_files
+from modules.grades import PASSING_GRADE, HISTOGRAM_BINS, HISTOGRAM_WIDTH, GradeStats
+from modules.courses import Test, Subject
+from modules.changelog import record_file
+from modules.exceptions import DataChangedError
+
+
+class Regrader:
+    """
+    Recalcula as notas de uma avaliação a partir das respostas salvas.
+
+    O gabarito e os pesos são calculados uma única vez, e a nota de cada combinação
+    de questões e respostas é guardada, então tentativas iguais custam apenas uma
+    consulta.
+
+    Parameters
+    ----------
+    subject: :class:`Subject`
+        A disciplina da avaliação, já com as correções do catálogo.
+    """
+
+    def __init__(self, subject: Subject):
+        self.subject = subject
+        self.test: Test = subject.test
+
+        # Gabarito das questões fixas, em ordem, e dos bancos de questões, por ID.
+        self.answers = ''.join(question.answer for question in self.test.questions)
+        self.weights = [question.weight for question in self.test.questions]
+        self.pool_answers: Dict[str, str] = {}
+        if self.test.pool is not None:
+            self.pool_answers = {
+                question.id: question.answer for question in self.test.pool.questions
+            }
+
+        self._pool_weights: Dict[int, List[int]] = {}
+        self._cache: Dict[Tuple[Optional[Tuple[str, ...]], str], float] = {}
+
+    def _get_pool_weights(self, count: int) -> List[int]:
+        weights = self._pool_weights.get(count)
+        if weights is None:
+            # Mesma distribuição de :meth:`Test._make_questions`.
+            base, remainder = divmod(100, count)
+            weights = self._pool_weights[count] = [
+                base + (i < remainder) for i in range(count)
+            ]
+        return weights
+
+    def grade(self, attempt: Dict[str, Any]) -> Optional[float]:
+        """
+        Calcula a nota de uma tentativa, em porcentagem, como em `show_test`.
+
+        Returns
+        -------
+        :class:`float`
+            A nota recalculada.
+        :class:`None`
+            Caso a tentativa não tenha sido finalizada ou use questões que não
+            existem mais.
+        """
+        answers = attempt.get('answers')
+        if answers is None:
+            return None
+
+        question_ids = attempt.get('questions')
+        key = (tuple(question_ids) if question_ids is not None else None, answers)
+
+        grade = self._cache.get(key)
+        if grade is None:
+            if question_ids is None:
+                expected, weights = self.answers, self.weights
+            else:
+                if any(q not in self.pool_answers for q in question_ids):
+                    return None
+                expected = ''.join(self.pool_answers[q] for q in question_ids)
+                weights = self._get_pool_weights(len(question_ids))
+
+            if len(answers) != len(expected):
+                return None
+
+            total = sum(
+                weight
+                for weight, given, correct in zip(weights, answers, expected)
+                if given == correct
+            )
+            grade = self._cache[key] = round(total / 100, 5) * 100
+
+        return grade
+
+
+def get_histogram(grades: List[float]) -> List[int]:
+    histogram = [0] * HISTOGRAM_BINS
+    for grade in grades:
+        histogram[int(grade) // HISTOGRAM_WIDTH] += 1
+    return histogram
+
+
+def get_stats(grades: List[float]) -> GradeStats:
+    return GradeStats(
+        len(grades),
+        sum(grades),
+        sum(grade * grade for grade in grades),
+        sum(grade >= PASSING_GRADE for grade in grades),
+        get_histogram(grades),
+    )
+
+
+def regrade_shard(
+    path: str,
+    regrader: Regrader,
+    before: List[float],
+    after: List[float],
+    counts: Counter,
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Percorre os usuários de uma partição, recalculando a nota da avaliação.
+
+    As notas anteriores e recalculadas de todas as tentativas são adicionadas a
+    `before` e `after`.
+    """
+    subject_id = regrader.subject.id
+    test_id = regrader.test.id
+
+    for username, user in iter_data_file(path):
+        attempt = (user.get('attempts') or {}).get(test_id)
+        old = (user.get('grades') or {}).get(subject_id)
+
+        if old is not None:
+            new = regrader.grade(attempt) if attempt is not None else None
+
+            if new is None:
+                counts['sem respostas'] += 1
+            else:
+                before.append(old)
+                after.append(new)
+
+                if new != old:
+                    counts['alteradas'] += 1
+                    user['grades'][subject_id] = new
+                    user['version'] = user.get('version', 0) + 1
+
+        yield username, user
+
+
+def print_distribution(before: List[float], after: List[float]):
+    old_histogram = get_histogram(before)
+    new_histogram = get_histogram(after)
+
+    print(f'{"Faixa":<12}{"Antes":>8}{"Depois":>8}')
+    for i in range(HISTOGRAM_BINS):
+        if old_histogram[i] or new_histogram[i]:
+            start = i * HISTOGRAM_WIDTH
+            end = min(start + HISTOGRAM_WIDTH, 100)
+            label = f'{start}-{end}' if start < 100 else '100'
+            print(f'{label:<12}{old_histogram[i]:>8}{new_histogram[i]:>8}')
+
+    old_stats = get_stats(before)
+    new_stats = get_stats(after)
+    for name, attribute in (('Média', 'mean'), ('Mediana', 'median')):
+        print(
+            f'{name:<12}{getattr(old_stats, attribute):>8.1f}'
+            f'{getattr(new_stats, attribute):>8.1f}'
+        )
+    print(
+        f'{"Aprovação %":<12}{old_stats.pass_rate * 100:>8.0f}'
+        f'{new_stats.pass_rate * 100:>8.0f}'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Recalcula as notas de uma avaliação após correções no gabarito '
+        'ou nos pesos das questões.'
+    )
+    parser.add_argument('avaliacao', help='ID da avaliação, como "ADPLC001A"')
+    parser.add_argument(
+        '--simular', action='store_true', help='apenas exibe o relatório'
+    )
+    args = parser.parse_args()
+
+    courses = get_data_file(data_path('cursos.json'))
+    subject = next(
+        (
+            Subject.from_dict(subject)
+            for course in courses.values()
+            for subject in course['subjects']
+            if subject['test']['id'] == args.avaliacao
+        ),
+        None,
+    )
+    if subject is None:
+        parser.error(f'Avaliação "{args.avaliacao}" não encontrada.')
+
+    regrader = Regrader(subject)
+    before: List[float] = []
+    after: List[float] = []
+    counts = Counter()
+
+    start = time.perf_counter()
+    try:
+        rewrite_shard_files(
+            'usuarios.json',
+            lambda path: regrade_shard(path, regrader, before, after, counts),
+            dry_run=args.simular,
+            on_replace=record_file,
+        )
+    except DataChangedError as e:
+        parser.exit(1, f'{e} Nenhuma nota foi salva.\n')
+    elapsed = time.perf_counter() - start
+
+    print(f'{len(after)} tentativas recalculadas em {elapsed:.2f}s.')
+    print(f'Notas alteradas: {counts["alteradas"]}')
+    if counts['sem respostas']:
+        print(f'Notas sem respostas salvas (mantidas): {counts["sem respostas"]}')
+    if after:
+        print()
+        print_distribution(before, after)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+import os
+import sys
+from typing import Any, Dict
+
+from modules.data import (
+    data_path,
+    get_shard,
+    resolve_path,
+    get_data_file,
+    get_shard_dir,
+    get_generation,
+    lock_data_file,
+    save_data_file,
+    get_shard_count,
+    get_shard_files,
+    set_shard_count,
+    get_running_processes,
+)
+from modules.throttle import ATTEMPTS_FILE
+from modules.analytics import STATES_FILE
+from modules.changelog import record_file
+from modules.exceptions import DataInUseError
+
+FILES = ('usuarios.json', 'logins.json', STATES_FILE, ATTEMPTS_FILE)
+
+
+def save_and_record(path: str, content: Dict[str, Any]):
+    # Salva o arquivo inteiro e o adiciona ao registro de alterações.
+    with lock_data_file(path):
+        record_file(path, save_data_file(path, content))
+
+
+def reshard(count: int):
+    """
+    Redistribui os usuários e logins entre `count` partições.
+
+    Parameters
+    ----------
+    count: :class:`int`
+        A nova quantidade de partições.
+
+    Raises
+    ------
+    :class:`DataInUseError`
+        Outro processo, como o main.py ou o supervisor, está usando a pasta de
+        dados e continuaria salvando na divisão antiga.
+    """
+    # "shards.json" fica travado até o fim, e os processos que iniciarem esperam.
+    with lock_data_file(data_path('shards.json')):
+        pids = get_running_processes()
+        if pids:
+            raise DataInUseError(
+                'Encerre os processos que usam a pasta de dados antes de '
+                f'redistribuir os usuários: {", ".join(map(str, pids))}.'
+            )
+
+        _reshard(count)
+
+
+def _reshard(count: int):
+    old_count = get_shard_count()
+
+    for name in FILES:
+        data = {}
+        for path in get_shard_files(name):
+            data.update(get_data_file(path))
+
+        shards = [{} for _ in range(count)]
+        for username, value in data.items():
+            shards[get_shard(username, count)][username] = value
+
+        for shard, shard_data in enumerate(shards):
+            save_and_record(f'{get_shard_dir(shard, count)}/{name}', shard_data)
+
+    save_and_record(data_path('shards.json'), {'count': count})
+    set_shard_count(count)
+
+    # Remove os arquivos antigos que não fazem parte do novo particionamento.
+    new_paths = {path for name in FILES for path in get_shard_files(name)}
+    for shard in range(old_count):
+        for name in FILES:
+            path = f'{get_shard_dir(shard, old_count)}/{name}'
+            if path not in new_paths and os.path.exists(resolve_path(path)):
+                with lock_data_file(path):
+                    os.remove(resolve_path(path))
+                    record_file(path, get_generation(path) + 1)
+
+    print(f'Usuários redistribuídos de {old_count} para {count} partições.')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2 or not sys.argv[1].isdigit() or int(sys.argv[1]) < 1:
+        print('Uso: python reshard.py <quantidade de partições>')
+        sys.exit(1)
+
+    try:
+        reshard(int(sys.argv[1]))
+    except DataInUseError as error:
+        print(error)
+        sys.exit(1)
@@ -0,0 +1,273 @@
+import os
+import csv
+import json
+import time
+import argparse
+import contextlib
+from typing import Any, Dict, Iterator
+from collections import Counter
+
+import gen_statistics
+from check_data import PROBLEMS, check_shard, build_catalog_index
+from export_users import Catalog
+from modules.data import (
+    data_path,
+    get_data_file,
+    iter_data_file,
+    get_shard_files,
+    register_process,
+    rewrite_shard_files,
+)
+from modules.jobs import (
+    PRIORITIES,
+    Scheduler,
+    JobContext,
+    JobFunction,
+    get_jobs,
+    submit_job,
+    get_job_log_path,
+)
+from migrate_progress import RULES, CatalogMapping, migrate_shard, install_catalog
+from modules.changelog import record_file
+from modules.snapshots import open_snapshot
+
+
+def statistics_job(context: JobContext) -> Iterator[None]:
+    # As partições são agregadas no próprio processo, que tem o limite de leitura.
+    with open_snapshot() as snapshot:
+        gen_statistics.generate(snapshot, processes=1)
+    yield
+
+
+def export_job(context: JobContext) -> Iterator[None]:
+    """
+    Exporta os alunos uma partição por vez para um arquivo ".parcial", que é
+    colocado no lugar ao final.
+
+    O progresso guarda as partições já exportadas e o tamanho do arquivo depois
+    delas. Ao retomar, o arquivo é cortado nesse tamanho, descartando as linhas de
+    uma partição que ficou pela metade. Cada execução lê uma cópia nova dos dados.
+    """
+    path = context.args['saida']
+    output_format = context.args['formato']
+    partial = f'{path}.parcial'
+    checkpoint = context.checkpoint
+
+    if not checkpoint:
+        checkpoint.update(shards=0, size=0)
+    with open(partial, 'a', encoding='utf-8', newline=''):
+        pass
+    os.truncate(partial, checkpoint['size'])
+
+    with (
+        open_snapshot() as snapshot,
+        open(partial, 'a', encoding='utf-8', newline='') as output,
+    ):
+        courses = get_data_file(snapshot.path(data_path('cursos.json')))
+        catalog = Catalog(courses, sorted(courses))
+        writer = csv.DictWriter(output, fieldnames=catalog.columns)
+
+        if output_format == 'csv' and checkpoint['size'] == 0:
+            writer.writeheader()
+
+        shard_paths = get_shard_files('usuarios.json')
+        for shard in range(checkpoint['shards'], len(shard_paths)):
+            for _, user in iter_data_file(snapshot.path(shard_paths[shard])):
+                row = catalog.flatten(user)
+                if output_format == 'csv':
+                    writer.writerow(row)
+                else:
+                    output.write(json.dumps(row, ensure_ascii=False))
+                    output.write('\n')
+
+            output.flush()
+            size = output.tell()
+            context.limiter(size - checkpoint['size'])
+            checkpoint.update(shards=shard + 1, size=size)
+            yield
+
+    os.replace(partial, path)
+    print(f'Alunos exportados para {path}.')
+
+
+def check_job(context: JobContext) -> Iterator[None]:
+    """
+    Verifica os dados uma partição por vez, sem reparar, somando as contagens no
+    progresso.
+    """
+    checkpoint = context.checkpoint
+    if not checkpoint:
+        checkpoint.update(shards=0, counts={})
+
+    catalog = build_catalog_index(get_data_file(data_path('cursos.json')))
+    users_paths = get_shard_files('usuarios.json')
+    logins_paths = get_shard_files('logins.json')
+
+    for shard in range(checkpoint['shards'], len(users_paths)):
+        findings, _, _ = check_shard(
+            shard,
+            users_paths[shard],
+            logins_paths[shard],
+            catalog=catalog,
+            repair=False,
+            examples=0,
+        )
+        counts = Counter(checkpoint['counts'])
+        counts.update(findings.counts)
+        checkpoint.update(shards=shard + 1, counts=dict(counts))
+        yield
+
+    counts = Counter(checkpoint['counts'])
+    print(f'{counts["usuários"]} usuários verificados.')
+    for problem, (description, _) in PROBLEMS.items():
+        if counts[problem]:
+            print(f'{counts[problem]} {description}')
+
+
+def migrate_job(context: JobContext) -> Iterator[None]:
+    """
+    Migra o progresso dos alunos, como o migrate_progress.py.
+
+    Todas as partições são substituídas de uma só vez, então uma migração
+    interrompida não deixa nada salvo e recomeça do início.
+    """
+    catalog_path = data_path('cursos.json')
+    new_path = context.args.get('novo') or catalog_path
+    mapping = CatalogMapping(
+        get_data_file(context.args['antigo']), get_data_file(new_path)
+    )
+
+    counts = Counter()
+    rewrite_shard_files(
+        'usuarios.json',
+        lambda path: migrate_shard(path, mapping, counts),
+        on_replace=record_file,
+    )
+
+    if new_path != catalog_path:
+        install_catalog(new_path)
+
+    print(f'Usuários lidos: {counts["usuários lidos"]}')
+    print(f'Usuários alterados: {counts["usuários alterados"]}')
+    for rule in RULES:
+        print(f'  {rule}: {counts[rule]}')
+    yield
+
+
+JOB_KINDS: Dict[str, JobFunction] = {
+    'estatisticas': statistics_job,
+    'exportar': export_job,
+    'verificar': check_job,
+    'migrar': migrate_job,
+}
+
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(seconds, 60)
+    return f'{int(minutes)}m{seconds:04.1f}s' if minutes else f'{seconds:.1f}s'
+
+
+def print_job(job: Dict[str, Any]):
+    print(
+        f'{job["id"]:>5}  {job["kind"]:<13}{job["priority"]:<8}{job["status"]:<12}'
+        f'{job["attempts"]:>10}{format_duration(job["runtime"]):>10}'
+        f'{job["bytes"] / 1024 / 1024:>9.1f}MiB'
+    )
+    if job['error']:
+        print(f'       {job["error"]} (veja {get_job_log_path(job["id"])})')
+
+
+def add(parser: argparse.ArgumentParser, args: argparse.Namespace):
+    arguments = args.argumentos
+    expected = {'exportar': (1, 1), 'migrar': (1, 2)}.get(args.tipo, (0, 0))
+    if not expected[0] <= len(arguments) <= expected[1]:
+        parser.error(f'Argumentos inválidos para "{args.tipo}".')
+
+    if args.tipo == 'exportar':
+        path = os.path.abspath(arguments[0])
+        output_format = 'ndjson' if '.ndjson' in path or '.jsonl' in path else 'csv'
+        job_args = {'saida': path, 'formato': output_format}
+    elif args.tipo == 'migrar':
+        for path in arguments:
+            if not os.path.isfile(path):
+                parser.error(f'O arquivo "{path}" não existe.')
+        job_args = {'antigo': os.path.abspath(arguments[0])}
+        if len(arguments) > 1:
+            job_args['novo'] = os.path.abspath(arguments[1])
+    else:
+        job_args = {}
+
+    job_id = submit_job(args.tipo, job_args, args.prioridade)
+    print(f'Tarefa {job_id} adicionada.')
+
+
+def run(args: argparse.Namespace):
+    register_process()
+    scheduler = Scheduler(JOB_KINDS, args.simultaneas, args.bytes_por_segundo)
+
+    start = time.perf_counter()
+    with contextlib.suppress(KeyboardInterrupt):
+        scheduler.run(follow=args.continuo, on_finish=print_job)
+
+    print(f'Escalonador encerrado após {format_duration(time.perf_counter() - start)}.')
+
+
+def list_jobs():
+    jobs = get_jobs()
+    if not jobs:
+        print('Nenhuma tarefa.')
+        return
+
+    print(
+        f'{"Nº":>5}  {"Tipo":<13}{"Prior.":<8}{"Estado":<12}'
+        f'{"Tentativas":>10}{"Tempo":>10}{"Lidos/escr.":>12}'
+    )
+    for job in jobs:
+        print_job(job)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Executa relatórios, exportações e manutenções em segundo plano, '
+        'com limites de tarefas simultâneas e de bytes por segundo.'
+    )
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    add_parser = subparsers.add_parser('adicionar', help='adiciona uma tarefa à fila')
+    add_parser.add_argument('tipo', choices=JOB_KINDS)
+    add_parser.add_argument(
+        'argumentos',
+        nargs='*',
+        help='exportar: arquivo de saída; migrar: "cursos.json" antigo e, '
+        'opcionalmente, o novo',
+    )
+    add_parser.add_argument('--prioridade', choices=PRIORITIES, default='normal')
+
+    run_parser = subparsers.add_parser('executar', help='executa as tarefas da fila')
+    run_parser.add_argument('--simultaneas', type=int, default=1)
+    run_parser.add_argument(
+        '--bytes-por-segundo',
+        type=float,
+        default=8 * 1024 * 1024,
+        help='bytes lidos e escritos por segundo, somando todas as tarefas',
+    )
+    run_parser.add_argument(
+        '--continuo', action='store_true', help='continua esperando novas tarefas'
+    )
+
+    subparsers.add_parser('listar', help='exibe as tarefas e seus tempos')
+
+    args = parser.parse_args()
+
+    if args.comando == 'adicionar':
+        add(add_parser, args)
+    elif args.comando == 'executar':
+        if args.simultaneas < 1 or args.bytes_por_segundo <= 0:
+            run_parser.error('Os limites devem ser positivos.')
+        run(args)
+    else:
+        list_jobs()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+import os
+import time
+import shutil
+import argparse
+import contextlib
+from typing import Any, Dict, List, Tuple
+
+import modules.data
+from modules.data import get_data_file, get_generation, save_data_file
+from modules.changelog import (
+    read_changes,
+    create_change_log,
+    get_change_log_id,
+    get_change_log_path,
+)
+from modules.snapshots import open_snapshot
+
+# Estado da réplica, na pasta de destino.
+STATE_FILE = 'replicacao.json'
+
+
+def full_copy(destination: str) -> Dict[str, Any]:
+    """
+    Copia todos os arquivos de dados para a pasta de destino e passa a registrar as
+    alterações a partir dali.
+
+    A posição do registro é lida antes da cópia, e a geração de cada arquivo
+    copiado é guardada no estado. As alterações registradas durante a cópia com
+    gerações já copiadas são puladas depois, e as demais são aplicadas.
+
+    Returns
+    -------
+    Dict[:class:`str`, Any]
+        O estado inicial da réplica.
+    """
+    log_id = create_change_log()
+    offset = os.path.getsize(get_change_log_path())
+
+    copied = set()
+    with open_snapshot() as snapshot:
+        generations = snapshot.get_generations()
+        for dirpath, _, filenames in os.walk(snapshot.root):
+            relative = os.path.relpath(dirpath, snapshot.root)
+            target_dir = os.path.normpath(f'{destination}/{relative}')
+            os.makedirs(target_dir, exist_ok=True)
+
+            for name in filenames:
+                # O manifesto de gerações da cópia não é um arquivo de dados.
+                if not name.endswith('.json'):
+                    continue
+
+                target = f'{target_dir}/{name}'
+                shutil.copyfile(f'{dirpath}/{name}', f'{target}.tmp')
+                os.replace(f'{target}.tmp', target)
+                copied.add(os.path.normpath(target))
+
+    # Arquivos que não existem mais na pasta de dados, como partições antigas.
+    for dirpath, _, filenames in os.walk(destination):
+        for name in filenames:
+            path = os.path.normpath(f'{dirpath}/{name}')
+            if name.endswith('.json') and name != STATE_FILE and path not in copied:
+                os.remove(path)
+
+    state = {'log_id': log_id, 'offset': offset, 'generations': generations}
+    save_data_file(f'{destination}/{STATE_FILE}', state)
+
+    return state
+
+
+def apply_changes(
+    destination: str,
+    changes: List[Tuple[int, Dict[str, Any]]],
+    generations: Dict[str, int],
+):
+    """
+    Aplica um lote de alterações na pasta de destino.
+
+    As alterações são agrupadas por arquivo, e cada arquivo é lido e salvo uma
+    única vez por lote. As alterações de um arquivo são registradas na ordem das
+    suas gerações, então são aplicadas nessa ordem, e as com gerações já aplicadas
+    são puladas. `generations` guarda a última geração aplicada de cada arquivo e
+    é atualizado.
+
+    Um arquivo substituído por inteiro é copiado da pasta de dados, com a geração
+    atual, que pode já incluir alterações seguintes do registro.
+    """
+    by_file: Dict[str, List[Dict[str, Any]]] = {}
+    for _, change in changes:
+        by_file.setdefault(change['path'], []).append(change)
+
+    for relative, file_changes in by_file.items():
+        path = f'{destination}/{relative}'
+        content = get_data_file(path)
+
+        for change in file_changes:
+            if change['generation'] <= generations.get(relative, 0):
+                continue
+            generations[relative] = change['generation']
+
+            if change.get('replaced'):
+                content, generation = fetch_data_file(relative)
+                generations[relative] = max(generation, change['generation'])
+                continue
+
+            for key in change.get('removed', ()):
+                content.pop(key, None)
+            content.update(change['changes'])
+
+        save_data_file(path, content)
+
+
+def fetch_data_file(relative: str) -> Tuple[Dict[str, Any], int]:
+    """
+    Lê um arquivo da pasta de dados e a geração do conteúdo lido.
+
+    Caso o arquivo mude durante a leitura, ele é lido de novo. Um arquivo removido
+    é lido como vazio.
+    """
+    path = f'{modules.data.DATA_DIR}/{relative}'
+    while True:
+        generation = get_generation(path)
+        content = get_data_file(path)
+        if get_generation(path) == generation:
+            return content, generation
+
+
+def ship(destination: str, state: Dict[str, Any], batch_size: int) -> Dict[str, Any]:
+    """
+    Aplica as alterações pendentes em lotes até alcançar o fim do registro.
+
+    A posição é salva após cada lote, então um envio interrompido continua do
+    último lote aplicado.
+
+    Returns
+    -------
+    Dict[:class:`str`, Any]
+        A quantidade de alterações e lotes aplicados, o atraso da réplica antes do
+        envio, em segundos, e os bytes do registro que ainda faltam.
+    """
+    stats = {'changes': 0, 'batches': 0, 'lag': 0.0}
+
+    while True:
+        changes, offset = read_changes(state['offset'], batch_size)
+        if not changes:
+            break
+
+        if stats['batches'] == 0:
+            stats['lag'] = time.time() - changes[0][1]['time']
+
+        apply_changes(destination, changes, state['generations'])
+        state['offset'] = offset
+        save_data_file(f'{destination}/{STATE_FILE}', state)
+
+        stats['changes'] += len(changes)
+        stats['batches'] += 1
+
+    stats['behind'] = os.path.getsize(get_change_log_path()) - state['offset']
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Envia as alterações dos usuários para uma pasta de dados reserva.'
+    )
+    parser.add_argument('destino', help='pasta de dados reserva')
+    parser.add_argument(
+        '--completo',
+        action='store_true',
+        help='copia todos os dados antes de enviar as alterações',
+    )
+    parser.add_argument(
+        '--continuo', action='store_true', help='continua enviando as alterações'
+    )
+    parser.add_argument(
+        '--intervalo', type=float, default=1.0, help='segundos entre os envios'
+    )
+    parser.add_argument('--lote', type=int, default=1000, help='alterações por lote')
+    args = parser.parse_args()
+
+    destination = os.path.abspath(args.destino)
+    if destination == os.path.abspath(modules.data.DATA_DIR):
+        parser.error('O destino deve ser diferente da pasta de dados.')
+
+    state = get_data_file(f'{destination}/{STATE_FILE}')
+    if not state and os.path.isdir(destination) and os.listdir(destination):
+        parser.error('A pasta de destino não está vazia e não é uma réplica.')
+
+    if args.completo:
+        start = time.perf_counter()
+        state = full_copy(destination)
+        print(f'Cópia completa em {time.perf_counter() - start:.2f}s.')
+    elif not state:
+        parser.error('A réplica ainda não existe. Rode com --completo.')
+    elif get_change_log_id() != state['log_id'] or 'generations' not in state:
+        parser.error('O registro de alterações foi recriado. Rode com --completo.')
+
+    with contextlib.suppress(KeyboardInterrupt):
+        while True:
+            start = time.perf_counter()
+            stats = ship(destination, state, args.lote)
+            elapsed = time.perf_counter() - start
+
+            if stats['changes'] or not args.continuo:
+                print(
+                    f'{stats["changes"]} alterações aplicadas em {stats["batches"]} '
+                    f'lotes ({elapsed:.2f}s). Atraso: {stats["lag"]:.1f}s. '
+                    f'Pendentes: {stats["behind"]} bytes.'
+                )
+
+            if not args.continuo:
+                break
+            time.sleep(args.intervalo)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,466 @@
+import gc
+import io
+import os
+import sys
+import time
+import signal
+import socket
+import argparse
+import ipaddress
+import selectors
+import traceback
+import contextlib
+from typing import Dict, List, Optional
+from dataclasses import field, dataclass
+
+import main
+import modules.users
+from modules.data import register_process
+from modules.courses import freeze_catalog
+from modules.throttle import current_source
+from modules.utilities import print_menu, get_process_memory
+from modules.exceptions import Exit
+from modules.persistence import enable_write_behind, disable_write_behind
+
+# Códigos de saída dos processos filhos.
+EXIT_IDLE = 0
+EXIT_SESSION_LIMIT = 3
+
+# Comandos do protocolo telnet (RFC 854) e a opção de eco (RFC 857).
+IAC, DONT, DO, WONT, WILL, SB, SE = 255, 254, 253, 252, 251, 250, 240
+ECHO = 1
+
+
+class TelnetReader(io.RawIOBase):
+    """
+    Lê os dados enviados pelo aluno, descartando os comandos do protocolo telnet,
+    como as respostas aos pedidos de eco.
+
+    Parameters
+    ----------
+    conn: :class:`socket.socket`
+        A conexão do aluno.
+    """
+
+    def __init__(self, conn: socket.socket):
+        self.conn = conn
+        # Estado do comando sendo lido, que pode estar dividido entre dois recv.
+        self._state = 'data'
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while True:
+            data = self.conn.recv(len(buffer))
+            if not data:
+                return 0
+
+            data = self._filter(data)
+            if data:
+                buffer[: len(data)] = data
+                return len(data)
+
+    def _filter(self, data: bytes) -> bytes:  # noqa: C901
+        output = bytearray()
+
+        for byte in data:
+            state = self._state
+            if state == 'data':
+                if byte == IAC:
+                    self._state = 'iac'
+                elif byte != 0:
+                    # O Enter do telnet é "\r\0" ou "\r\n".
+                    output.append(byte)
+            elif state == 'iac':
+                if byte == IAC:
+                    output.append(IAC)
+                    self._state = 'data'
+                elif byte in (WILL, WONT, DO, DONT):
+                    self._state = 'option'
+                elif byte == SB:
+                    self._state = 'sb'
+                else:
+                    self._state = 'data'
+            elif state == 'option':
+                self._state = 'data'
+            elif state == 'sb':
+                if byte == IAC:
+                    self._state = 'sb_iac'
+            else:
+                self._state = 'data' if byte == SE else 'sb'
+
+        return bytes(output)
+
+
+def _send_command(command: int, option: int):
+    sys.stdout.flush()
+    sys.stdout.buffer.write(bytes((IAC, command, option)))
+    sys.stdout.buffer.flush()
+
+
+def _socket_getpass(prompt: str = 'Password: ') -> str:
+    # getpass lê do terminal do supervisor, e não da conexão do aluno. Para que a
+    # senha não apareça, o cliente telnet é avisado de que o eco é do servidor,
+    # que não a ecoa.
+    print(prompt, end='', flush=True)
+    _send_command(WILL, ECHO)
+    try:
+        line = sys.stdin.readline()
+    finally:
+        _send_command(WONT, ECHO)
+        print()
+
+    if not line:
+        raise EOFError
+    return line.rstrip('\r\n')
+
+
+def serve_session(conn: socket.socket):
+    """
+    Executa o programa para um aluno conectado, usando a conexão como terminal.
+
+    Parameters
+    ----------
+    conn: :class:`socket.socket`
+        A conexão aceita pelo processo filho.
+    """
+    # As tentativas de login são limitadas também pelo endereço do aluno.
+    current_source.set(conn.getpeername()[0])
+
+    stdin = io.TextIOWrapper(
+        io.BufferedReader(TelnetReader(conn)), encoding='utf-8', errors='replace'
+    )
+    stdout = conn.makefile('w', buffering=1, encoding='utf-8')
+    sys.stdin, sys.stdout = stdin, stdout
+
+    try:
+        main.main()
+    except (Exit, KeyboardInterrupt):
+        print_menu('Saindo...')
+    except (EOFError, OSError):
+        # O aluno fechou a conexão.
+        pass
+    except Exception:  # noqa: BLE001
+        traceback.print_exc()
+        print_menu(
+            'Ocorreu um erro inesperado.',
+            'Por favor, entre em contato com o suporte.',
+            title='Erro',
+        )
+    finally:
+        sys.stdin, sys.stdout = sys.__stdin__, sys.__stdout__
+        # A conexão pode já ter sido fechada pelo aluno.
+        with contextlib.suppress(OSError):
+            stdout.close()
+        stdin.close()
+
+
+def run_worker(
+    server: socket.socket,
+    ready_fd: int,
+    idle_timeout: Optional[float],
+    max_sessions: int,
+) -> int:
+    """
+    Laço de um processo filho: atende um aluno por vez até ficar ocioso por
+    `idle_timeout` segundos ou atender `max_sessions` alunos.
+
+    Returns
+    -------
+    :class:`int`
+        O código de saída do processo.
+    """
+    # O Ctrl+C do terminal é tratado pelo supervisor, que encerra os filhos.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(EXIT_IDLE))
+
+    # Cada conexão é um aluno diferente, então não há sessão salva neste computador.
+    main.resume_session = lambda: None
+    main.remember_user = lambda user: None
+    modules.users.getpass = _socket_getpass
+
+    if os.environ.get('PIM_WRITE_BEHIND') == '1':
+        enable_write_behind()
+
+    server.settimeout(idle_timeout)
+    os.write(ready_fd, f'{os.getpid()} {time.monotonic()}\n'.encode())
+
+    try:
+        for _ in range(max_sessions):
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                return EXIT_IDLE
+
+            with conn:
+                conn.settimeout(None)
+                serve_session(conn)
+                os.write(ready_fd, f'{os.getpid()} sessao\n'.encode())
+    finally:
+        disable_write_behind()
+
+    return EXIT_SESSION_LIMIT
+
+
+@dataclass
+class Worker:
+    pid: int
+    forked: float
+    ready: Optional[float] = None
+    sessions: int = 0
+
+
+@dataclass
+class Stats:
+    spawned: int = 0
+    idle: int = 0
+    session_limit: int = 0
+    crashed: int = 0
+    sessions: int = 0
+    spawn_latencies: List[float] = field(default_factory=list)
+
+
+class Supervisor:
+    """
+    Mantém um grupo de processos filhos criados com fork, que herdam o catálogo já
+    carregado e atendem os alunos conectados.
+
+    Parameters
+    ----------
+    server: :class:`socket.socket`
+        O socket que recebe as conexões, compartilhado com os filhos.
+    size: :class:`int`
+        A quantidade de processos filhos.
+    idle_timeout: Optional[:class:`float`]
+        Segundos sem conexões até um filho ser substituído.
+    max_sessions: :class:`int`
+        Alunos atendidos por um filho até ele ser substituído.
+    """
+
+    def __init__(
+        self,
+        server: socket.socket,
+        size: int,
+        idle_timeout: Optional[float],
+        max_sessions: int,
+    ):
+        self.server = server
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+
+        self.workers: Dict[int, Worker] = {}
+        self.stats = Stats()
+        self.stopping = False
+
+        self._ready_read, self._ready_write = os.pipe()
+        os.set_blocking(self._ready_read, False)
+        self._buffer = b''
+
+    def spawn(self):
+        forked = time.monotonic()
+        pid = os.fork()
+
+        if pid == 0:
+            os.close(self._ready_read)
+            code = 1
+            try:
+                code = run_worker(
+                    self.server, self._ready_write, self.idle_timeout, self.max_sessions
+                )
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else 1
+            except BaseException:  # noqa: BLE001
+                traceback.print_exc()
+            finally:
+                os._exit(code)
+
+        self.workers[pid] = Worker(pid, forked)
+        self.stats.spawned += 1
+
+    def _read_messages(self):
+        try:
+            self._buffer += os.read(self._ready_read, 65536)
+        except BlockingIOError:
+            return
+
+        *lines, self._buffer = self._buffer.split(b'\n')
+        for line in lines:
+            pid, message = line.decode().split(' ', 1)
+            worker = self.workers.get(int(pid))
+            if worker is None:
+                continue
+
+            if message == 'sessao':
+                worker.sessions += 1
+                self.stats.sessions += 1
+            else:
+                worker.ready = float(message)
+                self.stats.spawn_latencies.append(worker.ready - worker.forked)
+
+    def _reap(self):
+        while self.workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                break
+
+            self.workers.pop(pid, None)
+            code = os.waitstatus_to_exitcode(status)
+            if code == EXIT_IDLE:
+                self.stats.idle += 1
+            elif code == EXIT_SESSION_LIMIT:
+                self.stats.session_limit += 1
+            else:
+                self.stats.crashed += 1
+
+    def run(self, report_interval: float):
+        """
+        Mantém a quantidade de filhos até :meth:`stop` ser chamado, exibindo o
+        relatório a cada `report_interval` segundos.
+        """
+        selector = selectors.DefaultSelector()
+        selector.register(self._ready_read, selectors.EVENT_READ)
+        next_report = time.monotonic() + report_interval
+
+        while not self.stopping:
+            while len(self.workers) < self.size:
+                self.spawn()
+
+            if selector.select(timeout=1.0):
+                self._read_messages()
+            self._reap()
+
+            if report_interval and time.monotonic() >= next_report:
+                self.print_report()
+                next_report = time.monotonic() + report_interval
+
+        for pid in self.workers:
+            os.kill(pid, signal.SIGTERM)
+        while self.workers:
+            pid, _ = os.waitpid(-1, 0)
+            self.workers.pop(pid, None)
+        self._read_messages()
+
+    def stop(self, *_):
+        self.stopping = True
+
+    def print_report(self):
+        stats = self.stats
+        print(
+            f'Filhos: {len(self.workers)} ativos, {stats.spawned} criados, '
+            f'{stats.idle} substituídos por ociosidade, '
+            f'{stats.session_limit} pelo limite de sessões, {stats.crashed} com erro.'
+        )
+        print(f'Sessões atendidas: {stats.sessions}')
+
+        latencies = sorted(stats.spawn_latencies)
+        if latencies:
+            print(
+                'Tempo até o filho ficar pronto: '
+                f'p50 {latencies[len(latencies) // 2] * 1000:.2f}ms, '
+                f'máx {latencies[-1] * 1000:.2f}ms'
+            )
+
+        supervisor = get_process_memory(os.getpid())
+        if supervisor is None:
+            return
+
+        print(f'Supervisor: RSS {supervisor["rss"] / 1024 / 1024:.1f} MiB')
+        print(f'{"PID":>8}{"Sessões":>9}{"RSS":>10}{"PSS":>10}{"USS":>10}')
+        for worker in self.workers.values():
+            memory = get_process_memory(worker.pid)
+            if memory is None:
+                continue
+            print(
+                f'{worker.pid:>8}{worker.sessions:>9}'
+                + ''.join(
+                    f'{memory[name] / 1024 / 1024:>6.1f}MiB'
+                    for name in ('rss', 'pss', 'uss')
+                )
+            )
+
+
+def is_loopback(address: str) -> bool:
+    """
+    Verifica se um endereço aceita apenas conexões do próprio computador.
+    """
+    if address == 'localhost':
+        return True
+
+    try:
+        return ipaddress.ip_address(address).is_loopback
+    except ValueError:
+        return False
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description='Atende vários alunos por conexões TCP com processos criados a '
+        'partir de um supervisor, que carrega o catálogo uma única vez.'
+    )
+    parser.add_argument(
+        '--endereco',
+        default='127.0.0.1',
+        help='endereço das conexões; o padrão aceita apenas este computador',
+    )
+    parser.add_argument('--porta', type=int, default=8023)
+    parser.add_argument('--processos', type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        '--ociosidade',
+        type=float,
+        default=300.0,
+        help='segundos sem alunos até um processo ser substituído; 0 desativa',
+    )
+    parser.add_argument(
+        '--sessoes', type=int, default=100, help='alunos por processo até substituí-lo'
+    )
+    parser.add_argument(
+        '--relatorio',
+        type=float,
+        default=60.0,
+        help='intervalo do relatório em segundos',
+    )
+    args = parser.parse_args()
+
+    if not hasattr(os, 'fork'):
+        parser.error('O supervisor depende de os.fork e não funciona no Windows.')
+
+    # Os processos filhos usam a quantidade de partições lida pelo supervisor, então
+    # o reshard.py não roda enquanto ele estiver aberto.
+    register_process()
+
+    # O catálogo é carregado antes do fork e congelado, para que a coleta de lixo
+    # dos filhos não escreva nas páginas herdadas e elas continuem compartilhadas.
+    catalog = freeze_catalog()
+    gc.collect()
+    gc.freeze()
+
+    if not is_loopback(args.endereco):
+        print(
+            f'Aviso: o endereço {args.endereco} aceita conexões de outros '
+            'computadores, e as senhas trafegam sem criptografia. Use um proxy '
+            'TLS na frente do supervisor.',
+            file=sys.stderr,
+        )
+
+    server = socket.create_server((args.endereco, args.porta), backlog=128)
+    supervisor = Supervisor(
+        server, args.processos, args.ociosidade or None, args.sessoes
+    )
+
+    signal.signal(signal.SIGINT, supervisor.stop)
+    signal.signal(signal.SIGTERM, supervisor.stop)
+
+    print(
+        f'{len(catalog)} cursos carregados. Aguardando alunos em '
+        f'{args.endereco}:{args.porta} com {args.processos} processos.'
+    )
+    supervisor.run(args.relatorio)
+    server.close()
+
+    supervisor.print_report()
+
+
+if __name__ == '__main__':
+    run()
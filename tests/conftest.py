@@ -0,0 +1,102 @@
+import os
+import sys
+import shutil
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import modules.data  # noqa: E402
+import modules.courses  # noqa: E402
+import modules.sessions  # noqa: E402
+import modules.throttle  # noqa: E402
+import modules.persistence  # noqa: E402
+from modules.data import (  # noqa: E402
+    get_user_file,
+    save_data_file,
+    get_shard_files,
+    set_shard_count,
+)
+from modules.passwords import hash_password  # noqa: E402
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """
+    Uma pasta de dados vazia, apenas com o catálogo, usada no lugar de "data".
+
+    O diretório atual também muda para a pasta temporária, pois os relatórios são
+    escritos nele.
+    """
+    path = tmp_path / 'data'
+    path.mkdir()
+    shutil.copy(f'{ROOT}/data/cursos.json', path / 'cursos.json')
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(modules.data, 'DATA_DIR', str(path))
+    monkeypatch.setattr(modules.data, '_shard_count', None)
+    monkeypatch.setattr(modules.data, '_io_hook', None)
+    monkeypatch.setattr(modules.courses, '_frozen_catalog', None)
+    monkeypatch.setattr(modules.persistence, '_queue', None)
+    monkeypatch.setattr(modules.sessions, '_secret', None)
+    monkeypatch.setattr(
+        modules.sessions, '_token_cache', type(modules.sessions._token_cache)()
+    )
+    monkeypatch.setattr(modules.sessions, '_epochs_cache', {})
+    monkeypatch.setattr(
+        modules.throttle,
+        'stored_account_throttle',
+        modules.throttle.StoredThrottle(modules.throttle.ATTEMPTS_FILE, capacity=5),
+    )
+    monkeypatch.setattr(
+        modules.throttle, 'account_throttle', modules.throttle.Throttle(capacity=5)
+    )
+    monkeypatch.setattr(
+        modules.throttle,
+        'source_throttle',
+        modules.throttle.Throttle(capacity=20, refill_rate=1 / 6),
+    )
+
+    return path
+
+
+def make_user(username: str, **fields) -> dict:
+    """
+    Retorna o registro de um aluno como salvo em "usuarios.json".
+    """
+    user = {
+        'age': 20,
+        'username': username,
+        'full_name': 'Aluno de Teste',
+        'gender': 'h',
+        'city': 'Palmital',
+        'course_id': 'PSI',
+        'grades': {},
+        'current_lesson': {},
+        'attempts': {},
+        'version': 1,
+    }
+    user.update(fields)
+    return user
+
+
+def save_users(users, shards: int = 1, password: str = 'senha'):  # noqa: S107
+    """
+    Salva os alunos e seus logins, com a mesma senha, em `shards` partições.
+    """
+    set_shard_count(shards)
+    if shards > 1:
+        save_data_file(f'{modules.data.DATA_DIR}/shards.json', {'count': shards})
+
+    for name, value in (
+        ('usuarios.json', lambda user: user),
+        ('logins.json', lambda user: hash_password(password)),
+    ):
+        contents = {path: {} for path in get_shard_files(name)}
+        for user in users:
+            contents[get_user_file(name, user['username'])][user['username']] = value(
+                user
+            )
+        for path, content in contents.items():
+            save_data_file(path, content)
@@ -0,0 +1,73 @@
+import sys
+
+from conftest import make_user, save_users
+
+import check_data
+from modules import indexes
+from modules.data import (
+    get_data_file,
+    get_user_file,
+    get_generation,
+    save_data_file,
+    get_shard_files,
+)
+from modules.indexes import query_users
+from modules.changelog import read_changes, create_change_log
+
+
+def run_check(monkeypatch, *args):
+    monkeypatch.setattr(sys, 'argv', ['check_data.py', '--processos', '1', *args])
+    check_data.main()
+
+
+def test_reports_problems_without_repairing(data_dir, monkeypatch, capsys):
+    save_users([make_user('ana', course_id='XYZ'), make_user('bruno')])
+    path = get_user_file('usuarios.json', 'ana')
+
+    run_check(monkeypatch)
+
+    assert '1 cursos que não existem' in capsys.readouterr().out
+    assert get_data_file(path)['ana']['course_id'] == 'XYZ'
+
+
+def test_repairs_are_logged_and_indexed(data_dir, monkeypatch):
+    save_users(
+        [
+            make_user('ana', course_id='XYZ', grades={'XYZ1': 80.0}),
+            make_user('bruno', current_lesson={'PSTEO': 'PSTEO999L'}),
+            make_user('carla'),
+            make_user('davi'),
+        ],
+        shards=2,
+    )
+    logins_path = get_user_file('logins.json', 'eva')
+    save_data_file(logins_path, {**get_data_file(logins_path), 'eva': 'hash'})
+    assert query_users(course_id='XYZ') == ['ana']
+    generations = {
+        path: get_generation(path) for path in get_shard_files('usuarios.json')
+    }
+    create_change_log()
+
+    run_check(monkeypatch, '--reparar')
+
+    users = {}
+    for username in ('ana', 'bruno'):
+        users.update(get_data_file(get_user_file('usuarios.json', username)))
+    assert users['bruno']['current_lesson'] == {}
+    assert 'eva' not in get_data_file(logins_path)
+
+    # O progresso de um curso que não existe mais fica para o migrate_progress.py.
+    assert users['ana']['course_id'] == 'XYZ'
+    assert users['ana']['grades'] == {'XYZ1': 80.0}
+
+    # Apenas a partição com correções é substituída, e seus índices reconstruídos.
+    bruno_path = get_user_file('usuarios.json', 'bruno')
+    for path, generation in generations.items():
+        assert (get_generation(path) != generation) == (path == bruno_path)
+        assert indexes._get_index_generation(path) == get_generation(path)
+
+    changes, _ = read_changes(0, 100)
+    changed = {key for _, change in changes for key in change['changes']}
+    removed = {key for _, change in changes for key in change.get('removed', ())}
+    assert changed == {'bruno'}
+    assert removed == {'eva'}
@@ -0,0 +1,61 @@
+import random
+
+import pytest
+
+from modules.courses import Test as CourseTest
+from modules.courses import QuestionPool
+
+
+def make_pool(tags, size=3, count=5):
+    return QuestionPool.from_dict(
+        {
+            'size': size,
+            'tags': tags,
+            'questions': [
+                {
+                    'id': f'Q{i}',
+                    'tags': ['cinematica'],
+                    'question': f'Questão {i}',
+                    'options': {'a': 'sim', 'b': 'não'},
+                    'answer': 'a',
+                }
+                for i in range(count)
+            ],
+        }
+    )
+
+
+@pytest.mark.parametrize(('tags', 'size'), [(['optica'], 3), (['cinematica'], 6)])
+def test_pool_without_enough_tagged_questions_is_rejected_at_load(tags, size):
+    with pytest.raises(ValueError, match='precisa de'):
+        make_pool(tags, size=size)
+
+
+def test_sample_of_most_of_the_pool_has_distinct_questions():
+    test = CourseTest(id='FISIC001A', questions=[], pool=make_pool([], size=4))
+
+    question_ids = test.sample_ids(42)
+    questions = test.assemble(question_ids)
+
+    assert len(set(question_ids)) == 4
+    assert sum(question.weight for question in questions) == 100
+
+
+def test_large_samples_follow_the_frequencies():
+    pool = make_pool([], size=3, count=4)
+    pool.questions[0].frequency = 1000
+
+    picks = [pool.sample(random.Random(seed)) for seed in range(200)]
+
+    assert all(len({question.id for question in pick}) == 3 for pick in picks)
+    assert sum(pool.questions[0] in pick for pick in picks) > 190
+
+
+def test_same_seed_samples_the_same_questions():
+    pool = make_pool(['cinematica'], size=2)
+    assert pool.sample(random.Random(7)) == pool.sample(random.Random(7))
+
+
+def test_empty_pool_is_rejected_at_load():
+    with pytest.raises(ValueError):
+        make_pool([], count=0)
@@ -0,0 +1,40 @@
+import io
+import csv
+import json
+
+from conftest import make_user, save_users
+
+from export_users import export_users
+
+
+def test_csv_has_one_row_per_user_with_subject_columns(data_dir):
+    save_users(
+        [
+            make_user(
+                'ana', current_lesson={'PSTEO': 'PSTEO002L'}, grades={'PSTEO': 80.0}
+            ),
+            make_user('bruno', course_id=None),
+        ],
+        shards=2,
+    )
+
+    output = io.StringIO()
+    assert export_users(output, 'csv') == 2
+
+    rows = {
+        row['username']: row for row in csv.DictReader(io.StringIO(output.getvalue()))
+    }
+    assert rows['ana']['PSTEO_lesson'] == 'PSTEO002L'
+    assert rows['ana']['PSTEO_grade'] == '80.0'
+    assert rows['bruno']['course_name'] == ''
+    assert rows['bruno']['PSTEO_lesson'] == ''
+
+
+def test_filters_by_city_ignoring_case(data_dir):
+    save_users([make_user('ana', city='Assis'), make_user('bruno')])
+
+    output = io.StringIO()
+    export_users(output, 'ndjson', cities=['ASSIS'])
+
+    lines = output.getvalue().splitlines()
+    assert [json.loads(line)['username'] for line in lines] == ['ana']
@@ -0,0 +1,123 @@
+import pytest
+from conftest import save_users
+
+from modules import analytics as analytics_module
+from modules.data import data_path, get_data_file, save_data_file, get_shard_files
+from modules.events import EVENT_TEST, EVENT_COURSE, EVENT_LESSON
+from modules.analytics import AGGREGATES_FILE, FunnelAnalytics, get_steps
+from modules.exceptions import DataChangedError
+
+DAY = 24 * 3600
+
+
+def write_events(data_dir, events):
+    with open(data_dir / 'eventos.csv', 'a', encoding='utf-8') as file:
+        for event in events:
+            file.write(','.join(map(str, event)) + '\n')
+
+
+@pytest.fixture
+def courses(data_dir):
+    save_users([], shards=2)
+    return get_data_file(data_path('cursos.json'))
+
+
+def test_steps_follow_the_catalog_order():
+    # A aula 003 foi inserida entre as aulas 001 e 002.
+    subject = {
+        'id': 'PSTEO',
+        'lessons': [{'id': 'PSTEO001L'}, {'id': 'PSTEO003L'}, {'id': 'PSTEO002L'}],
+        'test': {'id': 'PSTEO001A'},
+    }
+
+    steps = get_steps({'PSI': {'subjects': [subject]}})
+
+    assert steps == {
+        'PSTEO001L': ('PSTEO', 0),
+        'PSTEO003L': ('PSTEO', 1),
+        'PSTEO002L': ('PSTEO', 2),
+        'PSTEO001A': ('PSTEO', 3),
+    }
+
+
+def test_aggregates_file_keeps_only_counts(data_dir, courses):
+    write_events(
+        data_dir,
+        [
+            (0, 'ana', '', 'PSI', EVENT_COURSE),
+            (10, 'ana', 'PSTEO', 'PSTEO001L', EVENT_LESSON),
+            (400, 'ana', 'PSTEO', 'PSTEO001A', EVENT_TEST),
+            (20, 'bruno', '', 'PSI', EVENT_COURSE),
+        ],
+    )
+
+    FunnelAnalytics.refresh(courses)
+
+    saved = get_data_file(data_path(AGGREGATES_FILE))
+    assert set(saved) == {
+        'offset',
+        'reached',
+        'views',
+        'step_time',
+        'completion_time',
+        'cohorts',
+    }
+    assert saved['cohorts'] == {'1970-S01': {'enrolled': 2, 'completed': 1}}
+
+    states = {}
+    for path in get_shard_files(analytics_module.STATES_FILE):
+        states.update(get_data_file(path))
+    assert set(states) == {'ana', 'bruno'}
+
+
+def test_refresh_continues_from_the_saved_state(data_dir, courses):
+    write_events(
+        data_dir,
+        [
+            (0, 'ana', '', 'PSI', EVENT_COURSE),
+            (0, 'ana', 'PSTEO', 'PSTEO001L', EVENT_LESSON),
+        ],
+    )
+    FunnelAnalytics.refresh(courses, batch_size=1)
+
+    write_events(data_dir, [(2 * DAY, 'ana', 'PSTEO', 'PSTEO001A', EVENT_TEST)])
+    analytics = FunnelAnalytics.refresh(courses)
+
+    # O tempo da aula e da conclusão usam o estado salvo na primeira atualização.
+    assert analytics.step_time['PSTEO001L'][-2] == 1
+    assert analytics.completion_time['PSTEO'][-2] == 1
+    assert analytics.cohorts['1970-S01']['completed'] == 1
+    assert analytics.views == {'PSTEO001L': 1, 'PSTEO001A': 1}
+
+
+def test_legacy_per_user_state_moves_to_the_shards(data_dir, courses):
+    save_data_file(
+        data_path(AGGREGATES_FILE),
+        {
+            'offset': 0,
+            'cohorts': {'1970-S01': {'enrolled': 1, 'completed': 0}},
+            'user_cohorts': {'ana': '1970-S01'},
+            'progress': {'ana': {'PSTEO': [0, 0, 'PSTEO001L', 0]}},
+        },
+    )
+
+    FunnelAnalytics.refresh(courses)
+
+    assert 'progress' not in get_data_file(data_path(AGGREGATES_FILE))
+    write_events(data_dir, [(60, 'ana', 'PSTEO', 'PSTEO001A', EVENT_TEST)])
+    analytics = FunnelAnalytics.refresh(courses)
+    assert analytics.cohorts['1970-S01'] == {'enrolled': 1, 'completed': 1}
+
+
+def test_concurrent_refresh_does_not_count_twice(data_dir, courses):
+    write_events(data_dir, [(0, 'ana', '', 'PSI', EVENT_COURSE)])
+
+    first = FunnelAnalytics.load()
+    FunnelAnalytics.refresh(courses)
+
+    first.add(next(iter(analytics_module.read_events()))[0], {})
+    with pytest.raises(DataChangedError):
+        first.save()
+
+    saved = get_data_file(data_path(AGGREGATES_FILE))
+    assert saved['cohorts']['1970-S01']['enrolled'] == 1
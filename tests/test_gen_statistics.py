@@ -0,0 +1,32 @@
+import csv
+
+from conftest import make_user, save_users
+
+import gen_statistics
+from modules.snapshots import open_snapshot
+
+
+def read_report(name):
+    with open(name, encoding='utf-8') as file:
+        return {row['Cursos']: row for row in csv.DictReader(file)}
+
+
+def test_unspecified_gender_and_missing_course_are_counted(data_dir):
+    save_users(
+        [
+            make_user('ana', gender='m'),
+            make_user('bruno', gender=None),
+            make_user('carla', gender=None, course_id=None),
+        ],
+        shards=2,
+    )
+
+    with open_snapshot() as snapshot:
+        gen_statistics.generate(snapshot, processes=1)
+
+    courses = read_report('course_stats.csv')
+    gendered = read_report('gendered_course_stats.csv')
+    assert courses[gen_statistics.NO_COURSE]['Alunos Matriculados'] == '1'
+    assert courses['Total de Alunos']['Alunos Matriculados'] == '3'
+    assert gendered['Total']['Número de Mulheres'] == '1'
+    assert gendered['Total']['Gênero Não Informado'] == '2'
@@ -0,0 +1,75 @@
+import pytest
+from conftest import make_user
+
+from modules.data import data_path, get_data_file
+from modules.grades import GradeCube
+
+
+@pytest.fixture
+def courses(data_dir):
+    return get_data_file(data_path('cursos.json'))
+
+
+def build(courses, *users):
+    return GradeCube.build(courses, users)
+
+
+def test_only_cells_with_grades_are_stored(courses):
+    cube = build(
+        courses,
+        make_user('ana', gender='m', age=25, grades={'PSTEO': 80.0}),
+        make_user('bruno', age=25, grades={'PSTEO': 40.0, 'XXXXX': 100.0}),
+        make_user('carla', grades={}),
+    )
+
+    assert sorted(cube.cells) == [
+        ('PSTEO', 'Palmital', 'h', 2),
+        ('PSTEO', 'Palmital', 'm', 2),
+    ]
+
+    (stats,) = cube.query().values()
+    assert stats.count == 2
+    assert stats.mean == 60.0
+    assert stats.pass_rate == 0.5
+
+
+def test_query_groups_and_filters(courses):
+    cube = build(
+        courses,
+        make_user('ana', gender='m', city='Assis', grades={'PSTEO': 90.0}),
+        make_user('bruno', city='Assis', grades={'PSTEO': 70.0}),
+        make_user('carla', gender=None, grades={'PSTEO': 30.0}),
+    )
+
+    by_city = cube.query(('course', 'city'))
+    assert {key: stats.count for key, stats in by_city.items()} == {
+        ('PSI', 'Assis'): 2,
+        ('PSI', 'Palmital'): 1,
+    }
+
+    (stats,) = cube.query(where={'city': 'Assis', 'gender': 'm'}).values()
+    assert stats.mean == 90.0
+
+    with pytest.raises(ValueError):
+        cube.query(('cor',))
+
+
+def test_merge_and_round_trip_keep_the_same_statistics(courses):
+    first = build(courses, make_user('ana', grades={'PSTEO': 80.0}))
+    second = build(
+        courses,
+        make_user('bruno', grades={'PSTEO': 60.0}),
+        make_user('carla', city='Assis', grades={'PSTEO': 20.0}),
+    )
+    first.merge(second)
+
+    loaded = GradeCube.from_dict(first.to_dict())
+
+    assert loaded.cells == first.cells
+    (stats,) = loaded.query().values()
+    assert stats.count == 3
+    assert stats.median == pytest.approx(60.0, abs=5)
+    # Apenas as células e as faixas dos histogramas com notas são salvas.
+    cells = first.to_dict()['cells']
+    assert len(cells) == 2
+    assert sum(len(cell[-1]) for cell in cells) == 3
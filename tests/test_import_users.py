@@ -0,0 +1,88 @@
+import os
+
+import pytest
+from conftest import make_user
+
+import import_users
+from modules.data import (
+    get_data_file,
+    save_data_file,
+    get_shard_files,
+    set_shard_count,
+)
+from modules.exceptions import DataChangedError
+
+CSV = """full_name,age,gender,city,username,password,course_id
+Ana Souza,20,m,Palmital,ana,senha1,PSI
+Bruno Lima,30,h,Assis,bruno,senha2,
+Carla Dias,10,m,Assis,carla,senha3,PSI
+"""
+
+
+@pytest.fixture
+def csv_path(data_dir, tmp_path):
+    set_shard_count(2)
+    path = tmp_path / 'alunos.csv'
+    path.write_text(CSV, encoding='utf-8')
+    return str(path)
+
+
+def _all(name):
+    content = {}
+    for path in get_shard_files(name):
+        content.update(get_data_file(path))
+    return content
+
+
+def test_import_saves_logins_and_users_together(csv_path):
+    errors = import_users.import_users(csv_path, 1)
+
+    assert [(line, username) for line, username, _ in errors] == [(4, 'carla')]
+    assert set(_all('logins.json')) == set(_all('usuarios.json')) == {'ana', 'bruno'}
+
+
+def test_import_aborts_when_a_shard_changes(csv_path, data_dir, monkeypatch):
+    write_data_items = import_users.write_data_items
+
+    def write_and_create_account(path, items, target):
+        # Um aluno se cadastra enquanto a importação escreve as partições.
+        users_path = f'{data_dir}/shards/00/usuarios.json'
+        if not os.path.exists(f'{users_path}.gen'):
+            save_data_file(users_path, {'zeca': make_user('zeca')})
+        write_data_items(path, items, target)
+
+    monkeypatch.setattr(import_users, 'write_data_items', write_and_create_account)
+
+    with pytest.raises(DataChangedError):
+        import_users.import_users(csv_path, 1)
+
+    assert _all('logins.json') == {}
+    assert set(_all('usuarios.json')) == {'zeca'}
+    leftovers = [name for _, _, names in os.walk(data_dir) for name in names]
+    assert not [name for name in leftovers if name.endswith('.importing')]
+
+
+def test_bad_ndjson_lines_are_reported_and_genders_are_mapped(data_dir, tmp_path):
+    path = tmp_path / 'alunos.ndjson'
+    rows = [
+        '{"full_name": "Ana Souza", "age": "20", "gender": "Feminino", '
+        '"city": "Assis", "username": "ana", "password": "senha"}',
+        '{"full_name": "Bruno Lima", "age": "30", "gender": "masculino", '
+        '"city": "Assis", "username": "bruno", "password": "senha"}',
+        '{"full_name": "Carla Dias", "age": "30", "gender": "mista", '
+        '"city": "Assis", "username": "carla", "password": "senha"}',
+        '{"full_name": "Davi',
+        '["davi"]',
+    ]
+    path.write_text('\n'.join(rows) + '\n', encoding='utf-8')
+
+    errors = import_users.import_users(str(path), 1)
+
+    assert [(line, error) for line, _, error in errors] == [
+        (3, 'Gênero inválido.'),
+        (4, 'JSON inválido.'),
+        (5, 'A linha deve ser um objeto JSON.'),
+    ]
+    users = _all('usuarios.json')
+    assert users['ana']['gender'] == 'm'
+    assert users['bruno']['gender'] == 'h'
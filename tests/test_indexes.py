@@ -0,0 +1,75 @@
+import threading
+
+from conftest import make_user, save_users
+
+from modules import indexes
+from modules.data import get_user_file, get_generation, save_data_file
+from modules.users import User
+from modules.indexes import query_users, save_user_records
+
+
+def test_query_intersects_filters_across_shards(data_dir):
+    save_users(
+        [
+            make_user('ana', city='São Paulo', age=20),
+            make_user('bruno', city='Sao Paulo', age=30),
+            make_user('carla', city='Assis', age=20, course_id='DIR'),
+            make_user('davi', age=21, current_lesson={'PSTEO': '-'}),
+        ],
+        shards=3,
+    )
+
+    assert query_users(course_id='PSI') == ['ana', 'bruno', 'davi']
+    assert query_users(cities=['SÃO PAULO']) == ['ana', 'bruno']
+    assert query_users(ages=range(18, 22), cities=['assis']) == ['carla']
+    assert query_users(finished=['PSTEO']) == ['davi']
+    assert query_users(course_id='PSI', not_finished=['PSTEO']) == ['ana', 'bruno']
+    assert query_users() == ['ana', 'bruno', 'carla', 'davi']
+
+
+def test_saves_update_only_the_changed_keys(data_dir):
+    save_users([make_user('ana'), make_user('bruno')])
+    assert query_users(cities=['Palmital']) == ['ana', 'bruno']
+
+    user = User.find('ana')
+    user.city = 'Assis'
+    user.course_id = None
+    user.write()
+
+    assert query_users(cities=['Palmital']) == ['bruno']
+    assert query_users(cities=['Assis'], course_id='-') == ['ana']
+
+
+def test_files_changed_elsewhere_rebuild_the_index(data_dir):
+    save_users([make_user('ana')])
+    assert query_users(course_id='PSI') == ['ana']
+
+    # Uma alteração que não passa por save_user_records, como uma importação.
+    path = get_user_file('usuarios.json', 'ana')
+    save_data_file(path, {'bruno': make_user('bruno')})
+
+    assert query_users(course_id='PSI') == ['bruno']
+
+
+def test_rebuild_holds_the_shard_lock(data_dir, monkeypatch):
+    save_users([make_user('ana')])
+    path = get_user_file('usuarios.json', 'ana')
+    rebuild_index = indexes.rebuild_index
+    writer = threading.Thread(
+        target=save_user_records, args=(path, {'bruno': make_user('bruno')})
+    )
+
+    def rebuild_during_a_write(users_path, users=None):
+        # A escrita de outro aluno espera a reconstrução terminar.
+        writer.start()
+        writer.join(0.2)
+        assert writer.is_alive()
+        rebuild_index(users_path, users)
+
+    monkeypatch.setattr(indexes, 'rebuild_index', rebuild_during_a_write)
+    query_users(course_id='PSI')
+    writer.join()
+
+    # A escrita atualizou o índice reconstruído, que continua atual.
+    assert indexes._get_index_generation(path) == get_generation(path)
+    assert query_users(course_id='PSI') == ['ana', 'bruno']
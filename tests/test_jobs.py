@@ -0,0 +1,56 @@
+import os
+import subprocess
+
+from modules import jobs
+from modules.jobs import DONE, Scheduler, get_job, claim_job, submit_job, release_job
+
+
+def count_job(context):
+    with open(context.args['saida'], 'a', encoding='utf-8') as file:
+        file.write('x')
+    yield
+
+
+def dead_pid() -> int:
+    process = subprocess.Popen(['true'])
+    process.wait()
+    return process.pid
+
+
+def test_a_job_is_claimed_only_once(data_dir):
+    job_id = submit_job('contar', {})
+
+    assert claim_job(job_id)
+    assert not claim_job(job_id)
+
+    release_job(job_id)
+    assert claim_job(job_id)
+
+
+def test_claims_of_stopped_schedulers_are_discarded(data_dir):
+    job_id = submit_job('contar', {})
+    with open(jobs._claim_path(job_id), 'w', encoding='utf-8') as file:
+        file.write(str(dead_pid()))
+
+    assert claim_job(job_id)
+
+
+def test_scheduler_skips_jobs_claimed_by_another(data_dir, tmp_path):
+    output = tmp_path / 'saida.txt'
+    claimed = submit_job('contar', {'saida': str(output)})
+    free = submit_job('contar', {'saida': str(output)})
+
+    # Outro escalonador, ainda em execução, reservou a primeira tarefa.
+    with open(jobs._claim_path(claimed), 'w', encoding='utf-8') as file:
+        file.write(str(os.getppid()))
+
+    scheduler = Scheduler({'contar': count_job}, concurrency=2, byte_rate=1e9)
+    assert not scheduler._start(get_job(claimed))
+    assert scheduler._start(get_job(free))
+    while scheduler.running:
+        scheduler._reap(None)
+
+    assert output.read_text(encoding='utf-8') == 'x'
+    assert get_job(free)['status'] == DONE
+    assert not os.path.exists(jobs._claim_path(free))
+    assert os.path.exists(jobs._claim_path(claimed))
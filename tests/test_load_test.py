@@ -0,0 +1,51 @@
+import sys
+import random
+import subprocess
+
+from conftest import ROOT, make_user, save_users
+
+import load_test
+
+
+def test_scripted_input_answers_menus_after_the_queue():
+    script = load_test.ScriptedInput(random.Random(0))
+    script.push('c', 'Ana')
+
+    assert [script(), script()] == ['c', 'Ana']
+    assert script('> ') in 'abcde'
+    assert script('Aperte Enter') == ''
+
+
+def test_lost_updates_are_counted_per_kind(data_dir):
+    save_users(
+        [
+            make_user('ana', grades={'PSTEO': 80.0}),
+            make_user('bruno', course_id=None),
+        ],
+        shards=2,
+    )
+    results = [
+        {'username': 'ana', 'subject': 'PSTEO'},
+        {'username': 'bruno', 'subject': 'PSTEO'},
+        {'username': 'carla', 'subject': 'PSTEO'},
+        {'username': 'davi', 'subject': None, 'error': 'KeyError'},
+    ]
+
+    lost = load_test.count_lost_updates(results)
+
+    assert lost == {'usuario': 1, 'login': 0, 'curso': 1, 'nota': 1}
+
+
+def test_single_process_run_completes_every_student():
+    process = subprocess.run(
+        [sys.executable, 'load_test.py', '--alunos', '6', '--processos', '1'],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+        timeout=60,
+    )
+
+    assert '6 alunos em' in process.stdout
+    assert 'interrompidos' not in process.stdout
+    assert 'usuario=0, login=0, curso=0, nota=0' in process.stdout
@@ -0,0 +1,68 @@
+import sys
+import tracemalloc
+
+import pytest
+from conftest import make_user, save_users
+
+import memory_report
+
+
+def test_roster_is_padded_with_copies_of_stored_users(data_dir):
+    save_users([make_user('ana'), make_user('bruno')], shards=2)
+
+    users = memory_report.load_roster(5)
+
+    assert len(users) == 5
+    assert len({user.username for user in users}) == 5
+
+
+def test_measure_reports_retained_objects(data_dir):
+    tracemalloc.start()
+    try:
+        catalog, stats = memory_report.measure('catalogo', memory_report.load_catalog)
+    finally:
+        tracemalloc.stop()
+
+    assert stats['peak'] >= stats['retained'] > 0
+    assert {type(obj).__name__ for obj in stats['objects']} >= {'Course', 'Lesson'}
+    assert stats['by_type']['list'][0] >= 1
+    assert len(catalog) == 5
+
+
+def test_exceeded_budget_exits_with_error(data_dir, monkeypatch, capsys):
+    save_users([make_user('ana')])
+    monkeypatch.setattr(
+        sys,
+        'argv',
+        [
+            'memory_report.py',
+            '--usuarios',
+            '3',
+            '--sessoes',
+            '2',
+            '--orcamento',
+            'catalogo=0.000001',
+        ],
+    )
+
+    with pytest.raises(SystemExit) as info:
+        memory_report.main()
+
+    assert info.value.code == 1
+    assert 'catalogo:' in capsys.readouterr().out
+
+
+def test_empty_roster_simulates_no_sessions(data_dir):
+    assert memory_report.load_roster(3) == []
+    assert memory_report.simulate_sessions([], 5) == []
+
+
+@pytest.mark.parametrize('budget', ['catalogo', 'catalogo=muito', '=1', 'total=0'])
+def test_malformed_budget_is_a_usage_error(data_dir, monkeypatch, capsys, budget):
+    monkeypatch.setattr(sys, 'argv', ['memory_report.py', '--orcamento', budget])
+
+    with pytest.raises(SystemExit) as info:
+        memory_report.main()
+
+    assert info.value.code == 2
+    assert 'Orçamento inválido' in capsys.readouterr().err
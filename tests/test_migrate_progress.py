@@ -0,0 +1,73 @@
+import copy
+from collections import Counter
+
+import pytest
+from conftest import make_user, save_users
+
+from modules.data import data_path, get_data_file, get_shard_files, rewrite_shard_files
+from migrate_progress import CatalogMapping, migrate_shard
+
+
+@pytest.fixture
+def catalogs(data_dir):
+    old = get_data_file(data_path('cursos.json'))
+    new = copy.deepcopy(old)
+
+    # Remove "Psicanálise" e renumera as aulas seguintes.
+    subject = new['PSI']['subjects'][0]
+    lessons = [lesson for lesson in subject['lessons'] if lesson['id'] != 'PSTEO002L']
+    for i, lesson in enumerate(lessons, 1):
+        lesson['id'] = f'PSTEO{i:03d}L'
+    subject['lessons'] = lessons
+
+    # Renomeia o curso de Direito, mantendo o nome.
+    new['DIREITO'] = new.pop('DIR')
+    return old, new
+
+
+def test_removed_lesson_moves_progress_to_the_next_one(catalogs):
+    mapping = CatalogMapping(*catalogs)
+    user = make_user('ana', current_lesson={'PSTEO': 'PSTEO002L'}, version=3)
+
+    assert mapping.migrate(user) == ['aula removida']
+    # "Behaviorismo" era a PSTEO003L e agora é a PSTEO002L.
+    assert user['current_lesson'] == {'PSTEO': 'PSTEO002L'}
+    assert user['version'] == 4
+
+
+def test_renumbered_lessons_and_renamed_course(catalogs):
+    mapping = CatalogMapping(*catalogs)
+    user = make_user('bruno', course_id='DIR', current_lesson={'PSTEO': 'PSTEO004L'})
+
+    assert mapping.migrate(user) == ['curso renomeado', 'aula renumerada']
+    assert user['course_id'] == 'DIREITO'
+    assert user['current_lesson'] == {'PSTEO': 'PSTEO003L'}
+
+    unchanged = make_user('carla', current_lesson={'PSTEO': 'PSTEO001L'})
+    assert mapping.migrate(unchanged) == []
+    assert unchanged['version'] == 1
+
+
+def test_all_shards_are_rewritten_and_counted(catalogs):
+    save_users(
+        [
+            make_user('ana', current_lesson={'PSTEO': 'PSTEO005L'}),
+            make_user('bruno', current_lesson={'PSTEO': 'PSTEO001L'}),
+            make_user('carla', current_lesson={'PSTEO': 'PSTEO003L'}),
+        ],
+        shards=2,
+    )
+    mapping = CatalogMapping(*catalogs)
+    counts = Counter()
+
+    rewrite_shard_files(
+        'usuarios.json', lambda path: migrate_shard(path, mapping, counts)
+    )
+
+    users = {}
+    for path in get_shard_files('usuarios.json'):
+        users.update(get_data_file(path))
+    assert users['ana']['current_lesson'] == {'PSTEO': 'PSTEO004L'}
+    assert users['bruno']['current_lesson'] == {'PSTEO': 'PSTEO001L'}
+    assert counts['usuários lidos'] == 3
+    assert counts['usuários alterados'] == counts['aula renumerada'] == 2
@@ -0,0 +1,106 @@
+import sys
+import time
+import subprocess
+
+import pytest
+from conftest import ROOT, make_user, save_users
+
+from modules import persistence
+from modules.data import get_data_file, get_user_file
+from modules.serialization import get_codec
+
+
+def write_journal(data_dir, pid, entries):
+    path = data_dir / f'{persistence.JOURNAL_PREFIX}{pid}{persistence.JOURNAL_SUFFIX}'
+    codec = get_codec()
+    with open(path, 'wb') as file:
+        for record in entries:
+            users_path = get_user_file('usuarios.json', record['username'])
+            line = {
+                'path': users_path,
+                'username': record['username'],
+                'record': record,
+            }
+            file.write(codec.dumps(line) + b'\n')
+    return path
+
+
+def dead_pid():
+    # Um PID de um processo que já terminou.
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def test_recover_applies_only_newer_versions(data_dir):
+    save_users([make_user('ana', city='Assis', version=5), make_user('bruno')])
+    journal = write_journal(
+        data_dir,
+        dead_pid(),
+        [
+            make_user('ana', city='Marília', version=4),
+            make_user('bruno', city='Ourinhos', version=2),
+            make_user('carla', version=1),
+        ],
+    )
+
+    assert persistence.recover() == 2
+
+    users = get_data_file(get_user_file('usuarios.json', 'ana'))
+    assert users['ana']['city'] == 'Assis'
+    assert users['bruno']['city'] == 'Ourinhos'
+    assert 'carla' in users
+    assert not journal.exists()
+
+
+@pytest.mark.parametrize('write_behind', [False, True])
+def test_concurrent_account_creation_keeps_every_login(write_behind):
+    # Oito processos se cadastrando nas mesmas partições ao mesmo tempo.
+    args = ['--alunos', '120', '--processos', '8', '--threads', '3']
+    args += ['--particoes', '2', *(['--segundo-plano'] if write_behind else [])]
+    process = subprocess.run(
+        [sys.executable, 'load_test.py', *args],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+        timeout=120,
+    )
+
+    assert 'interrompidos' not in process.stdout
+    assert 'usuario=0, login=0, curso=0, nota=0' in process.stdout
+
+
+def test_failed_flushes_back_off_and_report_once(data_dir, monkeypatch, capsys):
+    calls = []
+    save_user_records = persistence.save_user_records
+
+    def full_disk(path, records):
+        if not disk_full:
+            return save_user_records(path, records)
+        calls.append(path)
+        raise OSError(28, 'No space left on device')
+
+    disk_full = True
+    monkeypatch.setattr(persistence, 'save_user_records', full_disk)
+    queue = persistence.WriteBehindQueue(max_pending=1, max_delay=0.1)
+    path = get_user_file('usuarios.json', 'ana')
+    for i in range(5):
+        queue.enqueue(path, 'ana', make_user('ana', version=i))
+
+    time.sleep(0.5)
+    disk_full = False
+    queue.stop()
+
+    # Com a fila cheia, a thread não tenta de novo sem esperar.
+    assert 1 <= len(calls) <= 8
+    assert capsys.readouterr().err.count('Erro ao salvar os usuários') == 1
+    assert get_data_file(path)['ana']['version'] >= 4
+
+
+def test_recover_skips_journals_removed_by_another_process(data_dir, monkeypatch):
+    journal = write_journal(data_dir, dead_pid(), [make_user('ana')])
+    gone = str(data_dir / f'{persistence.JOURNAL_PREFIX}1{persistence.JOURNAL_SUFFIX}')
+    monkeypatch.setattr(persistence, '_find_journals', lambda _: [gone, str(journal)])
+
+    assert persistence.recover() == 1
@@ -0,0 +1,66 @@
+import copy
+from collections import Counter
+
+import pytest
+from conftest import make_user, save_users
+
+from regrade import Regrader, regrade_shard
+from modules.data import data_path, get_data_file, get_shard_files, rewrite_shard_files
+from modules.courses import Subject
+
+KEY = 'dddcddbccd'
+
+
+@pytest.fixture
+def subject(data_dir):
+    courses = get_data_file(data_path('cursos.json'))
+    subject = copy.deepcopy(courses['PSI']['subjects'][0])
+    # A questão 6 tinha o gabarito errado; a resposta certa é "a".
+    subject['test']['questions'][6]['answer'] = 'a'
+    return Subject.from_dict(subject)
+
+
+def attempt(answers):
+    return {'seed': None, 'answers': answers}
+
+
+def test_grade_follows_the_corrected_key(subject):
+    regrader = Regrader(subject)
+    corrected = KEY[:6] + 'a' + KEY[7:]
+
+    assert regrader.grade(attempt(KEY)) == 90.0
+    assert regrader.grade(attempt(corrected)) == 100.0
+    assert regrader.grade(attempt('abc')) is None
+    assert regrader.grade({'seed': 1}) is None
+
+
+def test_shards_are_rewritten_with_new_grades(subject):
+    save_users(
+        [
+            make_user(
+                'ana',
+                grades={'PSTEO': 100.0},
+                attempts={'PSTEO001A': attempt(KEY)},
+            ),
+            make_user('bruno', grades={'PSTEO': 70.0}),
+            make_user('carla'),
+        ],
+        shards=2,
+    )
+    regrader = Regrader(subject)
+    before, after, counts = [], [], Counter()
+
+    rewrite_shard_files(
+        'usuarios.json',
+        lambda path: regrade_shard(path, regrader, before, after, counts),
+    )
+
+    users = {}
+    for path in get_shard_files('usuarios.json'):
+        users.update(get_data_file(path))
+    assert users['ana']['grades'] == {'PSTEO': 90.0}
+    assert users['ana']['version'] == 2
+    # Sem respostas salvas, a nota é mantida.
+    assert users['bruno']['grades'] == {'PSTEO': 70.0}
+    assert (before, after) == ([100.0], [90.0])
+    assert counts == {'alteradas': 1, 'sem respostas': 1}
@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from modules import serialization
+from modules.data import get_data_file, iter_data_file, save_data_file, write_data_items
+
+CODECS = list(serialization.get_available_codecs().values())
+DATA = {'ana': {'full_name': 'Ana Conceição', 'grades': {'PSTEO': 87.5}, 'age': 20}}
+
+
+@pytest.fixture(params=CODECS, ids=lambda codec: codec.name)
+def codec(request, monkeypatch):
+    monkeypatch.setattr(serialization, '_codec', request.param)
+    return request.param
+
+
+@pytest.mark.parametrize('pretty', [False, True])
+def test_every_codec_reads_what_the_others_write(codec, pretty):
+    data = codec.dumps(DATA, pretty=pretty)
+
+    assert 'Conceição'.encode() in data
+    for other in CODECS:
+        assert other.loads(data) == DATA
+
+
+def test_invalid_documents_raise_json_errors(codec):
+    with pytest.raises(json.JSONDecodeError):
+        codec.loads(b'{"ana": ')
+
+
+def test_data_files_round_trip_whole_and_streamed(codec, data_dir):
+    save_data_file(f'{data_dir}/usuarios.json', DATA)
+    write_data_items(
+        f'{data_dir}/copia.json', iter_data_file(f'{data_dir}/usuarios.json')
+    )
+
+    assert get_data_file(f'{data_dir}/usuarios.json') == DATA
+    assert get_data_file(f'{data_dir}/copia.json') == DATA
+    # Os arquivos gerenciados pelo programa são salvos sem indentação.
+    assert b'\n' not in (data_dir / 'usuarios.json').read_bytes()
+
+
+def test_unknown_codec_is_rejected(monkeypatch):
+    monkeypatch.setattr(serialization, '_codec', None)
+    monkeypatch.setenv(serialization.CODEC_VARIABLE, 'pickle')
+
+    with pytest.raises(ValueError):
+        serialization.get_codec()
@@ -0,0 +1,35 @@
+import time
+
+import pytest
+
+from modules import sessions
+
+
+def test_token_is_valid_until_revoked(data_dir):
+    token = sessions.create_token('ana')
+    assert sessions.verify_token(token) == 'ana'
+
+    sessions.revoke_sessions('ana')
+    assert sessions.verify_token(token) is None
+    assert sessions.verify_token(sessions.create_token('ana')) == 'ana'
+
+
+def test_expired_token_is_rejected(data_dir):
+    assert sessions.verify_token(sessions.create_token('ana', ttl=-1)) is None
+
+
+@pytest.mark.parametrize(
+    'tamper',
+    [
+        lambda token: token.replace('ana', 'bia', 1),
+        lambda token: token[:-1] + 'ç',
+        lambda token: f'ação:{int(time.time()) + 60}:0:assinatura€',
+        lambda token: '',
+    ],
+)
+def test_tampered_or_non_ascii_tokens_are_rejected(data_dir, tamper):
+    assert sessions.verify_token(tamper(sessions.create_token('ana'))) is None
+
+
+def test_non_ascii_username_round_trips(data_dir):
+    assert sessions.verify_token(sessions.create_token('joão')) == 'joão'
@@ -0,0 +1,74 @@
+import os
+import subprocess
+
+import pytest
+from conftest import make_user
+
+import reshard
+from modules.data import (
+    PROCESSES_DIR,
+    get_shard,
+    get_data_file,
+    get_user_file,
+    save_data_file,
+    get_shard_count,
+    get_shard_files,
+)
+from modules.exceptions import DataInUseError
+
+
+def test_single_shard_keeps_legacy_layout(data_dir):
+    assert get_shard_count() == 1
+    assert get_user_file('usuarios.json', 'ana') == f'{data_dir}/usuarios.json'
+
+
+def test_shard_is_stable_across_counts():
+    # O CRC32 não depende do processo, ao contrário de hash().
+    assert get_shard('ana', 4) == get_shard('ana', 4)
+    assert {get_shard(f'aluno{i}', 4) for i in range(100)} == {0, 1, 2, 3}
+
+
+def test_reshard_moves_every_user_to_its_shard(data_dir):
+    users = {f'aluno{i}': make_user(f'aluno{i}') for i in range(50)}
+    save_data_file(f'{data_dir}/usuarios.json', users)
+    save_data_file(f'{data_dir}/logins.json', dict.fromkeys(users, 'hash'))
+
+    reshard.reshard(4)
+
+    assert get_shard_count() == 4
+    merged = {}
+    for shard, path in enumerate(get_shard_files('usuarios.json')):
+        content = get_data_file(path)
+        assert all(get_shard(username) == shard for username in content)
+        merged.update(content)
+
+    assert merged == users
+    assert not (data_dir / 'usuarios.json').exists()
+
+
+def register(data_dir, pid: int):
+    os.makedirs(data_dir / PROCESSES_DIR, exist_ok=True)
+    (data_dir / PROCESSES_DIR / str(pid)).touch()
+
+
+def test_reshard_refuses_while_another_process_uses_the_data(data_dir):
+    save_data_file(f'{data_dir}/usuarios.json', {'ana': make_user('ana')})
+    # O processo que rodou os testes continua em execução.
+    register(data_dir, os.getppid())
+
+    with pytest.raises(DataInUseError, match=str(os.getppid())):
+        reshard.reshard(4)
+
+    assert get_shard_count() == 1
+    assert 'ana' in get_data_file(f'{data_dir}/usuarios.json')
+
+
+def test_reshard_discards_registrations_of_stopped_processes(data_dir):
+    process = subprocess.Popen(['true'])
+    process.wait()
+    register(data_dir, process.pid)
+
+    reshard.reshard(2)
+
+    assert get_shard_count() == 2
+    assert not (data_dir / PROCESSES_DIR / str(process.pid)).exists()
@@ -0,0 +1,97 @@
+import pytest
+from conftest import make_user, save_users
+
+import ship_changes
+from modules.data import (
+    data_path,
+    get_data_file,
+    get_generation,
+    iter_data_file,
+    save_data_file,
+    get_shard_files,
+    rewrite_shard_files,
+)
+from modules.indexes import save_user_records
+from modules.sessions import revoke_sessions
+from modules.changelog import record_file, read_changes, record_changes
+
+
+@pytest.fixture
+def replica(data_dir, tmp_path):
+    save_users([make_user('ana'), make_user('bruno')], shards=2)
+    destination = tmp_path / 'reserva'
+    state = ship_changes.full_copy(str(destination))
+    return destination, state
+
+
+def assert_replicated(destination, name):
+    for path in get_shard_files(name):
+        relative = path[len(data_path('')) :]
+        assert get_data_file(f'{destination}/{relative}') == get_data_file(path)
+
+
+def test_full_copy_stores_the_copied_generations(replica):
+    _, state = replica
+
+    path = get_shard_files('usuarios.json')[0]
+    relative = path[len(data_path('')) :]
+    assert state['generations'][relative] == get_generation(path)
+
+
+def test_changes_of_every_file_are_applied_in_generation_order(replica):
+    destination, state = replica
+    path = get_shard_files('usuarios.json')[0]
+    username = next(iter(get_data_file(path)))
+
+    # Duas instâncias da mesma versão: a segunda recebe a versão seguinte.
+    for city in ('Assis', 'Ourinhos'):
+        save_user_records(path, {username: make_user(username, city=city)})
+    revoke_sessions(username)
+
+    ship_changes.ship(str(destination), state, batch_size=1)
+
+    assert_replicated(destination, 'usuarios.json')
+    assert_replicated(destination, 'sessoes.json')
+    changes, _ = read_changes(0, 100)
+    assert all('generation' in change for _, change in changes)
+
+
+def test_changes_already_applied_are_skipped(replica):
+    destination, state = replica
+    path = get_shard_files('logins.json')[0]
+    username = next(iter(get_data_file(path)))
+    relative = path[len(data_path('')) :]
+
+    logins = get_data_file(path)
+    logins[username] = 'nova'
+    generation = save_data_file(path, logins)
+    record_changes(path, generation, {username: 'nova'})
+    # Uma alteração com uma geração mais antiga já está na réplica.
+    record_changes(path, state['generations'][relative], {username: 'antiga'})
+
+    ship_changes.ship(str(destination), state, batch_size=100)
+
+    assert get_data_file(f'{destination}/{relative}')[username] == 'nova'
+    assert state['generations'][relative] == generation
+
+
+def test_rewritten_shards_are_replicated_whole(replica):
+    destination, state = replica
+
+    def rewrite(path):
+        for username, user in iter_data_file(path):
+            if username == 'ana':
+                continue
+            user['city'] = 'Assis'
+            yield username, user
+
+    rewrite_shard_files('usuarios.json', rewrite, on_replace=record_file)
+
+    # O registro guarda apenas a geração de cada partição, não os alunos.
+    changes, _ = read_changes(0, 100)
+    assert [change.get('replaced') for _, change in changes] == [True, True]
+    assert not any('changes' in change for _, change in changes)
+
+    ship_changes.ship(str(destination), state, batch_size=100)
+
+    assert_replicated(destination, 'usuarios.json')
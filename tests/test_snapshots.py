@@ -0,0 +1,48 @@
+from conftest import make_user, save_users
+
+import gen_statistics
+import modules.snapshots
+from modules.data import data_path, get_data_file, get_generation, save_data_file
+from modules.snapshots import open_snapshot
+
+
+def test_snapshot_is_redone_when_a_file_changes_while_linking(data_dir, monkeypatch):
+    save_users([make_user('ana')])
+    link_file = modules.snapshots._link_file
+    calls = []
+
+    def link_and_create_account(source, target):
+        # Um aluno se cadastra enquanto a cópia é criada.
+        calls.append(source)
+        if len(calls) == 1:
+            for name, value in (('logins.json', 'hash'), ('usuarios.json', None)):
+                path = data_path(name)
+                content = get_data_file(path)
+                content['zeca'] = value or make_user('zeca')
+                save_data_file(path, content)
+        link_file(source, target)
+
+    monkeypatch.setattr(modules.snapshots, '_link_file', link_and_create_account)
+
+    with open_snapshot() as snapshot:
+        logins = get_data_file(snapshot.path(data_path('logins.json')))
+        users = get_data_file(snapshot.path(data_path('usuarios.json')))
+        generations = snapshot.get_generations()
+
+    assert set(logins) == set(users) == {'ana', 'zeca'}
+    assert generations['usuarios.json'] == get_generation(data_path('usuarios.json'))
+    assert len(calls) > len(generations)
+
+
+def test_statistics_skip_logins_of_accounts_being_created(data_dir):
+    save_users([make_user('ana')])
+    logins = get_data_file(data_path('logins.json'))
+    save_data_file(data_path('logins.json'), {**logins, 'zeca': 'hash'})
+
+    courses = get_data_file(data_path('cursos.json'))
+    count, course_count, *_ = gen_statistics.aggregate_shard(
+        data_path('usuarios.json'), data_path('logins.json'), courses
+    )
+
+    assert count == 1
+    assert sum(course_count.values()) == 1
@@ -0,0 +1,72 @@
+import io
+import socket
+
+import pytest
+
+import supervisor
+from supervisor import DO, SB, SE, IAC, ECHO, WILL, WONT, TelnetReader
+
+
+@pytest.fixture
+def connection():
+    server, client = socket.socketpair()
+    yield server, client
+    server.close()
+    client.close()
+
+
+def test_reader_drops_telnet_commands_split_across_packets(connection):
+    server, client = connection
+    reader = io.BufferedReader(TelnetReader(server))
+
+    client.sendall(bytes((IAC, DO)))
+    client.sendall(bytes((ECHO,)) + b'ana' + bytes((IAC, SB, 24, 0)) + b'xterm')
+    client.sendall(bytes((IAC, SE, IAC, IAC)) + b'\r\x00b\r\n')
+    client.shutdown(socket.SHUT_WR)
+
+    assert reader.read() == b'ana\xff\rb\r\n'
+
+
+def test_password_is_read_with_echo_disabled(connection, monkeypatch, capsys):
+    server, client = connection
+    stdin = io.TextIOWrapper(io.BufferedReader(TelnetReader(server)), encoding='utf-8')
+    stdout = server.makefile('w', buffering=1, encoding='utf-8')
+    monkeypatch.setattr('sys.stdin', stdin)
+    monkeypatch.setattr('sys.stdout', stdout)
+
+    # A resposta do cliente ao pedido de eco chega junto com a senha.
+    client.sendall(bytes((IAC, DO, ECHO)) + 'señha\r\n'.encode())
+    password = supervisor._socket_getpass('Senha > ')
+    stdout.flush()
+    server.shutdown(socket.SHUT_WR)
+
+    assert password == 'señha'  # noqa: S105
+    received = b''
+    while chunk := client.recv(1024):
+        received += chunk
+    assert received == (
+        b'Senha > ' + bytes((IAC, WILL, ECHO)) + bytes((IAC, WONT, ECHO)) + b'\n'
+    )
+
+
+def test_password_at_end_of_connection_raises_eof(connection, monkeypatch):
+    server, client = connection
+    monkeypatch.setattr(
+        'sys.stdin',
+        io.TextIOWrapper(io.BufferedReader(TelnetReader(server)), encoding='utf-8'),
+    )
+    monkeypatch.setattr(
+        'sys.stdout', server.makefile('w', buffering=1, encoding='utf-8')
+    )
+    client.shutdown(socket.SHUT_WR)
+
+    with pytest.raises(EOFError):
+        supervisor._socket_getpass()
+
+
+@pytest.mark.parametrize(
+    ('address', 'loopback'),
+    [('127.0.0.1', True), ('::1', True), ('localhost', True), ('0.0.0.0', False)],  # noqa: S104,
+)
+def test_non_loopback_addresses_are_detected(address, loopback):
+    assert supervisor.is_loopback(address) is loopback
@@ -0,0 +1,68 @@
+import os
+
+from conftest import make_user, save_users
+
+import modules.throttle
+from modules.data import get_data_file, get_user_file
+from modules.throttle import ATTEMPTS_FILE, Throttle, StoredThrottle
+
+
+def test_blocked_account_stays_blocked_in_a_new_process(data_dir):
+    save_users([make_user('ana')], shards=2)
+
+    for _ in range(6):
+        modules.throttle.record_login_failure('ana', '10.0.0.1')
+    assert modules.throttle.check_login('ana', '10.0.0.1') > 0
+
+    # Outro processo, ou o mesmo aluno reconectado, começa com limites novos.
+    other = StoredThrottle(ATTEMPTS_FILE, capacity=5)
+    assert other.check('ana') > 0
+
+    modules.throttle.record_login_success('ana')
+    assert other.check('ana') == 0
+    assert get_data_file(get_user_file(ATTEMPTS_FILE, 'ana')) == {}
+
+
+def test_unknown_usernames_are_not_saved(data_dir):
+    save_users([make_user('ana')], shards=2)
+
+    modules.throttle.record_login_failure('zeca', '10.0.0.1', exists=False)
+
+    path = get_user_file(ATTEMPTS_FILE, 'zeca')
+    assert not os.path.exists(path) or get_data_file(path) == {}
+    assert len(modules.throttle.account_throttle) == 1
+
+
+def test_full_buckets_are_pruned(data_dir):
+    throttle = StoredThrottle(ATTEMPTS_FILE, capacity=2, refill_rate=1)
+
+    throttle.record_failure('ana', now=0)
+    throttle.record_failure('bruno', now=10)
+
+    assert set(get_data_file(get_user_file(ATTEMPTS_FILE, 'ana'))) == {'bruno'}
+
+
+def test_eviction_keeps_blocked_keys():
+    throttle = Throttle(capacity=1, max_entries=3)
+    for _ in range(3):
+        throttle.record_failure('vitima', now=0)
+    assert throttle.check('vitima', now=0) > 0
+
+    # Nomes descartáveis enchem o LRU e empurram a vítima para o início.
+    for i in range(10):
+        throttle.record_failure(f'aleatorio{i}', now=0)
+
+    assert throttle.check('vitima', now=0) > 0
+    assert len(throttle) == 3
+
+
+def test_new_keys_share_a_bucket_when_every_key_is_blocked():
+    throttle = Throttle(capacity=1, max_entries=2)
+    for key in ('a', 'b'):
+        throttle.record_failure(key, now=0)
+        throttle.record_failure(key, now=0)
+
+    assert throttle.record_failure('c', now=0) == 0
+    assert throttle.record_failure('d', now=0) > 0
+    assert throttle.check('e', now=0) > 0
+    assert len(throttle) == 3
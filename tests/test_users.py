@@ -0,0 +1,42 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from conftest import make_user, save_users
+
+from modules.data import get_data_file, get_user_file
+from modules.users import User
+
+
+def test_concurrent_writes_to_a_shard_keep_every_user(data_dir):
+    def create(i):
+        User(**make_user(f'aluno{i}', version=0)).write()
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(create, range(40)))
+
+    users = get_data_file(get_user_file('usuarios.json', 'aluno0'))
+    assert len(users) == 40
+
+
+def test_stale_instance_gets_a_newer_version_and_update_sees_it(data_dir):
+    save_users([make_user('ana')])
+    first, second = User.find('ana'), User.find('ana')
+
+    first.grades['PSTEO'] = 50.0
+    first.write()
+    second.grades['PSTEO'] = 90.0
+    second.write()
+
+    # As duas partiram da versão 1; a segunda é salva com uma versão maior.
+    assert (first.version, second.version) == (2, 3)
+
+    first.update()
+    assert first.grades == {'PSTEO': 90.0}
+    assert first.version == 3
+
+
+def test_update_keeps_a_user_that_is_not_saved_yet(data_dir):
+    save_users([make_user('ana')])
+    user = User(**make_user('bruno'))
+
+    user.update()
+    assert user.username == 'bruno'
@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+from modules import utilities
+from modules.utilities import Menu, PrefixIndex, get_choice
+
+SUBJECTS = [
+    'Teorias Psicológicas',
+    'Psicologia do Desenvolvimento',
+    'Psicopatologia',
+    'Neurociência',
+]
+
+
+@pytest.fixture
+def answers(monkeypatch, capsys):
+    """
+    Responde às chamadas de input() com as entradas dadas, em ordem.
+    """
+    inputs = []
+    monkeypatch.setattr('builtins.input', lambda prompt='': inputs.pop(0))
+    monkeypatch.setattr(
+        utilities.shutil, 'get_terminal_size', lambda: os.terminal_size((80, 12))
+    )
+    return inputs
+
+
+def test_search_ignores_accents_and_matches_word_prefixes():
+    index = PrefixIndex(SUBJECTS)
+
+    assert index.search('psico') == [0, 1, 2]
+    assert index.search('PSICOLÓGICAS teo') == [0]
+    assert index.search('neurociencia') == [3]
+    assert index.search('neuro ciencia') == []
+    assert index.search('desenv', within=[2, 3]) == []
+
+
+def test_get_choice_accepts_multi_digit_options(answers):
+    answers.extend(['12', '13', 'sair'])
+    options = [str(i) for i in range(1, 13)] + ['s']
+
+    assert get_choice(options) == '12'
+    assert get_choice(options) is None
+    assert get_choice(options) == 's'
+
+
+def test_menu_pages_fit_the_terminal(answers, capsys):
+    options = [f'Aula {i}' for i in range(1, 21)]
+    answers.extend(['>', '>', '15'])
+
+    menu = Menu(options, title='Aulas')
+    assert menu.page_size == 4
+    assert menu.select() == 14
+
+    last_page = capsys.readouterr().out.split(utilities.CLEAR_SCREEN)[-1]
+    assert '[9] Aula 9' in last_page
+    assert '[8] Aula 8' not in last_page
+    assert 'Página 3 de 5' in last_page
+
+
+def test_filtered_options_keep_their_numbers(answers, capsys):
+    answers.extend(['psico', 'psicop', '3'])
+
+    menu = Menu(SUBJECTS, title='Matérias', back_label='Voltar')
+    assert menu.select() == 2
+
+    filtered = capsys.readouterr().out.split(utilities.CLEAR_SCREEN)[-1]
+    assert '[3] Psicopatologia' in filtered
+    assert '[2]' not in filtered
+    assert '[0] Voltar' in filtered
+
+
+def test_menu_returns_none_for_back(answers):
+    answers.extend(['9', '0'])
+    assert Menu(SUBJECTS, title='Matérias', back_label='Voltar').select() is None